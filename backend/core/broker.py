@@ -0,0 +1,359 @@
+"""
+Brokers de pub/sub para o gerenciador de WebSockets
+
+O ConnectionManager publica cada evento no broker, e o broker o entrega ao
+manager de cada processo que tem o usuário. Com um único processo,
+InMemoryBroker entrega na hora. Com vários workers uvicorn na mesma máquina,
+LocalHubBroker usa um hub num socket Unix: o primeiro worker a pegar o lock
+sobe o hub, e todos (inclusive ele) se conectam como clientes. Cada worker
+assina só os usuários que mantém, e as publicações são enviadas em lote.
+
+Protocolo do hub: uma linha JSON por lote, com
+{"op": "sub" | "unsub", "users": [...]} ou {"op": "pub", "events": [...]}
+do cliente para o hub e {"op": "deliver", "events": [...]} do hub para o
+cliente. Cada evento é [user_id, mensagem, low_priority]; user_id nulo
+significa todos os usuários.
+
+O número de sequência ("seq") dos eventos de replay é dado aqui, num único
+lugar para todos os workers (o hub, ou o próprio InMemoryBroker): assim o
+seq que o cliente recebeu de um worker vale para retomar em outro que
+também guarde os eventos do usuário.
+
+Lotes acima de WS_BROKER_MAX_FRAME_BYTES são divididos em várias linhas, e
+os dois lados leem com limite WS_BROKER_READ_LIMIT. Uma conexão cujo buffer
+de escrita passa de WS_BROKER_MAX_BUFFER_BYTES é derrubada: o worker lento
+reconecta e reassina, em vez de fazer o outro lado acumular sem limite.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from core.config import (
+    WS_BROKER, WS_BROKER_SOCKET, WS_BROKER_LINGER_MS,
+    WS_BROKER_MAX_FRAME_BYTES, WS_BROKER_READ_LIMIT, WS_BROKER_MAX_BUFFER_BYTES, WS_BROKER_SEQ_MAX_USERS
+)
+
+Deliver = Callable[[Optional[int], Any, Optional[bool]], None]
+
+def _encode_events(op: str, events: List[list], stats: dict) -> List[bytes]:
+    """Serializar um lote de eventos em linhas de até WS_BROKER_MAX_FRAME_BYTES
+
+    Um evento maior que o limite vai sozinho numa linha; se nem assim couber
+    em WS_BROKER_READ_LIMIT, é descartado (o outro lado não conseguiria ler).
+    """
+    prefix = '{"op": "%s", "events": [' % op
+    lines: List[bytes] = []
+    parts: List[str] = []
+    size = 0
+    for event in events:
+        part = json.dumps(event)
+        if len(part) + len(prefix) + 3 > WS_BROKER_READ_LIMIT:
+            stats['dropped_oversized'] = stats.get('dropped_oversized', 0) + 1
+            continue
+        if parts and size + len(part) > WS_BROKER_MAX_FRAME_BYTES:
+            lines.append((prefix + ", ".join(parts) + "]}\n").encode())
+            parts, size = [], 0
+        parts.append(part)
+        size += len(part) + 2
+    if parts:
+        lines.append((prefix + ", ".join(parts) + "]}\n").encode())
+    return lines
+
+def _write_or_drop(writer: asyncio.StreamWriter, data: bytes, stats: dict) -> bool:
+    """Escrever sem esperar; derrubar a conexão se o outro lado não acompanha"""
+    if writer.is_closing():
+        return False
+    writer.write(data)
+    if writer.transport.get_write_buffer_size() > WS_BROKER_MAX_BUFFER_BYTES:
+        stats['slow_connections_closed'] = stats.get('slow_connections_closed', 0) + 1
+        print("⚠️ Broker: conexão lenta derrubada (buffer de escrita cheio)")
+        writer.close()
+        return False
+    return True
+
+class SeqCounter:
+    """Seq por usuário para os eventos que entram no replay
+
+    O contador de um usuário começa no relógio em ms e sobe de um em um.
+    Um contador despejado pelo LRU, ou um hub novo depois de outro cair,
+    recomeça acima dos seqs já entregues (salvo mais de mil eventos por
+    segundo para o usuário) e o cliente recebe resync em vez de um replay
+    errado.
+    """
+
+    def __init__(self, max_users: int = WS_BROKER_SEQ_MAX_USERS):
+        self.max_users = max_users
+        self._last: "OrderedDict[int, int]" = OrderedDict()
+
+    def stamp(self, event: list) -> list:
+        """Numerar o evento se ele vai para o replay (usuário definido, dict, prioridade normal)"""
+        user_id, message, low_priority = event
+        if user_id is None or low_priority or not isinstance(message, dict):
+            return event
+        last = self._last.get(user_id)
+        seq = last + 1 if last is not None else int(time.time() * 1000)
+        self._last[user_id] = seq
+        self._last.move_to_end(user_id)
+        if len(self._last) > self.max_users:
+            self._last.popitem(last=False)
+        return [user_id, {**message, "seq": seq}, low_priority]
+
+class InMemoryBroker:
+    """Broker de processo único: publicar é entregar localmente"""
+
+    distributed = False
+
+    def __init__(self, deliver: Optional[Deliver] = None):
+        self._deliver = deliver
+        self._seq = SeqCounter()
+        self.stats = {'published': 0}
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    def subscribe(self, user_id: int):
+        pass
+
+    def unsubscribe(self, user_id: int):
+        pass
+
+    def publish(self, user_id: Optional[int], message: Any, low_priority: Optional[bool] = None):
+        self.stats['published'] += 1
+        if self._deliver:
+            self._deliver(*self._seq.stamp([user_id, message, low_priority]))
+
+    async def close(self):
+        pass
+
+    def get_stats(self):
+        return {'backend': 'memory', **self.stats}
+
+class _Hub:
+    """Hub de um socket Unix que repassa cada evento aos workers que assinam o usuário"""
+
+    def __init__(self):
+        self.subscribers: Dict[int, Set[asyncio.StreamWriter]] = {}
+        self.clients: Dict[asyncio.StreamWriter, Set[int]] = {}
+        self.seq = SeqCounter()
+        self.stats = {'dropped_oversized': 0, 'slow_connections_closed': 0}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients[writer] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                op = frame.get("op")
+                if op == "sub":
+                    for user_id in frame["users"]:
+                        self.subscribers.setdefault(user_id, set()).add(writer)
+                        self.clients[writer].add(user_id)
+                elif op == "unsub":
+                    for user_id in frame["users"]:
+                        self._unsubscribe(writer, user_id)
+                elif op == "pub":
+                    self._route(frame["events"])
+        except (ConnectionError, ValueError) as e:
+            print(f"⚠️ Broker: cliente do hub removido: {e}")
+        finally:
+            for user_id in self.clients.pop(writer, set()):
+                self._unsubscribe(writer, user_id)
+            writer.close()
+
+    def close(self):
+        for writer in list(self.clients):
+            writer.close()
+
+    def _unsubscribe(self, writer: asyncio.StreamWriter, user_id: int):
+        writers = self.subscribers.get(user_id)
+        if writers:
+            writers.discard(writer)
+            if not writers:
+                del self.subscribers[user_id]
+        self.clients.get(writer, set()).discard(user_id)
+
+    def _route(self, events: List[list]):
+        # Um único "deliver" por worker para o lote inteiro
+        batches: Dict[asyncio.StreamWriter, List[list]] = {}
+        for event in events:
+            event = self.seq.stamp(event)
+            user_id = event[0]
+            targets = self.clients.keys() if user_id is None else self.subscribers.get(user_id, ())
+            for writer in targets:
+                batches.setdefault(writer, []).append(event)
+        for writer, batch in batches.items():
+            _write_or_drop(writer, b"".join(_encode_events("deliver", batch, self.stats)), self.stats)
+
+class LocalHubBroker:
+    """Broker multiprocesso na mesma máquina via hub num socket Unix"""
+
+    distributed = True
+
+    def __init__(self, socket_path: str, linger_ms: int):
+        self.socket_path = socket_path
+        self.linger = linger_ms / 1000
+        self._deliver: Optional[Deliver] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._users: Set[int] = set()
+        self._pending: List[dict] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._hub: Optional[_Hub] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'published': 0,
+            'batches_sent': 0,
+            'delivered': 0,
+            'local_fallbacks': 0,
+            'reconnects': 0,
+            'dropped_oversized': 0,
+            'slow_connections_closed': 0,
+        }
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._run())
+
+    async def _ensure_hub(self):
+        """Subir o hub se nenhum outro processo tiver o lock"""
+        if self._server:
+            return
+        fd = os.open(self.socket_path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        # Com o lock, qualquer socket existente é de um hub que morreu
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._hub = _Hub()
+        self._server = await asyncio.start_unix_server(
+            self._hub.handle, path=self.socket_path, limit=WS_BROKER_READ_LIMIT
+        )
+        self._lock_fd = fd
+        print(f"🔌 Broker: hub de WebSockets em {self.socket_path}")
+
+    async def _run(self):
+        """Manter a conexão com o hub, reassinando os usuários a cada reconexão"""
+        delay = 0.1
+        while True:
+            try:
+                await self._ensure_hub()
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=WS_BROKER_READ_LIMIT)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+
+            delay = 0.1
+            self._writer = writer
+            if self._users:
+                self._pending.insert(0, {"op": "sub", "users": sorted(self._users)})
+            self._flush()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    frame = json.loads(line)
+                    for user_id, message, low_priority in frame.get("events", ()):
+                        self.stats['delivered'] += 1
+                        self._deliver(user_id, message, low_priority)
+            except (ConnectionError, ValueError) as e:
+                print(f"⚠️ Broker: conexão com o hub perdida: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+            self.stats['reconnects'] += 1
+
+    def _send(self, frame: dict):
+        self._pending.append(frame)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.linger, self._flush)
+
+    def _flush(self):
+        """Enviar num único write tudo o que acumulou durante a espera
+
+        A ordem dos frames é mantida: só publicações consecutivas viram um
+        lote, para que cada uma seja roteada com as assinaturas que valiam
+        quando foi feita.
+        """
+        self._flush_handle = None
+        if not self._pending or self._writer is None:
+            return
+        frames, self._pending = self._pending, []
+        events: List[list] = []
+        lines: List[bytes] = []
+        for frame in frames:
+            if frame["op"] == "pub":
+                events.append(frame["event"])
+                continue
+            if events:
+                lines.extend(_encode_events("pub", events, self.stats))
+                events = []
+            lines.append((json.dumps(frame) + "\n").encode())
+        if events:
+            lines.extend(_encode_events("pub", events, self.stats))
+        if _write_or_drop(self._writer, b"".join(lines), self.stats):
+            self.stats['batches_sent'] += 1
+
+    def subscribe(self, user_id: int):
+        if user_id not in self._users:
+            self._users.add(user_id)
+            self._send({"op": "sub", "users": [user_id]})
+
+    def unsubscribe(self, user_id: int):
+        if user_id in self._users:
+            self._users.discard(user_id)
+            self._send({"op": "unsub", "users": [user_id]})
+
+    def publish(self, user_id: Optional[int], message: Any, low_priority: Optional[bool] = None):
+        self.stats['published'] += 1
+        if self._writer is None:
+            # Sem hub no momento: ao menos os sockets deste processo recebem,
+            # sem seq (quem retomar a partir daqui recebe resync)
+            self.stats['local_fallbacks'] += 1
+            self._deliver(user_id, message, low_priority)
+            return
+        self._send({"op": "pub", "event": [user_id, message, low_priority]})
+
+    async def close(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush()
+        if self._writer:
+            await self._writer.drain()
+        if self._task:
+            self._task.cancel()
+        if self._server:
+            # Fechar os clientes faz os outros workers elegerem um novo hub
+            self._server.close()
+            self._hub.close()
+            os.unlink(self.socket_path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+
+    def get_stats(self):
+        return {
+            'backend': 'local',
+            'is_hub': self._server is not None,
+            'connected': self._writer is not None,
+            'subscribed_users': len(self._users),
+            **self.stats,
+            'hub': self._hub.stats if self._server else None,
+        }
+
+def create_broker(backend: str = WS_BROKER):
+    if backend == "memory":
+        return InMemoryBroker()
+    if backend == "local":
+        return LocalHubBroker(WS_BROKER_SOCKET, WS_BROKER_LINGER_MS)
+    raise ValueError(f"WS_BROKER inválido: {backend}")
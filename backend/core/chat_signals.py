@@ -0,0 +1,234 @@
+"""
+Coalescência de sinais do chat: "digitando" e confirmações de leitura
+
+Sem isso, cada tecla vira um frame e cada mensagem vista vira um UPDATE.
+
+- TypingThrottle repassa no máximo um "digitando" por conversa (par
+  remetente/destinatário) a cada TYPING_THROTTLE_SECONDS, descarta "parou"
+  repetidos e desliga sozinho o indicador de quem some sem avisar. Só pares
+  com conversa e sem bloqueio recebem sinais; a verificação fica em cache por
+  TYPING_PAIR_CACHE_SECONDS e é invalidada ao bloquear/desbloquear e ao
+  criar a conversa neste processo.
+- ReadReceiptBuffer guarda só o maior "lido até N" de cada leitor por
+  conversa e grava tudo a cada READ_RECEIPT_FLUSH_INTERVAL_MS, avisando o
+  outro participante uma vez por flush.
+"""
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select, update
+
+from core.cache import TTLCache
+from core.config import (
+    TYPING_THROTTLE_SECONDS, TYPING_EXPIRY_SECONDS, TYPING_PAIR_CACHE_SECONDS, READ_RECEIPT_FLUSH_INTERVAL_MS
+)
+from core.database import SessionLocal
+from core.websockets import manager
+from models.friendship import Block
+from models.message import Conversation, Message
+
+class TypingThrottle:
+    def __init__(self, throttle_seconds: float, expiry_seconds: float, pair_cache_seconds: int):
+        self.throttle = throttle_seconds
+        self.expiry = expiry_seconds
+        # (sender_id, recipient_id) -> [último "digitando" enviado, última atividade]
+        self._active: Dict[Tuple[int, int], List[float]] = {}
+        # (menor id, maior id) -> o par tem conversa e nenhum bloqueio
+        self._pairs = TTLCache(ttl_seconds=pair_cache_seconds)
+        self.stats = {
+            'received': 0,
+            'sent': 0,
+            'suppressed': 0,
+            'rejected': 0,
+            'expired': 0,
+        }
+
+    @staticmethod
+    def _pair_key(user_id: int, other_id: int) -> Tuple[int, int]:
+        return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+    @staticmethod
+    def _check_pair(user_a_id: int, user_b_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            conversation = db.query(Conversation.id).filter(
+                Conversation.user_a_id == user_a_id,
+                Conversation.user_b_id == user_b_id
+            ).first()
+            if not conversation:
+                return False
+            block = db.query(Block.id).filter(
+                ((Block.blocker_id == user_a_id) & (Block.blocked_id == user_b_id)) |
+                ((Block.blocker_id == user_b_id) & (Block.blocked_id == user_a_id))
+            ).first()
+            return block is None
+        finally:
+            db.close()
+
+    async def _pair_allowed(self, sender_id: int, recipient_id: int) -> bool:
+        key = self._pair_key(sender_id, recipient_id)
+        allowed = self._pairs.get(key)
+        if allowed is None:
+            allowed = await asyncio.to_thread(self._check_pair, *key)
+            self._pairs.set(key, allowed)
+        return allowed
+
+    def invalidate_pair(self, user_id: int, other_id: int):
+        """Esquecer a verificação do par (bloqueio, desbloqueio ou conversa nova)"""
+        self._pairs.invalidate(self._pair_key(user_id, other_id))
+
+    async def update(self, sender_id: int, recipient_id: int, is_typing: bool):
+        """Registrar um sinal do cliente, repassando só mudanças e renovações"""
+        self.stats['received'] += 1
+        key = (sender_id, recipient_id)
+        if sender_id == recipient_id or not await self._pair_allowed(sender_id, recipient_id):
+            # Ids inventados ou bloqueados não ficam ocupando _active
+            self._active.pop(key, None)
+            self.stats['rejected'] += 1
+            return
+        now = time.monotonic()
+        state = self._active.get(key)
+
+        if is_typing:
+            if state and now - state[0] < self.throttle:
+                state[1] = now
+                self.stats['suppressed'] += 1
+                return
+            self._active[key] = [now, now]
+        elif state is None:
+            self.stats['suppressed'] += 1
+            return
+        else:
+            del self._active[key]
+
+        await self._send(sender_id, recipient_id, is_typing)
+
+    async def _send(self, sender_id: int, recipient_id: int, is_typing: bool):
+        self.stats['sent'] += 1
+        await manager.send_typing_indicator(recipient_id, {
+            "sender_id": sender_id,
+            "is_typing": is_typing,
+            "expires_in": self.expiry
+        })
+
+    async def sweep(self):
+        """Desligar indicadores sem atividade há mais de expiry segundos"""
+        now = time.monotonic()
+        expired = [key for key, (_, last_activity) in self._active.items() if now - last_activity >= self.expiry]
+        for key in expired:
+            del self._active[key]
+            self.stats['expired'] += 1
+            await self._send(*key, False)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.throttle)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Erro ao expirar indicadores de digitação: {e}")
+
+    def get_stats(self):
+        return {**self.stats, 'active': len(self._active)}
+
+class ReadReceiptBuffer:
+    def __init__(self, flush_interval_ms: int):
+        self.flush_interval = flush_interval_ms / 1000
+        # (conversation_id, reader_id) -> (lido até, lado do leitor, outro participante)
+        self._pending: Dict[Tuple[int, int], Tuple[int, str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            'receipts': 0,
+            'coalesced': 0,
+            'rows_updated': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+        }
+
+    def mark(self, conversation_id: int, reader_id: int, side: str, other_id: int, up_to_id: int):
+        """Registrar "lido até up_to_id" sem tocar no banco"""
+        self.stats['receipts'] += 1
+        key = (conversation_id, reader_id)
+        current = self._pending.get(key)
+        if current:
+            self.stats['coalesced'] += 1
+            if current[0] >= up_to_id:
+                return
+        self._pending[key] = (up_to_id, side, other_id)
+
+    def pending_up_to(self, conversation_id: int, reader_id: int) -> int:
+        """Marcador ainda não gravado (0 se não houver), para leituras consistentes"""
+        entry = self._pending.get((conversation_id, reader_id))
+        return entry[0] if entry else 0
+
+    async def flush(self):
+        """Gravar os marcadores pendentes e avisar os outros participantes"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                advanced = await asyncio.to_thread(self._write_batch, batch)
+                self.stats['rows_updated'] += len(advanced)
+                self.stats['flushes'] += 1
+            except Exception as e:
+                self.stats['flush_errors'] += 1
+                print(f"❌ Erro ao gravar confirmações de leitura: {e}")
+                # Devolver o lote sem perder marcadores maiores que chegaram depois
+                for key, entry in batch.items():
+                    current = self._pending.get(key)
+                    if not current or current[0] < entry[0]:
+                        self._pending[key] = entry
+                return
+
+        for (conversation_id, reader_id), (up_to_id, _, other_id) in advanced:
+            await manager.send_message_read(other_id, {
+                "conversation_id": conversation_id,
+                "reader_id": reader_id,
+                "up_to_id": up_to_id
+            })
+
+    def _write_batch(self, batch: Dict[Tuple[int, int], Tuple[int, str, int]]) -> list:
+        db = SessionLocal()
+        try:
+            advanced = []
+            for (conversation_id, reader_id), (up_to_id, side, other_id) in batch.items():
+                last_read = getattr(Conversation, f"user_{side}_last_read_id")
+                # O marcador só avança; as não lidas são recontadas pelo índice (conversation_id, id)
+                unread_after = select(func.count(Message.id)).where(
+                    Message.conversation_id == conversation_id,
+                    Message.id > up_to_id,
+                    Message.sender_id != reader_id
+                ).scalar_subquery()
+                result = db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation_id, last_read < up_to_id)
+                    .values({last_read: up_to_id, getattr(Conversation, f"user_{side}_unread"): unread_after})
+                )
+                if result.rowcount:
+                    advanced.append(((conversation_id, reader_id), (up_to_id, side, other_id)))
+            db.commit()
+            return advanced
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self):
+        """Loop de flush periódico"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def get_stats(self):
+        return {**self.stats, 'pending': len(self._pending)}
+
+# Instâncias globais
+typing_throttle = TypingThrottle(TYPING_THROTTLE_SECONDS, TYPING_EXPIRY_SECONDS, TYPING_PAIR_CACHE_SECONDS)
+read_receipts = ReadReceiptBuffer(READ_RECEIPT_FLUSH_INTERVAL_MS)
+
+def start_chat_signals():
+    asyncio.create_task(typing_throttle.run())
+    asyncio.create_task(read_receipts.run())
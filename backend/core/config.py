@@ -10,7 +10,15 @@ load_dotenv()
 # Configurações JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))  # Curto: a sessão se renova por refresh token
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "10"))  # Abas renovando ao mesmo tempo
+PRINCIPAL_CACHE_SECONDS = int(os.getenv("PRINCIPAL_CACHE_SECONDS", "30"))  # Usuário autenticado em cache (requisições e WebSockets)
+
+# Senhas (bcrypt)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Hashes com outro custo são regravados no próximo login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # Threads dedicadas ao bcrypt
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))  # Pedidos em espera; além disso, 503
 
 # Configurações do banco de dados
 def get_database_url():
@@ -47,3 +55,84 @@ UPLOAD_DIR = "uploads"
 MAX_FILE_SIZE_MB = 50  # 50MB max for files
 MAX_AVATAR_SIZE_MB = 5  # 5MB max for avatars
 MAX_COVER_SIZE_MB = 10  # 10MB max for cover photos
+
+# Stories
+STORY_TRAY_CACHE_SECONDS = int(os.getenv("STORY_TRAY_CACHE_SECONDS", "15"))
+STORY_VIEW_FLUSH_INTERVAL_MS = int(os.getenv("STORY_VIEW_FLUSH_INTERVAL_MS", "300"))
+STORY_VIEW_MAX_PENDING = int(os.getenv("STORY_VIEW_MAX_PENDING", "5000"))  # Força flush antecipado
+STORY_VIEW_MAX_BUFFERED = int(os.getenv("STORY_VIEW_MAX_BUFFERED", "50000"))  # Acima disso (banco fora do ar) novas visualizações são descartadas
+STORY_VIEW_MAX_ATTEMPTS = int(os.getenv("STORY_VIEW_MAX_ATTEMPTS", "5"))  # Tentativas de gravação antes de descartar a visualização
+STORY_SWEEP_INTERVAL_SECONDS = int(os.getenv("STORY_SWEEP_INTERVAL_SECONDS", "300"))
+STORY_SWEEP_BATCH_SIZE = int(os.getenv("STORY_SWEEP_BATCH_SIZE", "200"))
+STORY_SWEEP_MAX_BATCHES = int(os.getenv("STORY_SWEEP_MAX_BATCHES", "25"))  # Por execução
+STORY_SWEEP_MODE = os.getenv("STORY_SWEEP_MODE", "archive")  # archive, delete
+STORY_ARCHIVE_DIR = os.getenv("STORY_ARCHIVE_DIR", "archive/stories")  # Fora de /uploads
+STORY_SWEEP_LOCK_FILE = os.getenv("STORY_SWEEP_LOCK_FILE", "/tmp/vibe-story-sweeper.lock")  # Só o worker com o lock varre
+
+# Notificações
+NOTIFICATION_GROUP_WINDOW_MINUTES = int(os.getenv("NOTIFICATION_GROUP_WINDOW_MINUTES", "60"))
+NOTIFICATION_GROUP_MAX_ACTORS = int(os.getenv("NOTIFICATION_GROUP_MAX_ACTORS", "5"))  # Ids guardados por grupo
+NOTIFICATION_PUSH_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_PUSH_WINDOW_SECONDS", "3"))
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.getenv("NOTIFICATION_OUTBOX_BATCH_SIZE", "200"))
+NOTIFICATION_OUTBOX_LINGER_MS = int(os.getenv("NOTIFICATION_OUTBOX_LINGER_MS", "50"))  # Espera para formar lotes
+NOTIFICATION_OUTBOX_POLL_SECONDS = float(os.getenv("NOTIFICATION_OUTBOX_POLL_SECONDS", "5"))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", "8"))
+NOTIFICATION_RETENTION_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_RETENTION_INTERVAL_SECONDS", "3600"))
+NOTIFICATION_RETENTION_READ_DAYS = int(os.getenv("NOTIFICATION_RETENTION_READ_DAYS", "90"))  # Lidas mais antigas são apagadas
+NOTIFICATION_RETENTION_MAX_PER_USER = int(os.getenv("NOTIFICATION_RETENTION_MAX_PER_USER", "1000"))
+NOTIFICATION_RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "1000"))  # Linhas por DELETE
+NOTIFICATION_RETENTION_MAX_BATCHES = int(os.getenv("NOTIFICATION_RETENTION_MAX_BATCHES", "50"))  # Por etapa, por execução
+NOTIFICATION_RETENTION_MAX_USERS_PER_RUN = int(os.getenv("NOTIFICATION_RETENTION_MAX_USERS_PER_RUN", "100"))  # Usuários verificados contra o limite por execução
+NOTIFICATION_RETENTION_LOCK_FILE = os.getenv("NOTIFICATION_RETENTION_LOCK_FILE", "/tmp/vibe-notification-retention.lock")  # Só o worker com o lock compacta
+NOTIFICATION_PREFERENCES_CACHE_SECONDS = int(os.getenv("NOTIFICATION_PREFERENCES_CACHE_SECONDS", "60"))  # Invalidado via broker; o TTL só cobre o hub fora do ar
+
+# WebSockets
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # Frames pendentes por conexão
+WS_REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "200"))  # Eventos guardados por usuário para replay
+WS_REPLAY_WINDOW_SECONDS = int(os.getenv("WS_REPLAY_WINDOW_SECONDS", "600"))
+WS_REPLAY_MAX_USERS = int(os.getenv("WS_REPLAY_MAX_USERS", "10000"))
+WS_BROKER = os.getenv("WS_BROKER", "memory")  # memory (um processo), local (vários workers na mesma máquina)
+WS_BROKER_SOCKET = os.getenv("WS_BROKER_SOCKET", "/tmp/vibe-ws-broker.sock")
+WS_BROKER_LINGER_MS = int(os.getenv("WS_BROKER_LINGER_MS", "2"))  # Espera para agrupar publicações
+WS_BROKER_MAX_FRAME_BYTES = int(os.getenv("WS_BROKER_MAX_FRAME_BYTES", str(256 * 1024)))  # Lotes maiores viram várias linhas
+WS_BROKER_READ_LIMIT = int(os.getenv("WS_BROKER_READ_LIMIT", str(8 * 1024 * 1024)))  # Maior linha aceita no socket; eventos maiores são descartados
+WS_BROKER_MAX_BUFFER_BYTES = int(os.getenv("WS_BROKER_MAX_BUFFER_BYTES", str(4 * 1024 * 1024)))  # Buffer de escrita acima disso derruba a conexão lenta
+WS_BROKER_SEQ_MAX_USERS = int(os.getenv("WS_BROKER_SEQ_MAX_USERS", "200000"))  # Contadores de seq guardados pelo hub (LRU)
+WS_HEARTBEAT_INTERVAL_SECONDS = int(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "25"))
+WS_HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("WS_HEARTBEAT_TIMEOUT_SECONDS", "60"))  # Sem nenhum frame do cliente
+PRESENCE_FLUSH_INTERVAL_SECONDS = int(os.getenv("PRESENCE_FLUSH_INTERVAL_SECONDS", "30"))  # Gravação de last_seen em lote
+PRESENCE_LAST_SEEN_CACHE_SECONDS = int(os.getenv("PRESENCE_LAST_SEEN_CACHE_SECONDS", "600"))  # Depois disso o last_seen é lido do banco
+PRESENCE_MAX_TRACKED_USERS = int(os.getenv("PRESENCE_MAX_TRACKED_USERS", "50000"))  # last_seen em memória, despejo LRU
+TYPING_THROTTLE_SECONDS = float(os.getenv("TYPING_THROTTLE_SECONDS", "3"))  # No máximo um "digitando" por conversa nesse intervalo
+TYPING_EXPIRY_SECONDS = float(os.getenv("TYPING_EXPIRY_SECONDS", "6"))  # Sem atividade, o indicador é desligado pelo servidor
+TYPING_PAIR_CACHE_SECONDS = int(os.getenv("TYPING_PAIR_CACHE_SECONDS", "60"))  # Cache de "o par pode trocar digitando" (conversa e bloqueio)
+READ_RECEIPT_FLUSH_INTERVAL_MS = int(os.getenv("READ_RECEIPT_FLUSH_INTERVAL_MS", "1000"))  # Gravação de "lido até" em lote
+
+# Rate limiting (janela deslizante por contador, memória constante por chave)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory (um processo), shared (workers da mesma máquina)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Chaves ociosas saem por LRU
+RATE_LIMIT_SHM_NAME = os.getenv("RATE_LIMIT_SHM_NAME", "vibe-rate-limit")
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "300"))  # Por IP
+RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "5000"))  # Por usuário autenticado
+# Limites por rota, contados por IP além do global: (método, prefixo do caminho, limite, janela em segundos)
+def parse_rate_limit_routes(value: str):
+    """Ler "MÉTODO /prefixo=limite/janela" separados por vírgula (ex.: "POST /auth/login=20/60")"""
+    routes = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            route, rule = item.rsplit("=", 1)
+            method, prefix = route.split()
+            limit, window = rule.split("/")
+            routes.append((method.upper(), prefix, int(limit), int(window)))
+        except ValueError:
+            raise ValueError(f"RATE_LIMIT_ROUTES inválido em {item!r}: use MÉTODO /prefixo=limite/janela")
+    return routes
+
+RATE_LIMIT_ROUTES = parse_rate_limit_routes(os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "POST /auth/login=20/60, POST /auth/register=10/3600, POST /auth/refresh=30/60, "
+    "POST /email-verification=10/600, POST /upload=60/3600, POST /messages=120/60"
+))
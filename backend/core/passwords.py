@@ -0,0 +1,85 @@
+"""
+Hash e verificação de senhas fora do event loop
+
+Cada bcrypt custa centenas de milissegundos de CPU; rodando direto numa rota
+async ele congela todas as requisições e WebSockets do worker. Aqui o
+trabalho vai para um pool de threads próprio e pequeno (PASSWORD_HASH_WORKERS)
+com fila limitada (PASSWORD_HASH_MAX_QUEUE): com a fila cheia a requisição
+recebe 503 na hora, em vez de esperar atrás de uma rajada de logins.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from core.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+from core.security import hash_password, verify_and_update_password
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # Pedidos enviados ao pool e ainda não concluídos (rodando + na fila)
+        self._in_flight = 0
+        self.stats = {
+            'hashes': 0,
+            'verifications': 0,
+            'rehashes': 0,
+            'rejected': 0,
+            'peak_in_flight': 0,
+            'total_ms': 0.0,
+        }
+
+    def _done(self, started: float):
+        self._in_flight -= 1
+        self.stats['total_ms'] += (time.monotonic() - started) * 1000
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self.workers + self.max_queue:
+            self.stats['rejected'] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado. Tente novamente em instantes.",
+                headers={"Retry-After": "1"}
+            )
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        self._in_flight += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self._in_flight)
+        future = self._executor.submit(fn, *args)
+        # O contador só cai quando a thread termina, mesmo se o cliente desistir antes
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._done, started))
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """Gerar o hash bcrypt de uma senha nova"""
+        hashed_password = await self._run(hash_password, password)
+        self.stats['hashes'] += 1
+        return hashed_password
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verificar a senha; devolve também o hash novo se o custo configurado mudou"""
+        valid, new_hash = await self._run(verify_and_update_password, password, hashed_password)
+        self.stats['verifications'] += 1
+        if new_hash:
+            self.stats['rehashes'] += 1
+        return valid, new_hash
+
+    def get_stats(self):
+        completed = self.stats['hashes'] + self.stats['verifications']
+        return {
+            **self.stats,
+            'total_ms': round(self.stats['total_ms'], 1),
+            'in_flight': self._in_flight,
+            'queued': max(0, self._in_flight - self.workers),
+            'avg_ms': round(self.stats['total_ms'] / completed, 1) if completed > 0 else 0,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+        }
+
+# Instância global
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
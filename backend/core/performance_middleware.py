@@ -42,6 +42,7 @@ class PerformanceMiddleware:
             '/auth/register',
             '/upload',
             '/messages',
+            '/stories/tray',  # Cache próprio por usuário com TTL curto
         ]
     
     def should_cache_endpoint(self, path: str, method: str) -> bool:
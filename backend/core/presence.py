@@ -0,0 +1,206 @@
+"""
+Presença (online/offline) e last_seen
+
+O gerenciador de WebSockets marca o usuário como online ao conectar, offline
+ao cair o último socket, e cada frame recebido atualiza o last_seen. O
+last_seen vai para o banco em lote, num único UPDATE periódico, em vez de um
+UPDATE por evento.
+
+Cada processo conta só os próprios sockets. As transições (primeiro socket
+aberto, último fechado) são avisadas aos outros workers pelo canal de
+controle do manager, e a cada PRESENCE_FLUSH_INTERVAL_SECONDS cada worker
+republica a lista completa de quem está online nele. A lista de um worker
+que para de republicar expira, então um worker que morreu não deixa
+usuários presos como online.
+
+O last_seen em memória é um cache limitado; quem não está nele (nunca
+passou por este processo, ou já foi gravado e expirou) é lido de
+users.last_seen.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import (
+    PRESENCE_FLUSH_INTERVAL_SECONDS, PRESENCE_LAST_SEEN_CACHE_SECONDS, PRESENCE_MAX_TRACKED_USERS
+)
+from core.database import SessionLocal
+from models.user import User
+
+# Sem republicação por esse número de intervalos, a lista do worker expira
+REMOTE_EXPIRY_INTERVALS = 3
+
+class PresenceService:
+    def __init__(self, flush_interval_seconds: int, last_seen_cache_seconds: int, max_tracked_users: int):
+        self.flush_interval = flush_interval_seconds
+        self.worker_id = uuid.uuid4().hex
+        # user_id -> número de sockets abertos neste processo
+        self._online: Dict[int, int] = {}
+        # worker -> (usuários online nele, expiração)
+        self._remote: Dict[str, Tuple[Set[int], float]] = {}
+        self._last_seen = TTLCache(last_seen_cache_seconds, max_tracked_users)
+        # last_seen ainda não gravado
+        self._pending: Dict[int, datetime] = {}
+        self._publish: Optional[Callable[[Any], None]] = None
+        self.stats = {
+            'flushes': 0,
+            'rows_updated': 0,
+            'flush_errors': 0,
+            'db_lookups': 0,
+        }
+
+    def attach(self, publish: Callable[[Any], None]):
+        """Definir como avisar os outros workers (o manager faz isso ao subir)"""
+        self._publish = publish
+
+    def mark_online(self, user_id: int):
+        self._online[user_id] = self._online.get(user_id, 0) + 1
+        self.touch(user_id)
+        if self._online[user_id] == 1:
+            self._announce("online", user_id)
+
+    def mark_offline(self, user_id: int):
+        remaining = self._online.get(user_id, 0) - 1
+        if remaining > 0:
+            self._online[user_id] = remaining
+        else:
+            self._online.pop(user_id, None)
+        self.touch(user_id)
+        if remaining <= 0:
+            self._announce("offline", user_id)
+
+    def touch(self, user_id: int):
+        now = datetime.utcnow()
+        self._last_seen.set(user_id, now)
+        self._pending[user_id] = now
+
+    def _announce(self, op: str, user_id: int):
+        if self._publish:
+            self._publish({
+                "worker": self.worker_id,
+                "op": op,
+                "user_id": user_id,
+                "last_seen": datetime.utcnow().isoformat()
+            })
+
+    def _announce_all(self):
+        if self._publish:
+            self._publish({"worker": self.worker_id, "op": "sync", "users": list(self._online)})
+
+    def apply_remote(self, data: dict):
+        """Aplicar um aviso de presença de outro worker"""
+        worker = data.get("worker")
+        if worker == self.worker_id:
+            return
+        expires_at = time.monotonic() + self.flush_interval * REMOTE_EXPIRY_INTERVALS
+        op = data.get("op")
+        if op == "sync":
+            self._remote[worker] = (set(data.get("users", ())), expires_at)
+            return
+        users, current_expiry = self._remote.get(worker, (set(), expires_at))
+        user_id = data["user_id"]
+        if op == "online":
+            users.add(user_id)
+        else:
+            users.discard(user_id)
+        self._remote[worker] = (users, current_expiry)
+        if data.get("last_seen"):
+            self._last_seen.set(user_id, datetime.fromisoformat(data["last_seen"]))
+
+    def _is_online_remotely(self, user_id: int) -> bool:
+        now = time.monotonic()
+        return any(user_id in users and now < expires_at for users, expires_at in self._remote.values())
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._online or self._is_online_remotely(user_id)
+
+    def get_many(self, user_ids: Iterable[int], db: Optional[Session] = None) -> Dict[int, dict]:
+        """Presença de vários usuários; last_seen fora da memória vem do banco"""
+        user_ids = list(user_ids)
+        last_seen = {user_id: self._last_seen.get(user_id) for user_id in user_ids}
+        missing = [user_id for user_id, seen_at in last_seen.items() if seen_at is None]
+        if missing and db is not None:
+            self.stats['db_lookups'] += 1
+            rows = db.execute(select(User.id, User.last_seen).where(User.id.in_(missing))).all()
+            for row in rows:
+                if row.last_seen:
+                    last_seen[row.id] = row.last_seen
+                    # O banco pode ficar até um intervalo atrás dos outros workers
+                    self._last_seen.set(row.id, row.last_seen, self.flush_interval)
+
+        result = {}
+        for user_id in user_ids:
+            seen_at = last_seen.get(user_id)
+            result[user_id] = {
+                "online": self.is_online(user_id),
+                "last_seen": seen_at.isoformat() if seen_at else None
+            }
+        return result
+
+    async def flush(self):
+        """Gravar os last_seen pendentes num único UPDATE"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            self.stats['rows_updated'] += await asyncio.to_thread(self._write_batch, batch)
+            self.stats['flushes'] += 1
+        except Exception as e:
+            self.stats['flush_errors'] += 1
+            print(f"❌ Erro ao gravar last_seen: {e}")
+            for user_id, seen_at in batch.items():
+                self._pending.setdefault(user_id, seen_at)
+
+    def _write_batch(self, batch: Dict[int, datetime]) -> int:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(User)
+                .where(User.id.in_(list(batch)))
+                .values(last_seen=case(batch, value=User.id))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount or 0
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _prune_remote(self):
+        now = time.monotonic()
+        for worker in [worker for worker, (_, expires_at) in self._remote.items() if now >= expires_at]:
+            del self._remote[worker]
+
+    async def run(self):
+        """Loop de gravação periódica e republicação da presença deste worker"""
+        while True:
+            self._announce_all()
+            await asyncio.sleep(self.flush_interval)
+            self._prune_remote()
+            self._last_seen.clear_expired()
+            await self.flush()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'online_users': len(self._online),
+            'remote_workers': len(self._remote),
+            'tracked_last_seen': len(self._last_seen),
+            'pending': len(self._pending)
+        }
+
+# Instância global de presença
+presence = PresenceService(
+    PRESENCE_FLUSH_INTERVAL_SECONDS, PRESENCE_LAST_SEEN_CACHE_SECONDS, PRESENCE_MAX_TRACKED_USERS
+)
+
+def start_presence_flusher():
+    asyncio.create_task(presence.run())
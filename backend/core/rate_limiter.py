@@ -0,0 +1,171 @@
+"""
+Rate limiting por janela deslizante com contadores
+
+Cada chave guarda só três números: o índice da janela atual, o contador
+dela e o da anterior. A contagem estimada pondera a janela anterior pela
+fração que ainda cai dentro dos últimos `window` segundos, o que dá memória
+constante por chave e custo O(1) por requisição (em vez de uma fila com o
+horário de cada requisição).
+
+Os contadores ficam num store:
+- MemoryRateLimitStore: dicionário LRU limitado a max_keys, por processo.
+- SharedMemoryRateLimitStore: tabela de tamanho fixo em memória
+  compartilhada, protegida por flock, para que os workers da mesma máquina
+  contem juntos. Quando a vizinhança de uma chave está cheia, a entrada
+  acessada há mais tempo é reaproveitada.
+"""
+import fcntl
+import hashlib
+import os
+import struct
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Tuple
+
+from core.config import RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHM_NAME
+
+def _slide(window_index: int, current: int, previous: int, now: float, window: float,
+           limit: int, cost: int) -> Tuple[bool, float, int, int]:
+    """Avançar a janela de uma chave e tentar consumir `cost`
+
+    Devolve (permitido, contagem estimada, contador atual, contador anterior).
+    Com cost=0 só consulta, sem contar.
+    """
+    now_index = int(now // window)
+    if now_index != window_index:
+        previous = current if now_index == window_index + 1 else 0
+        current = 0
+
+    elapsed = (now % window) / window
+    estimated = previous * (1 - elapsed) + current
+    allowed = estimated + cost <= limit if cost else estimated < limit
+    if allowed:
+        current += cost
+        estimated += cost
+    return allowed, estimated, current, previous
+
+class MemoryRateLimitStore:
+    """Contadores deste processo, com despejo LRU das chaves ociosas"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # chave -> [índice da janela, atual, anterior]
+        self._counters: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.stats = {'evictions': 0}
+
+    def hit(self, key: str, limit: int, window: float, now: float, cost: int = 1) -> Tuple[bool, float]:
+        entry = self._counters.get(key)
+        if entry is None:
+            entry = [int(now // window), 0, 0]
+            self._counters[key] = entry
+            if len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+                self.stats['evictions'] += 1
+        else:
+            self._counters.move_to_end(key)
+
+        allowed, estimated, entry[1], entry[2] = _slide(entry[0], entry[1], entry[2], now, window, limit, cost)
+        entry[0] = int(now // window)
+        return allowed, estimated
+
+    def get_stats(self):
+        return {'backend': 'memory', 'keys': len(self._counters), 'max_keys': self.max_keys, **self.stats}
+
+class SharedMemoryRateLimitStore:
+    """Contadores numa tabela de slots em memória compartilhada entre os workers da máquina"""
+
+    # hash da chave, índice da janela, atual, anterior, último acesso
+    SLOT = struct.Struct("<QqIId")
+    PROBES = 8
+
+    def __init__(self, name: str, slots: int):
+        size = slots * self.SLOT.size
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        # A tabela pertence à máquina, não a um worker: sem isso o primeiro
+        # processo a sair apagaria o segmento dos outros
+        try:
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception:
+            pass
+        self.slots = self._shm.size // self.SLOT.size
+        self._lock_fd = os.open(f"/tmp/{name}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+        self.stats = {'evictions': 0}
+
+    @staticmethod
+    def _key_hash(key: str) -> int:
+        # 0 marca slot vazio
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def hit(self, key: str, limit: int, window: float, now: float, cost: int = 1) -> Tuple[bool, float]:
+        key_hash = self._key_hash(key)
+        buf = self._shm.buf
+        start = key_hash % self.slots
+
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            target, state = None, None
+            oldest, oldest_access = None, None
+            for probe in range(min(self.PROBES, self.slots)):
+                offset = ((start + probe) % self.slots) * self.SLOT.size
+                slot = self.SLOT.unpack_from(buf, offset)
+                if slot[0] == key_hash:
+                    target, state = offset, slot
+                    break
+                if slot[0] == 0:
+                    if target is None:
+                        target = offset
+                    continue
+                if oldest_access is None or slot[4] < oldest_access:
+                    oldest, oldest_access = offset, slot[4]
+
+            if state is None:
+                if target is None:
+                    target = oldest
+                    self.stats['evictions'] += 1
+                state = (key_hash, int(now // window), 0, 0, now)
+
+            allowed, estimated, current, previous = _slide(state[1], state[2], state[3], now, window, limit, cost)
+            self.SLOT.pack_into(buf, target, key_hash, int(now // window), current, previous, now)
+            return allowed, estimated
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def get_stats(self):
+        return {'backend': 'shared', 'slots': self.slots, **self.stats}
+
+def create_rate_limit_store(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "memory":
+        return MemoryRateLimitStore(RATE_LIMIT_MAX_KEYS)
+    if backend == "shared":
+        return SharedMemoryRateLimitStore(RATE_LIMIT_SHM_NAME, RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"RATE_LIMIT_BACKEND inválido: {backend}")
+
+class RateLimiter:
+    """Limites nomeados sobre um store de contadores"""
+
+    def __init__(self, store):
+        self.store = store
+        self.stats = {'checked': 0, 'limited': 0}
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> Tuple[bool, float]:
+        """Contar uma requisição para a chave; devolve (permitida, segundos até tentar de novo)"""
+        self.stats['checked'] += 1
+        now = time.time()
+        allowed, _ = self.store.hit(key, limit, window, now, cost)
+        if allowed:
+            return True, 0.0
+        self.stats['limited'] += 1
+        # A contagem estimada cai com o fim da janela atual
+        return False, window - (now % window)
+
+    def peek(self, key: str, limit: int, window: float) -> bool:
+        """Ainda há folga para a chave? (não conta a requisição)"""
+        allowed, _ = self.store.hit(key, limit, window, time.time(), cost=0)
+        return allowed
+
+    def get_stats(self):
+        return {**self.stats, 'store': self.store.get_stats()}
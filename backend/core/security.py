@@ -1,19 +1,36 @@
 """
 Utilitários de segurança, autenticação e JWT
 """
+import asyncio
+import hashlib
+import secrets
+import uuid
+from dataclasses import dataclass, fields
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Hashable, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from .config import SECRET_KEY, ALGORITHM
-from .database import get_db
+from .cache import TTLCache
+from .config import (
+    SECRET_KEY, ALGORITHM, PRINCIPAL_CACHE_SECONDS, BCRYPT_ROUNDS,
+    REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKEN_REUSE_GRACE_SECONDS
+)
+from .database import SessionLocal, get_db
+from .websockets import manager
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: o custo fica fixo em BCRYPT_ROUNDS, então qualquer hash com
+# outro custo aparece como "precisa atualizar" em verify_and_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 
 # OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -26,6 +43,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a new hash when the stored one uses an outdated cost"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -37,44 +58,229 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user"""
-    from models.user import User  # Import here to avoid circular imports
-    
-    credentials_exception = HTTPException(
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail="Refresh token inválido ou expirado",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None):
+    """Emitir um refresh token opaco e guardar só o hash (sem commit)
+
+    Sem family_id é um login novo: abre uma família e aproveita para apagar
+    os tokens expirados do usuário.
+    """
+    from models.refresh_token import RefreshToken  # Import here to avoid circular imports
+
+    now = datetime.utcnow()
+    if family_id is None:
+        family_id = str(uuid.uuid4())
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+
+    token = secrets.token_urlsafe(48)
+    row = RefreshToken(
+        user_id=user_id,
+        family_id=family_id,
+        token_hash=_hash_refresh_token(token),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    db.add(row)
+    db.flush()
+    return row, token
+
+def revoke_refresh_family(db: Session, family_id: str):
+    """Revogar todos os tokens ainda válidos de uma sessão (sem commit)"""
+    from models.refresh_token import RefreshToken  # Import here to avoid circular imports
+
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def rotate_refresh_token(db: Session, token: str):
+    """Trocar um refresh token válido pelo próximo da família (sem commit)
+
+    Reuso de um token já trocado revoga a família inteira, exceto dentro de
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS, quando duas abas renovam juntas.
+    """
+    from models.refresh_token import RefreshToken  # Import here to avoid circular imports
+
+    now = datetime.utcnow()
+    current = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == _hash_refresh_token(token)
+    ).with_for_update().first()
+    if current is None or current.expires_at <= now:
+        raise _invalid_refresh_token()
+
+    if current.revoked_at is not None:
+        concurrent_rotation = (
+            current.replaced_by_id is not None
+            and now - current.revoked_at <= timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+        )
+        if not concurrent_rotation:
+            revoke_refresh_family(db, current.family_id)
+            db.commit()
+            raise _invalid_refresh_token()
+
+    row, new_token = issue_refresh_token(db, current.user_id, current.family_id)
+    if current.revoked_at is None:
+        current.revoked_at = now
+        current.replaced_by_id = row.id
+    return row, new_token
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    """Logout: revogar a sessão (família) do refresh token, se ele existir (sem commit)"""
+    from models.refresh_token import RefreshToken  # Import here to avoid circular imports
+
+    family_id = db.query(RefreshToken.family_id).filter(
+        RefreshToken.token_hash == _hash_refresh_token(token)
+    ).scalar()
+    if family_id is None:
+        return False
+    revoke_refresh_family(db, family_id)
+    return True
+
+@dataclass(frozen=True)
+class Principal:
+    """Usuário autenticado, resumido e imutável, guardado em cache entre requisições
+
+    Basta para os handlers que só precisam do id e dos dados de exibição;
+    quem altera ou devolve o registro inteiro usa get_current_user ou load().
+    """
+    id: int
+    email: str
+    username: Optional[str]
+    first_name: str
+    last_name: str
+    avatar: Optional[str]
+    is_active: Optional[bool]
+    account_status: Optional[str]
+
+    def load(self, db: Session):
+        """Carregar o User completo (ORM) sob demanda, com a bio; password_hash segue adiado"""
+        from models.user import User  # Import here to avoid circular imports
+        return db.get(User, self.id, options=[undefer(User.bio)])
+
+PRINCIPAL_FIELDS = tuple(field.name for field in fields(Principal))
+
+# Chave do token (user_id ou email) -> Principal, ou False para usuário inexistente
+principal_cache = TTLCache(ttl_seconds=PRINCIPAL_CACHE_SECONDS)
+_principal_inflight: Dict[Hashable, asyncio.Future] = {}
+
+def _token_key(token: str) -> Optional[Tuple[str, Any]]:
+    """Decodificar o JWT localmente e devolver a chave do cache de principals"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        return None
+    if payload.get("status", "active") != "active":
+        # Claim de situação da conta: token de conta fora do ar nem chega ao banco
+        return None
+    if payload.get("user_id") is not None:
+        return ("id", payload["user_id"])
+    if payload.get("sub") is not None:
+        # Tokens antigos, emitidos antes do claim user_id
+        return ("email", payload["sub"])
+    return None
 
-def verify_websocket_token(token: str):
-    """Verify a WebSocket token"""
+def _load_principal(key: Tuple[str, Any]) -> Optional[Principal]:
+    """Consulta bloqueante só das colunas do principal (roda no threadpool)"""
     from models.user import User  # Import here to avoid circular imports
-    from .database import SessionLocal
-    
+
+    db = SessionLocal()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        kind, value = key
+        column = User.id if kind == "id" else User.email
+        row = db.query(*[getattr(User, name) for name in PRINCIPAL_FIELDS]).filter(column == value).first()
+        if row is None:
             return None
-        
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter(User.email == email).first()
-            return user
-        finally:
-            db.close()
-    except JWTError:
+        values = row._asdict()
+        status_value = values["account_status"]
+        values["account_status"] = getattr(status_value, "value", status_value)
+        return Principal(**values)
+    finally:
+        db.close()
+
+def _store_principal(key: Hashable, future: asyncio.Future):
+    if _principal_inflight.get(key) is not future:
+        # Invalidado durante a consulta: o resultado pode ser anterior à mudança
+        return
+    del _principal_inflight[key]
+    if not future.cancelled() and future.exception() is None:
+        principal_cache.set(key, future.result() or False)
+
+async def resolve_principal(token: str) -> Optional[Principal]:
+    """Principal do token: cache curto, e no miss uma única consulta por chave fora do event loop
+
+    Requisições simultâneas do mesmo usuário (ou uma tempestade de reconexões
+    de WebSocket) compartilham a mesma consulta.
+    """
+    key = _token_key(token)
+    if key is None:
+        return None
+
+    cached = principal_cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    inflight = _principal_inflight.get(key)
+    if inflight is None:
+        inflight = asyncio.ensure_future(asyncio.to_thread(_load_principal, key))
+        _principal_inflight[key] = inflight
+        inflight.add_done_callback(lambda future: _store_principal(key, future))
+    return await asyncio.shield(inflight)
+
+def _invalidate_local_principal(data: dict):
+    for key in (("id", data["user_id"]), ("email", data.get("email"))):
+        principal_cache.invalidate(key)
+        _principal_inflight.pop(key, None)
+
+def invalidate_principal(user_id: int, email: Optional[str] = None):
+    """Descartar o principal em cache após mudar perfil, situação da conta ou senha
+
+    Limpa este processo na hora e avisa os outros workers pelo broker.
+    """
+    data = {"user_id": user_id, "email": email}
+    _invalidate_local_principal(data)
+    manager.publish_control("principal", data)
+
+manager.on_control("principal", _invalidate_local_principal)
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Get the current authenticated principal (cached, no ORM load)"""
+    principal = await resolve_principal(token)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Get the current authenticated user as a full ORM object"""
+    user = principal.load(db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+async def verify_websocket_token(token: str) -> Optional[int]:
+    """Validar o token de um handshake de WebSocket e devolver o id do usuário ativo"""
+    principal = await resolve_principal(token)
+    if principal is None or principal.is_active is False:
         return None
+    return principal.id
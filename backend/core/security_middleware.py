@@ -1,25 +1,25 @@
 """
 Middleware de segurança avançado para proteção contra ataques
 """
-import time
-import hashlib
 import ipaddress
-from typing import Dict, List, Optional, Set
-from collections import defaultdict, deque
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
 import re
 
+from core.config import (
+    SECRET_KEY, ALGORITHM, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_PER_HOUR, RATE_LIMIT_ROUTES
+)
+from core.rate_limiter import RateLimiter, create_rate_limit_store
+
 class SecurityMiddleware:
     def __init__(self):
-        # Rate limiting por IP
-        self.ip_requests: Dict[str, deque] = defaultdict(lambda: deque())
-        # Rate limiting por usuário
-        self.user_requests: Dict[str, deque] = defaultdict(lambda: deque())
-        # Tentativas de login falhadas
-        self.failed_login_attempts: Dict[str, List[datetime]] = defaultdict(list)
-        # IPs bloqueados temporariamente
+        # Rate limiting por IP, por usuário, por rota e tentativas de login falhadas
+        # (contadores de janela deslizante, ver core.rate_limiter)
+        self.rate_limiter = RateLimiter(create_rate_limit_store())
+        # IPs bloqueados temporariamente -> fim do bloqueio
         self.blocked_ips: Dict[str, datetime] = {}
         # Padrões suspeitos
         self.suspicious_patterns = [
@@ -41,8 +41,9 @@ class SecurityMiddleware:
         self.trusted_ips = {'127.0.0.1', '::1', 'localhost'}
         
         # Configurações
-        self.MAX_REQUESTS_PER_MINUTE = 300  # Aumentado para desenvolvimento
-        self.MAX_REQUESTS_PER_HOUR = 5000   # Aumentado para desenvolvimento
+        self.MAX_REQUESTS_PER_MINUTE = RATE_LIMIT_PER_MINUTE
+        self.MAX_REQUESTS_PER_HOUR = RATE_LIMIT_PER_HOUR
+        self.ROUTE_LIMITS = RATE_LIMIT_ROUTES
         self.MAX_LOGIN_ATTEMPTS = 5
         self.LOGIN_LOCKOUT_DURATION = timedelta(minutes=15)
         self.BLOCKED_IP_DURATION = timedelta(hours=1)
@@ -78,7 +79,7 @@ class SecurityMiddleware:
             return False
             
         if ip in self.blocked_ips:
-            if datetime.now() - self.blocked_ips[ip] < self.BLOCKED_IP_DURATION:
+            if datetime.now() < self.blocked_ips[ip]:
                 return True
             else:
                 # Remover bloqueio expirado
@@ -88,53 +89,57 @@ class SecurityMiddleware:
     def block_ip(self, ip: str, duration: Optional[timedelta] = None):
         """Bloquear IP temporariamente"""
         if ip not in self.trusted_ips:
-            self.blocked_ips[ip] = datetime.now()
+            self.blocked_ips[ip] = datetime.now() + (duration or self.BLOCKED_IP_DURATION)
             print(f"🚫 IP {ip} bloqueado por {duration or self.BLOCKED_IP_DURATION}")
     
-    def check_rate_limit(self, ip: str, user_id: Optional[str] = None) -> bool:
-        """Verificar rate limiting"""
-        now = time.time()
-        minute_ago = now - 60
-        hour_ago = now - 3600
-        
-        # Limpar requests antigos
-        ip_queue = self.ip_requests[ip]
-        while ip_queue and ip_queue[0] < minute_ago:
-            ip_queue.popleft()
-        
-        # Verificar limite por minuto
-        if len(ip_queue) >= self.MAX_REQUESTS_PER_MINUTE:
-            print(f"⚠️ Rate limit excedido para IP {ip}: {len(ip_queue)} requests no último minuto")
-            return False
-        
-        # Adicionar request atual
-        ip_queue.append(now)
-        
+    def get_user_key(self, request: Request) -> Optional[str]:
+        """Chave de rate limit do usuário autenticado (estável entre renovações do token)"""
+        auth_header = request.headers.get('authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+        try:
+            payload = jwt.decode(auth_header.split(' ')[1], SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            # Token inválido: a rota responde 401, e o IP continua limitado
+            return None
+        if payload.get("user_id") is not None:
+            return f"id:{payload['user_id']}"
+        return f"email:{payload['sub']}" if payload.get("sub") else None
+
+    def check_rate_limit(self, ip: str, user_key: Optional[str] = None,
+                         method: str = "GET", path: str = "/") -> Optional[Tuple[str, float]]:
+        """Verificar rate limiting; devolve (escopo, segundos para tentar de novo) se excedido"""
+        allowed, retry_after = self.rate_limiter.hit(f"ip:{ip}", self.MAX_REQUESTS_PER_MINUTE, 60)
+        if not allowed:
+            print(f"⚠️ Rate limit excedido para IP {ip}: mais de {self.MAX_REQUESTS_PER_MINUTE} requests no último minuto")
+            return "ip", retry_after
+
         # Verificar limite por hora para usuários autenticados
-        if user_id:
-            user_queue = self.user_requests[user_id]
-            while user_queue and user_queue[0] < hour_ago:
-                user_queue.popleft()
-            
-            if len(user_queue) >= self.MAX_REQUESTS_PER_HOUR:
-                print(f"⚠️ Rate limit excedido para usuário {user_id}: {len(user_queue)} requests na última hora")
-                return False
-            
-            user_queue.append(now)
-        
-        return True
+        if user_key:
+            allowed, retry_after = self.rate_limiter.hit(f"user:{user_key}", self.MAX_REQUESTS_PER_HOUR, 3600)
+            if not allowed:
+                print(f"⚠️ Rate limit excedido para usuário {user_key}: mais de {self.MAX_REQUESTS_PER_HOUR} requests na última hora")
+                return "user", retry_after
+
+        # Limites próprios da rota (a primeira regra que casar)
+        for route_method, prefix, limit, window in self.ROUTE_LIMITS:
+            if method == route_method and path.startswith(prefix):
+                allowed, retry_after = self.rate_limiter.hit(f"route:{prefix}:{ip}", limit, window)
+                if not allowed:
+                    print(f"⚠️ Rate limit da rota {method} {prefix} excedido para IP {ip}")
+                    return "route", retry_after
+                break
+
+        return None
     
+    def _login_key(self, ip: str, email: str) -> str:
+        return f"login:{ip}:{email}"
+
     def check_login_attempts(self, ip: str, email: str) -> bool:
         """Verificar tentativas de login falhadas"""
-        now = datetime.now()
-        key = f"{ip}:{email}"
-        
-        # Limpar tentativas antigas
-        attempts = self.failed_login_attempts[key]
-        attempts[:] = [attempt for attempt in attempts if now - attempt < self.LOGIN_LOCKOUT_DURATION]
-        
-        # Verificar se excedeu o limite
-        if len(attempts) >= self.MAX_LOGIN_ATTEMPTS:
+        if not self.rate_limiter.peek(
+            self._login_key(ip, email), self.MAX_LOGIN_ATTEMPTS, self.LOGIN_LOCKOUT_DURATION.total_seconds()
+        ):
             print(f"🚫 Muitas tentativas de login falhadas para {email} do IP {ip}")
             return False
         
@@ -142,11 +147,12 @@ class SecurityMiddleware:
     
     def record_failed_login(self, ip: str, email: str):
         """Registrar tentativa de login falhada"""
-        key = f"{ip}:{email}"
-        self.failed_login_attempts[key].append(datetime.now())
+        key = self._login_key(ip, email)
+        window = self.LOGIN_LOCKOUT_DURATION.total_seconds()
+        self.rate_limiter.hit(key, self.MAX_LOGIN_ATTEMPTS, window)
         
         # Bloquear IP se muitas tentativas
-        if len(self.failed_login_attempts[key]) >= self.MAX_LOGIN_ATTEMPTS:
+        if not self.rate_limiter.peek(key, self.MAX_LOGIN_ATTEMPTS, window):
             self.block_ip(ip, self.LOGIN_LOCKOUT_DURATION)
     
     def detect_suspicious_patterns(self, content: str) -> List[str]:
@@ -220,18 +226,17 @@ class SecurityMiddleware:
             )
         
         # 2. Verificar rate limiting
-        user_id = None
-        auth_header = request.headers.get('authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            # Extrair user_id do token (implementação simplificada)
-            token = auth_header.split(' ')[1]
-            user_id = hashlib.md5(token.encode()).hexdigest()[:8]
-        
-        if not self.check_rate_limit(ip, user_id):
-            self.block_ip(ip, timedelta(minutes=5))
+        limited = self.check_rate_limit(ip, self.get_user_key(request), request.method, request.url.path)
+        if limited:
+            scope, retry_after = limited
+            if scope != "route":
+                # Excesso geral bloqueia o IP; o de uma rota só recusa aquela rota
+                self.block_ip(ip, timedelta(minutes=5))
+                retry_after = max(retry_after, 300)
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={"detail": "Muitas requisições. Tente novamente em alguns minutos."}
+                content={"detail": "Muitas requisições. Tente novamente em alguns minutos."},
+                headers={"Retry-After": str(int(retry_after) + 1)}
             )
         
         # 3. Verificar tamanho da requisição
@@ -262,6 +267,12 @@ class SecurityMiddleware:
         
         return None  # Continuar processamento normal
 
+    def get_stats(self):
+        return {
+            'rate_limit': self.rate_limiter.get_stats(),
+            'blocked_ips': len(self.blocked_ips),
+        }
+
 # Instância global do middleware
 security_middleware = SecurityMiddleware()
 
@@ -1,65 +1,457 @@
 """
 Gerenciador de WebSockets
+
+Registro único de conexões: o endpoint /ws registra os sockets aqui e todo
+envio em tempo real (notificações, contadores, mensagens) passa por este
+manager.
+
+Cada conexão tem uma fila de saída limitada drenada por uma task própria,
+então quem envia nunca espera pela rede do cliente. Quando a fila enche,
+frames de baixa prioridade (digitação, presença) são descartados primeiro;
+se ainda assim não houver espaço o cliente é desconectado com um código de
+fechamento que indica que ele pode reconectar.
+
+Eventos enviados a um usuário recebem um número de sequência ("seq") e ficam
+num buffer circular por uma janela limitada. O seq é dado pelo broker, um
+único contador por usuário para todos os workers, então o cliente pode
+retomar em qualquer worker que estivesse guardando os eventos dele. Ao
+reconectar com /ws/{user_id}?since=<seq> o cliente recebe só o que perdeu,
+seguido de um frame "sync"; se o intervalo já saiu do buffer, ou o worker
+não recebeu parte dele, o cliente recebe "resync" e deve recarregar pela API.
+
+Os envios passam por um broker (core/broker.py), que os entrega ao manager
+de cada processo que mantém o usuário. O mesmo canal leva avisos internos
+entre os workers (publish_control/on_control), como invalidações de cache,
+que não chegam a nenhum socket.
+
+O servidor envia {"type": "ping"} a cada WS_HEARTBEAT_INTERVAL_SECONDS e
+derruba sockets que não mandam nenhum frame há WS_HEARTBEAT_TIMEOUT_SECONDS
+(conexões meio abertas). Conectar, desconectar e receber frames alimentam o
+serviço de presença (core/presence.py).
+
+Clientes atrás de proxies que bloqueiam WebSocket usam o stream SSE
+(GET /notifications/stream): EventStreamConnection entra no mesmo registro,
+recebe os mesmos frames e usa o seq como id do evento (Last-Event-ID).
 """
+import asyncio
 import json
-from typing import Dict, List
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
 from fastapi import WebSocket
 
+from core.broker import InMemoryBroker, create_broker
+from core.config import (
+    WS_SEND_QUEUE_SIZE, WS_REPLAY_BUFFER_SIZE, WS_REPLAY_WINDOW_SECONDS, WS_REPLAY_MAX_USERS,
+    WS_HEARTBEAT_INTERVAL_SECONDS, WS_HEARTBEAT_TIMEOUT_SECONDS
+)
+from core.presence import presence
+
+# Frames que podem ser descartados sob pressão
+LOW_PRIORITY_TYPES = {"typing", "presence"}
+
+# 1013 (Try Again Later): o cliente pode reconectar e retomar
+WS_CLOSE_SLOW_CONSUMER = 1013
+# 1001 (Going Away): sem resposta aos heartbeats
+WS_CLOSE_HEARTBEAT_TIMEOUT = 1001
+
+PING_FRAME = json.dumps({"type": "ping"})
+
+# Chave dos eventos de controle entre workers (não vão para os sockets)
+CONTROL_KEY = "_control"
+
+# Resultado de WebSocketConnection.enqueue
+QUEUED = "queued"
+DROPPED = "dropped"      # frame de baixa prioridade descartado com a fila cheia
+REJECTED = "rejected"    # fila cheia só de frames importantes: consumidor lento
+
+class WebSocketConnection:
+    """Socket de um usuário com sua fila de saída e task de escrita"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, max_queue: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self._queue: Deque[Tuple[str, bool]] = deque()
+        self._ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.evicted = False
+        # Último frame recebido do cliente (relógio monotônico)
+        self.last_received = time.monotonic()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, message: str, low_priority: bool) -> Tuple[str, int]:
+        """Enfileirar sem bloquear; retorna (QUEUED/DROPPED/REJECTED, frames da fila descartados)"""
+        dropped = 0
+        if len(self._queue) >= self.max_queue:
+            if low_priority:
+                return DROPPED, 0
+            kept = deque(frame for frame in self._queue if not frame[1])
+            dropped = len(self._queue) - len(kept)
+            self._queue = kept
+            if len(self._queue) >= self.max_queue:
+                return REJECTED, dropped
+
+        self._queue.append((message, low_priority))
+        self._ready.set()
+        return QUEUED, dropped
+
+    async def run(self):
+        """Drenar a fila para o socket até a conexão cair"""
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                message, _ = self._queue.popleft()
+                await self.websocket.send_text(message)
+            self._ready.clear()
+
+    async def close(self, code: int, reason: str):
+        await self.websocket.close(code=code, reason=reason)
+
+def to_event_stream(message: str) -> str:
+    """Converter um frame do manager para o formato text/event-stream"""
+    if message == PING_FRAME:
+        # Comentário SSE: mantém proxies e o navegador cientes da conexão
+        return ": ping\n\n"
+    try:
+        seq = json.loads(message).get("seq")
+    except (ValueError, AttributeError):
+        seq = None
+    event_id = f"id: {seq}\n" if seq is not None else ""
+    return f"{event_id}data: {message}\n\n"
+
+class EventStreamConnection(WebSocketConnection):
+    """Conexão SSE: mesma fila, drenada pelo gerador da resposta HTTP"""
+
+    def __init__(self, user_id: int, max_queue: int):
+        super().__init__(None, user_id, max_queue)
+
+    async def events(self):
+        """Eventos SSE até a conexão ser encerrada pelo manager"""
+        while not self.evicted:
+            await self._ready.wait()
+            while self._queue and not self.evicted:
+                message, _ = self._queue.popleft()
+                yield to_event_stream(message)
+                # Sem frames vindos do cliente, a escrita concluída é o sinal de vida
+                self.last_received = time.monotonic()
+            self._ready.clear()
+
+    async def close(self, code: int, reason: str):
+        self.evicted = True
+        self._ready.set()
+
+class ReplayBuffer:
+    """Últimos eventos de um usuário, numerados pelo broker, para replay na reconexão"""
+
+    def __init__(self, max_events: int, window_seconds: float):
+        self.window_seconds = window_seconds
+        # Nenhum seq conhecido ainda: retomar daqui dá resync
+        self.last_seq: Optional[int] = None
+        self._events: Deque[Tuple[int, float, str]] = deque(maxlen=max_events)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._events and self._events[0][1] < cutoff:
+            self._events.popleft()
+
+    def append(self, message: dict) -> str:
+        """Guardar o evento com o seq dado pelo broker; retorna o frame serializado"""
+        seq = message.get("seq")
+        if seq is None:
+            # Entregue sem passar pelo hub: o intervalo não é mais contínuo
+            self._events.clear()
+            self.last_seq = None
+            return json.dumps(message)
+        if self.last_seq is not None and seq != self.last_seq + 1:
+            # Eventos que este processo não recebeu (ex.: reconexão ao hub)
+            self._events.clear()
+        frame = json.dumps(message)
+        self._events.append((seq, time.monotonic(), frame))
+        self.last_seq = seq
+        return frame
+
+    def since(self, seq: int) -> Optional[List[str]]:
+        """Frames posteriores a seq, ou None se parte do intervalo foi perdida"""
+        self._prune()
+        if self.last_seq is None or seq > self.last_seq:
+            return None
+        if seq == self.last_seq:
+            return []
+        if not self._events or seq < self._events[0][0] - 1:
+            return None
+        return [frame for event_seq, _, frame in self._events if event_seq > seq]
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    def __init__(self, max_queue: int = WS_SEND_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self.active_connections: Dict[int, List[WebSocketConnection]] = {}
+        # Buffers de replay dos usuários que conectaram recentemente (LRU)
+        self.replay_buffers: "OrderedDict[int, ReplayBuffer]" = OrderedDict()
+        self.broker = InMemoryBroker(self._deliver)
+        self._control_handlers: Dict[str, Callable[[Any], None]] = {}
+        self.stats = {
+            'frames_queued': 0,
+            'frames_replayed': 0,
+            'resyncs': 0,
+            'frames_dropped': 0,
+            'frames_dropped_low_priority': 0,
+            'slow_consumers_evicted': 0,
+            'heartbeat_timeouts': 0,
+            'send_errors': 0,
+            'event_streams_opened': 0,
+        }
+
+    async def start_broker(self, broker=None):
+        """Trocar o broker (padrão: WS_BROKER) e começar a receber eventos"""
+        self.broker = broker or create_broker()
+        await self.broker.start(self._deliver)
+        for user_id in self.replay_buffers:
+            self.broker.subscribe(user_id)
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int, since: Optional[int] = None):
         await websocket.accept()
+        connection = WebSocketConnection(websocket, user_id, self.max_queue)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self._register(connection, since)
+
+    def connect_stream(self, user_id: int, since: Optional[int] = None) -> EventStreamConnection:
+        """Registrar um cliente SSE; a resposta HTTP drena connection.events()"""
+        connection = EventStreamConnection(user_id, self.max_queue)
+        self._register(connection, since)
+        self.stats['event_streams_opened'] += 1
+        return connection
+
+    def disconnect_stream(self, connection: EventStreamConnection):
+        self._remove(connection)
+
+    def _register(self, connection: WebSocketConnection, since: Optional[int]):
+        user_id = connection.user_id
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections[user_id].append(connection)
+        presence.mark_online(user_id)
+
+        # Sem await daqui em diante: o replay entra na fila antes de qualquer evento novo
+        replay = self._replay_buffer(user_id)
+        frames = replay.since(since) if since is not None else []
+        if frames is None:
+            self.stats['resyncs'] += 1
+            connection.enqueue(json.dumps({"type": "resync", "data": {"seq": replay.last_seq}}), False)
+            return
+        for frame in frames:
+            connection.enqueue(frame, False)
+        self.stats['frames_replayed'] += len(frames)
+        connection.enqueue(json.dumps({
+            "type": "sync",
+            "data": {"seq": replay.last_seq, "replayed": len(frames)}
+        }), False)
+
+    def _replay_buffer(self, user_id: int) -> ReplayBuffer:
+        replay = self.replay_buffers.get(user_id)
+        if replay is None:
+            replay = ReplayBuffer(WS_REPLAY_BUFFER_SIZE, WS_REPLAY_WINDOW_SECONDS)
+            self.replay_buffers[user_id] = replay
+            # O processo assina o usuário enquanto guarda o buffer dele,
+            # então eventos enviados com ele offline também entram no replay
+            self.broker.subscribe(user_id)
+            if len(self.replay_buffers) > WS_REPLAY_MAX_USERS:
+                for stale_user_id in list(self.replay_buffers):
+                    if not self.is_user_connected(stale_user_id):
+                        del self.replay_buffers[stale_user_id]
+                        self.broker.unsubscribe(stale_user_id)
+                        break
+        self.replay_buffers.move_to_end(user_id)
+        return replay
 
     def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    self.active_connections[user_id].remove(connection)
+        connection = self._find(websocket, user_id)
+        if connection:
+            self._remove(connection)
+
+    def touch(self, websocket: WebSocket, user_id: int):
+        """Registrar um frame recebido do cliente (heartbeat e last_seen)"""
+        connection = self._find(websocket, user_id)
+        if connection:
+            connection.last_received = time.monotonic()
+            presence.touch(user_id)
+
+    def send_to_socket(self, websocket: WebSocket, user_id: int, message: str):
+        """Responder a um socket específico pela fila dele (ex.: pong)"""
+        connection = self._find(websocket, user_id)
+        if connection and not connection.evicted:
+            connection.enqueue(message, True)
+
+    def _find(self, websocket: WebSocket, user_id: int) -> Optional[WebSocketConnection]:
+        for connection in self.active_connections.get(user_id, ()):
+            if connection.websocket is websocket:
+                return connection
+        return None
+
+    def _remove(self, connection: WebSocketConnection):
+        connections = self.active_connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
+            presence.mark_offline(connection.user_id)
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _write(self, connection: WebSocketConnection):
+        try:
+            await connection.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['send_errors'] += 1
+            print(f"⚠️ WebSocket do usuário {connection.user_id} removido após falha no envio: {e}")
+            self._remove(connection)
+
+    async def _evict(self, connection: WebSocketConnection, code: int = WS_CLOSE_SLOW_CONSUMER, reason: str = "Fila de envio cheia"):
+        """Desconectar um cliente que não acompanha o ritmo dos envios ou parou de responder"""
+        print(f"⚠️ WebSocket do usuário {connection.user_id} desconectado: {reason}")
+        self._remove(connection)
+        try:
+            await connection.close(code, reason)
+        except Exception:
+            pass
+
+    async def heartbeat(self):
+        """Enviar pings e derrubar sockets sem frames dentro do timeout"""
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL_SECONDS)
+            deadline = time.monotonic() - WS_HEARTBEAT_TIMEOUT_SECONDS
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections):
+                    if connection.evicted:
+                        continue
+                    if connection.last_received < deadline:
+                        connection.evicted = True
+                        self.stats['heartbeat_timeouts'] += 1
+                        asyncio.create_task(self._evict(
+                            connection, WS_CLOSE_HEARTBEAT_TIMEOUT, "Sem resposta ao heartbeat"
+                        ))
+                    else:
+                        connection.enqueue(PING_FRAME, False)
+
+    def start_heartbeat(self):
+        asyncio.create_task(self.heartbeat())
+
+    def is_user_connected(self, user_id: int) -> bool:
+        """Verificar se um usuário tem ao menos um socket conectado neste processo"""
+        return bool(self.active_connections.get(user_id))
+
+    def may_be_connected(self, user_id: int) -> bool:
+        """Se vale a pena montar um evento para o usuário (ele pode estar em outro worker)"""
+        return self.broker.distributed or self.is_user_connected(user_id)
+
+    def _fan_out(self, message: str, connections: List[WebSocketConnection], low_priority: bool):
+        """Enfileirar um frame já serializado em cada conexão, sem esperar a rede"""
+        for connection in connections:
+            if connection.evicted:
+                continue
+            result, dropped = connection.enqueue(message, low_priority)
+            self.stats['frames_dropped'] += dropped
+            if result == QUEUED:
+                self.stats['frames_queued'] += 1
+            elif result == DROPPED:
+                self.stats['frames_dropped_low_priority'] += 1
+            else:
+                connection.evicted = True
+                self.stats['slow_consumers_evicted'] += 1
+                asyncio.create_task(self._evict(connection))
+
+    async def send_personal_message(
+        self,
+        message: Union[str, dict],
+        user_id: int,
+        low_priority: Optional[bool] = None
+    ) -> bool:
+        """Publicar para todos os sockets do usuário; retorna se ele está conectado neste processo"""
+        if isinstance(message, dict) and low_priority is None:
+            # Decidido antes do broker, que só numera os frames de prioridade normal
+            low_priority = message.get("type") in LOW_PRIORITY_TYPES
+        self.broker.publish(user_id, message, low_priority)
+        return self.is_user_connected(user_id)
+
+    async def broadcast(self, message: Union[str, dict], low_priority: Optional[bool] = None):
+        """Enviar mensagem para todos os usuários conectados (sem seq)"""
+        self.broker.publish(None, message, low_priority)
+
+    def on_control(self, name: str, handler: Callable[[Any], None]):
+        """Registrar quem trata um aviso de controle neste processo"""
+        self._control_handlers[name] = handler
+
+    def publish_control(self, name: str, data: Any):
+        """Avisar todos os workers (inclusive este) pelo broker"""
+        self.broker.publish(None, {CONTROL_KEY: name, "data": data}, False)
+
+    def _deliver(self, user_id: Optional[int], message: Union[str, dict], low_priority: Optional[bool]):
+        """Entregar um evento vindo do broker aos sockets deste processo"""
+        if user_id is None and isinstance(message, dict) and CONTROL_KEY in message:
+            handler = self._control_handlers.get(message[CONTROL_KEY])
+            if handler:
+                handler(message.get("data"))
+            return
+        if isinstance(message, dict) and low_priority is None:
+            low_priority = message.get("type") in LOW_PRIORITY_TYPES
+
+        if user_id is None:
+            connections = [
+                connection
+                for user_connections in list(self.active_connections.values())
+                for connection in user_connections
+            ]
+            if isinstance(message, dict):
+                message = json.dumps(message)
+        else:
+            connections = list(self.active_connections.get(user_id, ()))
+            if isinstance(message, dict):
+                # Frames de baixa prioridade não são numerados nem reenviados
+                replay = None if low_priority else self.replay_buffers.get(user_id)
+                message = replay.append(message) if replay else json.dumps(message)
+
+        if connections:
+            self._fan_out(message, connections, bool(low_priority))
 
     async def send_notification(self, user_id: int, notification: dict):
-        message = json.dumps({
-            "type": "notification",
-            **notification
-        })
-        await self.send_personal_message(message, user_id)
+        await self.send_personal_message({"type": "notification", "data": notification}, user_id)
 
     async def send_message(self, user_id: int, message_data: dict):
         """Enviar mensagem em tempo real"""
-        message = json.dumps({
-            "type": "message",
-            **message_data
-        })
-        await self.send_personal_message(message, user_id)
+        await self.send_personal_message({"type": "message", **message_data}, user_id)
 
     async def send_typing_indicator(self, user_id: int, typing_data: dict):
         """Enviar indicador de digitação"""
-        message = json.dumps({
-            "type": "typing",
-            **typing_data
-        })
-        await self.send_personal_message(message, user_id)
+        await self.send_personal_message({"type": "typing", **typing_data}, user_id)
 
     async def send_message_read(self, user_id: int, read_data: dict):
         """Notificar que mensagem foi lida"""
-        message = json.dumps({
-            "type": "message_read",
-            **read_data
-        })
-        await self.send_personal_message(message, user_id)
+        await self.send_personal_message({"type": "message_read", **read_data}, user_id)
+
+    def get_stats(self):
+        depths = [
+            connection.depth
+            for connections in self.active_connections.values()
+            for connection in connections
+        ]
+        return {
+            **self.stats,
+            'users_connected': len(self.active_connections),
+            'connections': len(depths),
+            'queue_depth': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'replay_buffers': len(self.replay_buffers),
+            'broker': self.broker.get_stats(),
+        }
 
 # Instância global do manager
 manager = ConnectionManager()
+
+# Presença compartilhada entre os workers pelo canal de controle
+presence.attach(lambda data: manager.publish_control("presence", data))
+manager.on_control("presence", presence.apply_remote)
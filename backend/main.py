@@ -1,6 +1,7 @@
 """
 Aplicação principal FastAPI - Vibe Social Network
 """
+import json
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
@@ -9,15 +10,25 @@ from fastapi.staticfiles import StaticFiles
 
 from core.config import ALLOWED_ORIGINS
 from core.database import engine, Base
+from core.security import verify_websocket_token
 from core.security_middleware import security_middleware
 from core.performance_middleware import performance_middleware, start_cache_cleanup
 from core.websockets import manager
+from core.presence import presence, start_presence_flusher
+from core.chat_signals import typing_throttle, read_receipts, start_chat_signals
+from core.passwords import password_hasher
 from routes import auth_router, posts_router, users_router, email_verification_router, stories_router, upload_router
 from routes.friendships import router as friendships_router
 from routes.follows import router as follows_router
 from routes.reports import router as reports_router
 from routes.notifications import router as notifications_router
-from utils.auth import verify_websocket_token
+from routes.settings import router as settings_router
+from routes.presence import router as presence_router
+from routes.messages import router as messages_router
+from utils.story_view_buffer import story_view_buffer, start_story_view_flusher
+from utils.story_sweeper import story_sweeper, start_story_sweeper
+from utils.notification_dispatcher import notification_dispatcher, start_notification_dispatcher
+from utils.notification_compactor import notification_compactor, start_notification_compactor
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -43,6 +54,14 @@ async def lifespan(app: FastAPI):
     # Iniciar tarefas de background
     print("🔧 Starting security and performance services...")
     start_cache_cleanup()
+    start_story_view_flusher()
+    start_story_sweeper()
+    start_notification_dispatcher()
+    start_notification_compactor()
+    await manager.start_broker()
+    manager.start_heartbeat()
+    start_presence_flusher()
+    start_chat_signals()
 
     print("🌟 API pronta para uso!")
 
@@ -50,6 +69,11 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("🛑 Encerrando API...")
+    await story_view_buffer.flush()
+    await notification_dispatcher.drain()
+    await manager.broker.close()
+    await presence.flush()
+    await read_receipts.flush()
 
 # Criar instância da aplicação FastAPI
 app = FastAPI(
@@ -166,10 +190,13 @@ app.include_router(friendships_router)
 app.include_router(follows_router)
 app.include_router(reports_router)
 app.include_router(notifications_router)
+app.include_router(settings_router)
+app.include_router(presence_router)
+app.include_router(messages_router)
 
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str = None):
-    """Endpoint WebSocket para notificações em tempo real"""
+async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str = None, since: int = None):
+    """Endpoint WebSocket para notificações em tempo real (since: último seq recebido)"""
     try:
         # Verificar token de autenticação
         if not token:
@@ -177,30 +204,42 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str = No
             return
 
         # Verificar se o token é válido
-        user = verify_websocket_token(token)
-        if not user or user.id != user_id:
+        if await verify_websocket_token(token) != user_id:
             print(f"❌ WebSocket: Token inválido para usuário {user_id}")
             await websocket.close(code=1008, reason="Token inválido")
             return
 
         # Conectar o usuário
-        await manager.connect(websocket, user_id)
+        await manager.connect(websocket, user_id, since=since)
         print(f"✅ WebSocket: Usuário {user_id} conectado")
 
         try:
             # Manter conexão ativa
             while True:
-                # Aguardar mensagens do cliente (ping/pong para manter conexão)
+                # Qualquer frame do cliente conta como sinal de vida (heartbeat e last_seen)
                 data = await websocket.receive_text()
-                # Echo para manter conexão ativa
+                manager.touch(websocket, user_id)
                 if data == "ping":
-                    await websocket.send_text("pong")
+                    manager.send_to_socket(websocket, user_id, "pong")
+                    continue
+                try:
+                    frame = json.loads(data)
+                except ValueError:
+                    continue
+                # "digitando" passa pelo throttle em vez de ir direto ao destinatário
+                if isinstance(frame, dict) and frame.get("type") == "typing":
+                    try:
+                        recipient_id = int(frame.get("recipient_id"))
+                    except (TypeError, ValueError):
+                        continue
+                    await typing_throttle.update(user_id, recipient_id, bool(frame.get("is_typing")))
 
         except WebSocketDisconnect:
             manager.disconnect(websocket, user_id)
             print(f"��� WebSocket: Usuário {user_id} desconectado")
 
     except Exception as e:
+        manager.disconnect(websocket, user_id)
         print(f"❌ Erro no WebSocket para usuário {user_id}: {str(e)}")
         try:
             await websocket.close(code=1011, reason="Erro interno do servidor")
@@ -224,7 +263,21 @@ async def health_check():
 @app.get("/stats")
 async def get_performance_stats():
     """Endpoint para obter estatísticas de performance (apenas para desenvolvimento)"""
-    return performance_middleware.get_stats()
+    return {
+        **performance_middleware.get_stats(),
+        "story_views": story_view_buffer.get_stats(),
+        "story_sweeper": story_sweeper.get_stats(),
+        "notifications": notification_dispatcher.get_stats(),
+        "notification_retention": notification_compactor.get_stats(),
+        "websockets": manager.get_stats(),
+        "presence": presence.get_stats(),
+        "chat": {
+            "typing": typing_throttle.get_stats(),
+            "read_receipts": read_receipts.get_stats()
+        },
+        "password_hashing": password_hasher.get_stats(),
+        "security": security_middleware.get_stats()
+    }
 
 @app.post("/admin/clear-cache")
 async def clear_cache():
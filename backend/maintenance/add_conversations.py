@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Script para criar a tabela conversations e vincular as mensagens existentes
+
+Adiciona messages.conversation_id, cria uma conversa por par de usuários e
+preenche última mensagem, não lidas e marcadores de leitura a partir do
+is_read legado. Depois de rodar, execute add_performance_indexes.py para
+criar o índice ix_messages_conversation_id.
+"""
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from core.database import SessionLocal, engine
+from models import Conversation
+from sqlalchemy import text
+
+def add_conversations():
+    """Cria conversations e preenche a partir de messages"""
+    Conversation.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+
+    try:
+        existing = {
+            row[0] for row in db.execute(text("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'messages'
+            """)).fetchall()
+        }
+        if "conversation_id" in existing:
+            print("✅ Campo conversation_id já existe na tabela messages")
+        else:
+            print("➕ Adicionando campo conversation_id à tabela messages...")
+            db.execute(text("ALTER TABLE messages ADD COLUMN conversation_id INT NULL"))
+
+        result = db.execute(text("""
+            INSERT INTO conversations
+                (user_a_id, user_b_id, user_a_unread, user_b_unread,
+                 user_a_last_read_id, user_b_last_read_id, created_at)
+            SELECT LEAST(m.sender_id, m.recipient_id), GREATEST(m.sender_id, m.recipient_id),
+                   0, 0, 0, 0, MIN(m.created_at)
+            FROM messages m
+            WHERE m.conversation_id IS NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM conversations c
+                WHERE c.user_a_id = LEAST(m.sender_id, m.recipient_id)
+                AND c.user_b_id = GREATEST(m.sender_id, m.recipient_id)
+            )
+            GROUP BY LEAST(m.sender_id, m.recipient_id), GREATEST(m.sender_id, m.recipient_id)
+        """))
+        print(f"✅ {result.rowcount} conversas criadas")
+
+        result = db.execute(text("""
+            UPDATE messages m
+            JOIN conversations c
+                ON c.user_a_id = LEAST(m.sender_id, m.recipient_id)
+                AND c.user_b_id = GREATEST(m.sender_id, m.recipient_id)
+            SET m.conversation_id = c.id
+            WHERE m.conversation_id IS NULL
+        """))
+        print(f"✅ {result.rowcount} mensagens vinculadas")
+
+        # Cada lado leu o que enviou e o que recebeu com is_read
+        db.execute(text("""
+            UPDATE conversations c
+            SET c.last_message_id = (SELECT MAX(m.id) FROM messages m WHERE m.conversation_id = c.id),
+                c.user_a_unread = (
+                    SELECT COUNT(*) FROM messages m
+                    WHERE m.conversation_id = c.id AND m.recipient_id = c.user_a_id AND m.is_read = 0
+                ),
+                c.user_b_unread = (
+                    SELECT COUNT(*) FROM messages m
+                    WHERE m.conversation_id = c.id AND m.recipient_id = c.user_b_id AND m.is_read = 0
+                ),
+                c.user_a_last_read_id = COALESCE((
+                    SELECT MAX(m.id) FROM messages m
+                    WHERE m.conversation_id = c.id AND (m.sender_id = c.user_a_id OR m.is_read = 1)
+                ), 0),
+                c.user_b_last_read_id = COALESCE((
+                    SELECT MAX(m.id) FROM messages m
+                    WHERE m.conversation_id = c.id AND (m.sender_id = c.user_b_id OR m.is_read = 1)
+                ), 0)
+        """))
+        db.execute(text("""
+            UPDATE conversations c
+            JOIN messages m ON m.id = c.last_message_id
+            SET c.last_message_at = m.created_at
+        """))
+
+        db.commit()
+        print("🎉 Migração concluída com sucesso!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erro durante a migração: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Iniciando migração de conversas")
+    print("=" * 60)
+    add_conversations()
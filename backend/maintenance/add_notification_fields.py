@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Script para adicionar os campos novos à tabela notifications
+(agrupamento de notificações e vínculo com o outbox)
+
+Depois de rodar, execute add_performance_indexes.py para criar os índices
+ix_notifications_group e ix_notifications_outbox_id.
+"""
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from core.database import SessionLocal
+from sqlalchemy import text
+
+NEW_COLUMNS = {
+    "group_key": "VARCHAR(100) NULL",
+    "actor_count": "INT DEFAULT 1",
+    "actor_ids": "TEXT NULL",
+    "updated_at": "DATETIME NULL",
+    "outbox_id": "INT NULL",
+}
+
+def add_notification_fields():
+    """Adiciona as colunas que ainda não existem"""
+    db = SessionLocal()
+
+    try:
+        existing = {
+            row[0] for row in db.execute(text("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'notifications'
+            """)).fetchall()
+        }
+
+        for column, definition in NEW_COLUMNS.items():
+            if column in existing:
+                print(f"✅ Campo {column} já existe na tabela notifications")
+                continue
+            print(f"➕ Adicionando campo {column} à tabela notifications...")
+            db.execute(text(f"ALTER TABLE notifications ADD COLUMN {column} {definition}"))
+
+        # Notificações antigas contam como um único ator
+        result = db.execute(text("""
+            UPDATE notifications
+            SET actor_count = 1, updated_at = created_at
+            WHERE updated_at IS NULL
+        """))
+        print(f"✅ {result.rowcount} notificações existentes atualizadas")
+
+        db.commit()
+        print("🎉 Migração concluída com sucesso!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erro durante a migração: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🚀 Iniciando migração dos campos novos de notificações")
+    print("=" * 60)
+    add_notification_fields()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Script para criar os índices declarados nos modelos que ainda não existem no banco
+
+O create_all do startup só cria tabelas novas; índices adicionados a tabelas
+já existentes precisam ser aplicados por este script.
+"""
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+
+from core.database import Base, engine
+import models  # noqa: F401 - registra todas as tabelas no metadata
+
+def add_performance_indexes():
+    """Cria os índices que faltam, tabela por tabela"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = 0
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            print(f"⏭️  Tabela {table.name} não existe, será criada no startup")
+            continue
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            print(f"➕ Criando índice {index.name} em {table.name}...")
+            try:
+                index.create(bind=engine)
+                created += 1
+            except Exception as e:
+                print(f"❌ Erro ao criar índice {index.name}: {e}")
+
+    print(f"✅ {created} índice(s) criado(s)")
+    return True
+
+if __name__ == "__main__":
+    print("🚀 Verificando índices de performance")
+    print("=" * 60)
+    add_performance_indexes()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Script para remover visualizações de stories duplicadas
+
+Precisa rodar antes de add_performance_indexes.py, que cria o índice único
+uq_story_views_story_viewer (story_id, viewer_id).
+"""
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from core.database import SessionLocal
+
+def fix_story_views_duplicates():
+    """Mantém a primeira visualização de cada par e recalcula views_count"""
+    db = SessionLocal()
+
+    try:
+        print("🔍 Removendo visualizações duplicadas...")
+        result = db.execute(text("""
+            DELETE sv FROM story_views sv
+            JOIN story_views keep
+              ON keep.story_id = sv.story_id
+             AND keep.viewer_id = sv.viewer_id
+             AND keep.id < sv.id
+        """))
+        print(f"✅ {result.rowcount} visualização(ões) duplicada(s) removida(s)")
+
+        print("🔢 Recalculando views_count das stories...")
+        result = db.execute(text("""
+            UPDATE stories s
+            SET s.views_count = (
+                SELECT COUNT(*) FROM story_views sv WHERE sv.story_id = s.id
+            )
+        """))
+        print(f"✅ {result.rowcount} story(ies) atualizada(s)")
+
+        db.commit()
+        return True
+
+    except Exception as e:
+        print(f"❌ Erro ao remover duplicadas: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if fix_story_views_duplicates():
+        print("\n🎉 Pronto! Agora rode add_performance_indexes.py")
+    else:
+        print("\n💥 Falha ao corrigir story_views")
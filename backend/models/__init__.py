@@ -1,18 +1,22 @@
 """
 Modelos do banco de dados
 """
-from .user import User
+from .user import User, USER_CARD_COLUMNS, USER_PROFILE_COLUMNS, USER_AUTH_COLUMNS
 from .post import Post, Reaction, Comment, Share
 from .story import Story, StoryView, StoryTag, StoryOverlay
 from .friendship import Friendship, Block, Follow
-from .notification import Notification, NotificationType, Message, MediaFile
+from .notification import Notification, NotificationType, NotificationOutbox, NotificationCounter, MediaFile
+from .message import Conversation, Message
 from .report import Report, ReportType, ReportStatus
+from .refresh_token import RefreshToken
 
 __all__ = [
-    "User",
+    "User", "USER_CARD_COLUMNS", "USER_PROFILE_COLUMNS", "USER_AUTH_COLUMNS",
     "Post", "Reaction", "Comment", "Share",
     "Story", "StoryView", "StoryTag", "StoryOverlay",
     "Friendship", "Block", "Follow",
-    "Notification", "NotificationType", "Message", "MediaFile",
-    "Report", "ReportType", "ReportStatus"
+    "Notification", "NotificationType", "NotificationOutbox", "NotificationCounter", "MediaFile",
+    "Conversation", "Message",
+    "Report", "ReportType", "ReportStatus",
+    "RefreshToken"
 ]
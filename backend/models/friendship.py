@@ -1,14 +1,19 @@
 """
 Modelos de relacionamentos entre usuários
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
 
 class Friendship(Base):
     __tablename__ = "friendships"
-    
+    __table_args__ = (
+        # Listagem de amigos: os dois lados da amizade ordenados por interação
+        Index("ix_friendships_requester_status", "requester_id", "status", "updated_at"),
+        Index("ix_friendships_addressee_status", "addressee_id", "status", "updated_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     requester_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     addressee_id = Column(Integer, ForeignKey("users.id"), nullable=False)
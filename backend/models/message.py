@@ -1,22 +1,56 @@
 """
-Message model
+Modelos de mensagens diretas e conversas
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
 
+class Conversation(Base):
+    """Conversa entre dois usuários, com o resumo que a caixa de entrada exibe
+
+    O par é guardado ordenado (user_a_id < user_b_id). Cada lado tem seu
+    contador de não lidas e o id da última mensagem que leu: "lido até N"
+    substitui o is_read de cada mensagem.
+    """
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_a_id", "user_b_id", name="uq_conversations_pair"),
+        # Caixa de entrada: conversas de cada lado ordenadas pela última mensagem
+        Index("ix_conversations_user_a_last", "user_a_id", "last_message_at", "id"),
+        Index("ix_conversations_user_b_last", "user_b_id", "last_message_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_a_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_b_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+
+    user_a_unread = Column(Integer, nullable=False, default=0)
+    user_b_unread = Column(Integer, nullable=False, default=0)
+    user_a_last_read_id = Column(Integer, nullable=False, default=0)
+    user_b_last_read_id = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Histórico paginado por id dentro da conversa e contagem de não lidas
+        Index("ix_messages_conversation_id", "conversation_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=True)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text)
     message_type = Column(String(20), default="text")  # text, image, video, audio, file
     media_url = Column(String(500))
     media_metadata = Column(Text)  # JSON metadata
-    is_read = Column(Boolean, default=False)
+    is_read = Column(Boolean, default=False)  # Legado; a leitura vem de Conversation.*_last_read_id
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
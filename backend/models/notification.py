@@ -1,7 +1,7 @@
 """
-Modelos de notificações e mensagens
+Modelos de notificações e arquivos de mídia
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -41,6 +41,16 @@ class NotificationType(enum.Enum):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Busca da linha agrupada aberta para (destinatário, tipo, alvo)
+        Index("ix_notifications_group", "recipient_id", "group_key", "updated_at"),
+        # Listagem paginada por (updated_at, id): o agrupamento renova updated_at
+        # e a linha sobe para o topo, como no push pelo WebSocket
+        Index("ix_notifications_recipient_recent", "recipient_id", "is_deleted", "updated_at", "id"),
+        # Retenção (notification_compactor): apagadas e lidas antigas, sem varrer a tabela
+        Index("ix_notifications_deleted", "is_deleted", "id"),
+        Index("ix_notifications_read_created", "is_read", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -58,6 +68,14 @@ class Notification(Base):
     # Additional data as JSON
     data = Column(Text)  # JSON data for extra information
 
+    # Grouping ("Ana e mais 12 pessoas reagiram ao seu post")
+    group_key = Column(String(100), nullable=True)  # tipo + alvo; NULL = nunca agrupa
+    actor_count = Column(Integer, default=1)
+    actor_ids = Column(Text)  # JSON com os ids dos últimos atores, mais recente primeiro
+
+    # Evento do outbox que criou a linha; preenchido só até o dispatcher recuperar os ids do INSERT em lote
+    outbox_id = Column(Integer, nullable=True, index=True)
+
     # Status
     is_read = Column(Boolean, default=False)
     is_clicked = Column(Boolean, default=False)
@@ -65,6 +83,7 @@ class Notification(Base):
 
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Último evento agrupado
     read_at = Column(DateTime, nullable=True)
     clicked_at = Column(DateTime, nullable=True)
 
@@ -74,22 +93,30 @@ class Notification(Base):
     post = relationship("Post", foreign_keys=[post_id], backref="notifications")
     friendship = relationship("Friendship", foreign_keys=[friendship_id], backref="notifications")
 
-class Message(Base):
-    __tablename__ = "messages"
+class NotificationOutbox(Base):
+    """Fila durável de notificações a criar e enviar pelo dispatcher"""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_available", "status", "available_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    content = Column(Text)
-    message_type = Column(String(20), default="text")  # text, image, video, audio, file
-    media_url = Column(String(500))
-    media_metadata = Column(Text)  # JSON metadata
-    is_read = Column(Boolean, default=False)
+    payload = Column(Text, nullable=False)  # JSON com os argumentos de create_notification
+    status = Column(String(20), nullable=False, default="pending")  # pending, processing, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, default=datetime.utcnow)  # Backoff entre tentativas
+    claim_token = Column(String(32), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
 
-    sender = relationship("User", foreign_keys=[sender_id], backref="sent_messages")
-    recipient = relationship("User", foreign_keys=[recipient_id], backref="received_messages")
+class NotificationCounter(Base):
+    """Contador de notificações não lidas mantido incrementalmente"""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class MediaFile(Base):
     __tablename__ = "media_files"
@@ -0,0 +1,24 @@
+"""
+Modelo de refresh tokens
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from core.database import Base
+
+class RefreshToken(Base):
+    """Refresh token de uma sessão, guardado só como hash SHA-256
+
+    Cada renovação revoga o token usado e emite outro na mesma família
+    (family_id = uma sessão de login). Apresentar de novo um token já
+    trocado indica vazamento, e a família inteira é revogada.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family_id = Column(String(36), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by_id = Column(Integer, nullable=True)  # Token emitido na rotação; vazio se revogado no logout
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,14 +1,20 @@
 """
 Modelos relacionados a stories
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
 
 class Story(Base):
     __tablename__ = "stories"
-    
+    __table_args__ = (
+        # Bandeja de stories: stories ativas dos autores visíveis ao usuário
+        Index("ix_stories_author_expires", "author_id", "expires_at"),
+        # Varredura de expiradas: archived = 0 AND expires_at <= now ORDER BY expires_at
+        Index("ix_stories_archived_expires", "archived", "expires_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text)
@@ -27,7 +33,15 @@ class Story(Base):
 
 class StoryView(Base):
     __tablename__ = "story_views"
-    
+    __table_args__ = (
+        # Estado "visto" da bandeja: viewer_id = ? AND story_id IN (...)
+        Index("ix_story_views_viewer_story", "viewer_id", "story_id"),
+        # Uma visualização por usuário: torna o INSERT IGNORE em lote idempotente
+        Index("uq_story_views_story_viewer", "story_id", "viewer_id", unique=True),
+        # Lista de quem viu a story, mais recentes primeiro
+        Index("ix_story_views_story_viewed", "story_id", "viewed_at", "id"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
     viewer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,7 +1,12 @@
 """
 Modelo de usuário
+
+bio e password_hash são adiados (deferred): só vêm do banco quando a consulta
+pede com load_only/undefer ou quando o atributo é acessado. As listagens usam
+as projeções abaixo em vez de carregar a linha inteira.
 """
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date, Enum
+from sqlalchemy.orm import deferred
 from datetime import datetime
 from core.database import Base
 import enum
@@ -20,7 +25,7 @@ class User(Base):
     first_name = Column(String(50), nullable=False)
     last_name = Column(String(50), nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
-    password_hash = Column(String(255), nullable=False)
+    password_hash = deferred(Column(String(255), nullable=False))
     gender = Column(String(20))
     birth_date = Column(Date)
     phone = Column(String(20))
@@ -28,7 +33,7 @@ class User(Base):
     # Profile fields
     username = Column(String(50), unique=True, index=True)
     nickname = Column(String(50))
-    bio = Column(Text)
+    bio = deferred(Column(Text))
     avatar = Column(String(500))
     cover_photo = Column(String(500))
     location = Column(String(100))
@@ -69,3 +74,20 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Projeções de User (use com load_only(*COLUNAS) ou db.query(*COLUNAS))
+# card: nome e avatar, o que listas, remetentes e participantes exibem
+USER_CARD_COLUMNS = (User.id, User.first_name, User.last_name, User.username, User.avatar, User.is_verified)
+
+# profile: página de perfil, incluindo as visibilidades que decidem o que mostrar
+USER_PROFILE_COLUMNS = USER_CARD_COLUMNS + (
+    User.email, User.phone, User.gender, User.birth_date, User.nickname, User.bio,
+    User.cover_photo, User.location, User.website, User.relationship_status, User.work,
+    User.education, User.email_visibility, User.phone_visibility, User.birth_date_visibility,
+    User.created_at
+)
+
+# auth: o necessário para validar login e status da conta
+USER_AUTH_COLUMNS = (
+    User.id, User.email, User.password_hash, User.is_active, User.is_verified, User.account_status
+)
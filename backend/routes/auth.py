@@ -3,18 +3,35 @@ Rotas de autenticação
 """
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from datetime import timedelta, datetime
 
 from core.database import get_db
-from core.security import hash_password, verify_password, create_access_token, get_current_user
+from core.security import (
+    create_access_token, issue_refresh_token, rotate_refresh_token, revoke_refresh_token, revoke_refresh_family,
+    get_current_user, get_current_principal, invalidate_principal, Principal
+)
 from core.security_middleware import security_middleware
+from core.passwords import password_hasher
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from models import User
-from schemas import LoginRequest, Token, UserCreate, UserResponse
+from models import User, USER_AUTH_COLUMNS
+from schemas import LoginRequest, Token, RefreshRequest, UserCreate, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _token_response(user_id: int, email: str, account_status: str, refresh_token: str) -> dict:
+    """Par de tokens da sessão; o access token é curto e leva user_id e situação da conta"""
+    access_token = create_access_token(
+        data={"sub": email, "user_id": user_id, "status": account_status},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
 @router.get("/test-db")
 def test_database_connection(db: Session = Depends(get_db)):
     """Test endpoint to verify database connection and schema"""
@@ -43,11 +60,6 @@ def test_database_connection(db: Session = Depends(get_db)):
 
 @router.post("/register")
 async def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
-    # Verificações de segurança
-    security_response = await security_middleware.process_request(request)
-    if security_response:
-        return security_response
-
     ip = security_middleware.get_client_ip(request)
     try:
         print(f"🔍 Registration attempt for email: {user.email}")
@@ -79,15 +91,15 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
         print(f"✅ Required fields validated")
 
         # Verifica se o usuário já existe
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = db.query(User.id).filter(User.email == user.email).first()
         if db_user:
             print(f"❌ Email already registered: {user.email}")
             raise HTTPException(status_code=400, detail="Email already registered")
 
         print(f"✅ Email available: {user.email}")
 
-        # Hash password
-        hashed_password = hash_password(user.password)
+        # Hash password (bcrypt roda no pool de senhas, fora do event loop)
+        hashed_password = await password_hasher.hash(user.password)
         print(f"✅ Password hashed successfully")
 
         # Process birth date
@@ -146,11 +158,6 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
 
 @router.post("/login", response_model=Token)
 async def login(request: Request, login_data: LoginRequest, db: Session = Depends(get_db)):
-    # Verificações de segurança
-    security_response = await security_middleware.process_request(request)
-    if security_response:
-        return security_response
-
     ip = security_middleware.get_client_ip(request)
 
     # Verificar tentativas de login
@@ -160,9 +167,13 @@ async def login(request: Request, login_data: LoginRequest, db: Session = Depend
             detail="Muitas tentativas de login falhadas. Tente novamente em 15 minutos."
         )
     try:
-        user = db.query(User).filter(User.email == login_data.email).first()
+        user = db.query(User).options(load_only(*USER_AUTH_COLUMNS)).filter(User.email == login_data.email).first()
+
+        valid, new_hash = False, None
+        if user:
+            valid, new_hash = await password_hasher.verify_and_update(login_data.password, user.password_hash)
 
-        if not user or not verify_password(login_data.password, user.password_hash):
+        if not valid:
             # Registrar tentativa falhada
             security_middleware.record_failed_login(ip, login_data.email)
             raise HTTPException(
@@ -171,6 +182,11 @@ async def login(request: Request, login_data: LoginRequest, db: Session = Depend
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        if new_hash:
+            # BCRYPT_ROUNDS mudou: regravar o hash com a senha que acabou de ser validada
+            user.password_hash = new_hash
+            db.commit()
+
         if not user.is_active:
             raise HTTPException(status_code=400, detail="Inactive user")
 
@@ -212,29 +228,56 @@ async def login(request: Request, login_data: LoginRequest, db: Session = Depend
                 }
             )
 
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id}, expires_delta=access_token_expires
-        )
+        # Nova sessão: o bcrypt acima só se repete no próximo login, não a cada expiração
+        _, refresh_token = issue_refresh_token(db, user.id)
+        db.commit()
 
-        return {"access_token": access_token, "token_type": "bearer"}
+        return _token_response(user.id, user.email, account_status_str, refresh_token)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
+@router.post("/refresh", response_model=Token)
+async def refresh_session(payload: RefreshRequest, db: Session = Depends(get_db)):
+    """Renovar a sessão: troca o refresh token por um par novo, sem senha nem bcrypt"""
+    token_row, refresh_token = rotate_refresh_token(db, payload.refresh_token)
+
+    user = db.query(User.email, User.is_active, User.account_status).filter(User.id == token_row.user_id).first()
+    account_status = getattr(user.account_status, 'value', user.account_status) if user else None
+    if not user or not user.is_active or account_status != 'active':
+        # Conta desativada ou suspensa desde o login: encerrar a sessão
+        db.rollback()
+        revoke_refresh_family(db, token_row.family_id)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Conta não está ativa",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    db.commit()
+    return _token_response(token_row.user_id, user.email, account_status, refresh_token)
+
+@router.post("/logout")
+async def logout(payload: RefreshRequest, db: Session = Depends(get_db)):
+    """Encerrar a sessão revogando o refresh token (e os demais da mesma família)"""
+    revoke_refresh_token(db, payload.refresh_token)
+    db.commit()
+    return {"message": "Logged out successfully"}
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.get("/check-email")
 def check_email_exists(email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User.id).filter(User.email == email).first()
     return {"exists": user is not None}
 
 @router.get("/check-username")
-def check_username_exists(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(
+def check_username_exists(username: str, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    user = db.query(User.id).filter(
         User.username == username,
         User.id != current_user.id  # Exclude current user
     ).first()
@@ -243,7 +286,7 @@ def check_username_exists(username: str, current_user: User = Depends(get_curren
 @router.get("/check-username-public")
 def check_username_exists_public(username: str, db: Session = Depends(get_db)):
     """Public route to check username availability during registration"""
-    user = db.query(User).filter(User.username == username).first()
+    user = db.query(User.id).filter(User.username == username).first()
     return {"exists": user is not None}
 
 @router.get("/verify-token")
@@ -257,11 +300,6 @@ async def complete_onboarding(
     db: Session = Depends(get_db)
 ):
     """Marcar o onboarding como completo para o usuário atual"""
-    # Verificações de segurança
-    security_response = await security_middleware.process_request(request)
-    if security_response:
-        return security_response
-
     try:
         # Atualizar usuário
         current_user.onboarding_completed = True
@@ -269,6 +307,7 @@ async def complete_onboarding(
 
         db.commit()
         db.refresh(current_user)
+        invalidate_principal(current_user.id)
 
         print(f"✅ Usuário {current_user.id} completou o onboarding")
 
@@ -10,6 +10,7 @@ import secrets
 from pydantic import BaseModel
 
 from core.database import get_db, Base
+from core.security import invalidate_principal
 from models import User
 
 router = APIRouter(prefix="/email-verification", tags=["email-verification"])
@@ -263,6 +264,7 @@ async def verify_code(
             print(f"✅ User {user_id} marked as verified and account activated")
 
         db.commit()
+        invalidate_principal(user_id)
 
         return {
             "success": True,
@@ -310,6 +312,7 @@ async def verify_token(
             user.account_status = AccountStatus.active
 
         db.commit()
+        invalidate_principal(verification.user_id)
 
         return {
             "success": True,
@@ -6,16 +6,36 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 
 from core.database import get_db
-from core.security import get_current_user
-from models import User, Follow, Block
+from core.security import get_current_principal, Principal
+from models import User, Follow, Block, USER_CARD_COLUMNS
 from utils.notification_helpers import create_follow_notification
 
 router = APIRouter(prefix="/follow", tags=["follow"])
 
+def _follow_list(db: Session, user_column, owner_column, owner_id: int) -> list:
+    """Usuários de um lado do follow num único JOIN projetado, sem lazy load por linha"""
+    rows = db.query(Follow.created_at.label("followed_at"), *USER_CARD_COLUMNS, User.bio).join(
+        User, User.id == user_column
+    ).filter(owner_column == owner_id).all()
+
+    return [
+        {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "username": row.username,
+            "avatar": row.avatar,
+            "bio": row.bio,
+            "is_verified": row.is_verified,
+            "followed_at": row.followed_at.isoformat()
+        }
+        for row in rows
+    ]
+
 @router.post("/{user_id}")
 async def follow_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Seguir um usuário"""
@@ -24,7 +44,7 @@ async def follow_user(
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
     
     # Verificar se o usuário existe
-    user_to_follow = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user_to_follow = db.query(User.id).filter(User.id == user_id, User.is_active == True).first()
     if not user_to_follow:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -53,21 +73,21 @@ async def follow_user(
     )
     
     db.add(follow)
-    db.commit()
 
-    # Criar notificação para o usuário seguido
+    # Criar notificação para o usuário seguido (no mesmo commit do follow)
     await create_follow_notification(
         db=db,
         follower_id=current_user.id,
         followed_id=user_id
     )
+    db.commit()
 
     return {"message": "User followed successfully"}
 
 @router.delete("/{user_id}")
 async def unfollow_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Deixar de seguir um usuário"""
@@ -87,7 +107,7 @@ async def unfollow_user(
 @router.get("/status/{user_id}")
 async def get_follow_status(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Verificar se está seguindo um usuário"""
@@ -103,108 +123,44 @@ async def get_follow_status(
 
 @router.get("/followers")
 async def get_followers(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter lista de seguidores"""
-    follows = db.query(Follow).filter(Follow.followed_id == current_user.id).all()
-    
-    followers = []
-    for follow in follows:
-        follower = follow.follower
-        followers.append({
-            "id": follower.id,
-            "first_name": follower.first_name,
-            "last_name": follower.last_name,
-            "username": follower.username,
-            "avatar": follower.avatar,
-            "bio": follower.bio,
-            "is_verified": follower.is_verified,
-            "followed_at": follow.created_at.isoformat()
-        })
-    
-    return followers
+    return _follow_list(db, Follow.follower_id, Follow.followed_id, current_user.id)
 
 @router.get("/following")
 async def get_following(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter lista de usuários que está seguindo"""
-    follows = db.query(Follow).filter(Follow.follower_id == current_user.id).all()
-    
-    following = []
-    for follow in follows:
-        followed = follow.followed
-        following.append({
-            "id": followed.id,
-            "first_name": followed.first_name,
-            "last_name": followed.last_name,
-            "username": followed.username,
-            "avatar": followed.avatar,
-            "bio": followed.bio,
-            "is_verified": followed.is_verified,
-            "followed_at": follow.created_at.isoformat()
-        })
-    
-    return following
+    return _follow_list(db, Follow.followed_id, Follow.follower_id, current_user.id)
 
 @router.get("/users/{user_id}/followers")
 async def get_user_followers(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter seguidores de um usuário específico"""
     # Verificar se o usuário existe
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user = db.query(User.id).filter(User.id == user_id, User.is_active == True).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    follows = db.query(Follow).filter(Follow.followed_id == user_id).all()
-    
-    followers = []
-    for follow in follows:
-        follower = follow.follower
-        followers.append({
-            "id": follower.id,
-            "first_name": follower.first_name,
-            "last_name": follower.last_name,
-            "username": follower.username,
-            "avatar": follower.avatar,
-            "bio": follower.bio,
-            "is_verified": follower.is_verified,
-            "followed_at": follow.created_at.isoformat()
-        })
-    
-    return followers
+    return _follow_list(db, Follow.follower_id, Follow.followed_id, user_id)
 
 @router.get("/users/{user_id}/following")
 async def get_user_following(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter usuários que um usuário específico está seguindo"""
     # Verificar se o usuário existe
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user = db.query(User.id).filter(User.id == user_id, User.is_active == True).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    follows = db.query(Follow).filter(Follow.follower_id == user_id).all()
-    
-    following = []
-    for follow in follows:
-        followed = follow.followed
-        following.append({
-            "id": followed.id,
-            "first_name": followed.first_name,
-            "last_name": followed.last_name,
-            "username": followed.username,
-            "avatar": followed.avatar,
-            "bio": followed.bio,
-            "is_verified": followed.is_verified,
-            "followed_at": follow.created_at.isoformat()
-        })
-    
-    return following
+    return _follow_list(db, Follow.followed_id, Follow.follower_id, user_id)
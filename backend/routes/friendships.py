@@ -1,23 +1,26 @@
 """
 Rotas para gerenciamento de amizades
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy import func, select, tuple_, union_all
+from typing import List, Optional
 from datetime import datetime
 
 from core.database import get_db
-from core.security import get_current_user
-from models import User, Friendship, Block
+from core.security import get_current_principal, Principal
+from core.presence import presence
+from models import User, Friendship, Block, USER_CARD_COLUMNS
 from schemas import UserResponse
 from utils.notification_helpers import create_friend_request_notification, create_friend_request_accepted_notification
+from utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/friendships", tags=["friendships"])
 
 @router.post("/")
 async def send_friend_request(
     addressee_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Enviar solicitação de amizade"""
@@ -26,7 +29,7 @@ async def send_friend_request(
         raise HTTPException(status_code=400, detail="Cannot send friend request to yourself")
     
     # Verificar se o usuário existe
-    addressee = db.query(User).filter(User.id == addressee_id, User.is_active == True).first()
+    addressee = db.query(User.id).filter(User.id == addressee_id, User.is_active == True).first()
     if not addressee:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -67,26 +70,28 @@ async def send_friend_request(
     )
     
     db.add(friendship)
-    db.commit()
-    db.refresh(friendship)
+    db.flush()
 
-    # Criar notificação para o destinatário
+    # Criar notificação para o destinatário (no mesmo commit da solicitação)
     await create_friend_request_notification(
         db=db,
         requester_id=current_user.id,
         addressee_id=addressee_id,
         friendship_id=friendship.id
     )
+    db.commit()
 
     return {"message": "Friend request sent successfully"}
 
 @router.get("/requests")
 async def get_friend_requests(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter solicitações de amizade recebidas"""
-    requests = db.query(Friendship).filter(
+    requests = db.query(Friendship).options(
+        selectinload(Friendship.requester).load_only(*USER_CARD_COLUMNS)
+    ).filter(
         Friendship.addressee_id == current_user.id,
         Friendship.status == "pending"
     ).all()
@@ -111,7 +116,7 @@ async def get_friend_requests(
 @router.post("/requests/{request_id}/accept")
 async def accept_friend_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Aceitar solicitação de amizade"""
@@ -126,22 +131,22 @@ async def accept_friend_request(
     
     friendship.status = "accepted"
     friendship.updated_at = datetime.utcnow()
-    db.commit()
 
-    # Criar notificação para quem enviou a solicitação
+    # Criar notificação para quem enviou a solicitação (no mesmo commit)
     await create_friend_request_accepted_notification(
         db=db,
         requester_id=friendship.requester_id,
         addressee_id=current_user.id,
         friendship_id=friendship.id
     )
+    db.commit()
 
     return {"message": "Friend request accepted"}
 
 @router.post("/requests/{request_id}/reject")
 async def reject_friend_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Rejeitar solicitação de amizade"""
@@ -162,36 +167,105 @@ async def reject_friend_request(
 
 @router.get("/")
 async def get_friends(
-    current_user: User = Depends(get_current_user),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    order: str = Query("name", pattern="^(name|recent)$"),
+    q: Optional[str] = Query(None, max_length=50),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Obter lista de amigos"""
-    friendships = db.query(Friendship).filter(
-        ((Friendship.requester_id == current_user.id) | (Friendship.addressee_id == current_user.id)),
-        Friendship.status == "accepted"
-    ).all()
-    
-    friends = []
-    for friendship in friendships:
-        friend = friendship.addressee if friendship.requester_id == current_user.id else friendship.requester
-        friends.append({
-            "id": friend.id,
-            "first_name": friend.first_name,
-            "last_name": friend.last_name,
-            "username": friend.username,
-            "avatar": friend.avatar,
-            "bio": friend.bio,
-            "location": friend.location,
-            "is_verified": friend.is_verified,
-            "friendship_date": friendship.updated_at.isoformat()
-        })
-    
-    return friends
+    """Obter lista de amigos paginada por cursor, com filtro por prefixo e presença online
+
+    Cada sentido da amizade (eu como requester, eu como addressee) é uma
+    consulta própria, ordenada e limitada pelo seu índice; o UNION ALL junta
+    as duas páginas e a ordenação final escolhe as primeiras.
+    """
+    if order == "recent":
+        after = decode_cursor(cursor, 2)
+    else:
+        after = decode_cursor(cursor, 3)
+
+    def side(own_column, friend_column):
+        side_query = select(
+            Friendship.id.label("friendship_id"),
+            Friendship.updated_at,
+            *USER_CARD_COLUMNS,
+            User.bio,
+            User.location
+        ).join(User, User.id == friend_column).where(
+            own_column == current_user.id,
+            Friendship.status == "accepted"
+        )
+        if q and q.strip():
+            prefix = q.strip()
+            side_query = side_query.where(
+                User.first_name.istartswith(prefix, autoescape=True) |
+                User.last_name.istartswith(prefix, autoescape=True) |
+                User.username.istartswith(prefix, autoescape=True)
+            )
+        if order == "recent":
+            if after:
+                side_query = side_query.where(tuple_(Friendship.updated_at, Friendship.id) < tuple_(*after))
+            side_query = side_query.order_by(Friendship.updated_at.desc(), Friendship.id.desc())
+        else:
+            if after:
+                side_query = side_query.where(tuple_(User.first_name, User.last_name, User.id) > tuple_(*after))
+            side_query = side_query.order_by(User.first_name, User.last_name, User.id)
+        # Subconsulta para que cada lado mantenha seu ORDER BY/LIMIT dentro do UNION
+        return select(side_query.limit(limit + 1).subquery())
+
+    friends_union = union_all(
+        side(Friendship.requester_id, Friendship.addressee_id),
+        side(Friendship.addressee_id, Friendship.requester_id)
+    ).subquery()
+    if order == "recent":
+        sort = (friends_union.c.updated_at.desc(), friends_union.c.friendship_id.desc())
+    else:
+        sort = (friends_union.c.first_name, friends_union.c.last_name, friends_union.c.id)
+    query = select(friends_union).order_by(*sort)
+
+    rows = db.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        if order == "recent":
+            next_cursor = encode_cursor([last.updated_at, last.friendship_id])
+        else:
+            next_cursor = encode_cursor([last.first_name, last.last_name, last.id])
+
+    friends = [
+        {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "username": row.username,
+            "avatar": row.avatar,
+            "bio": row.bio,
+            "location": row.location,
+            "is_verified": row.is_verified,
+            "online": presence.is_online(row.id),
+            "friendship_date": row.updated_at.isoformat() if row.updated_at else None
+        }
+        for row in rows
+    ]
+
+    # Total de amigos (sem o filtro q): uma contagem por índice em cada sentido
+    total = sum(
+        db.query(func.count(Friendship.id)).filter(
+            own_column == current_user.id, Friendship.status == "accepted"
+        ).scalar()
+        for own_column in (Friendship.requester_id, Friendship.addressee_id)
+    )
+
+    return {"friends": friends, "next_cursor": next_cursor, "total": total}
 
 @router.delete("/{friend_id}")
 async def remove_friend(
     friend_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Remover amigo"""
@@ -212,7 +286,7 @@ async def remove_friend(
 @router.get("/status/{user_id}")
 async def get_friendship_status(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter status da amizade com um usuário"""
@@ -240,7 +314,7 @@ async def get_friendship_status(
 @router.get("/suggestions")
 async def get_friend_suggestions(
     limit: int = 10,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter sugestões de amizade baseadas em amigos em comum"""
@@ -282,7 +356,9 @@ async def get_friend_suggestions(
     exclude_ids = set([current_user.id] + friend_ids + list(blocked_ids) + list(pending_ids))
     
     # Buscar usuários ativos que não estão na lista de exclusão
-    suggested_users = db.query(User).filter(
+    suggested_users = db.query(User).options(
+        load_only(*USER_CARD_COLUMNS, User.bio, User.location)
+    ).filter(
         User.is_active == True,
         ~User.id.in_(exclude_ids)
     ).limit(limit * 2).all()  # Buscar mais para filtrar depois
@@ -0,0 +1,281 @@
+"""
+Rotas de mensagens diretas
+
+Cada par de usuários tem uma linha em conversations com a última mensagem e,
+para cada lado, o contador de não lidas e o id da última mensagem lida. A
+caixa de entrada é uma única leitura nessa tabela, o histórico é paginado por
+(conversation_id, id) e marcar como lido vira um "lido até N" na conversa,
+gravado em lote pelo buffer de core.chat_signals.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select, tuple_, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, selectinload
+from typing import Optional
+
+from core.chat_signals import read_receipts, typing_throttle
+from core.database import get_db
+from core.security import get_current_principal, Principal
+from core.websockets import manager
+from models import User, Block, Conversation, Message, USER_CARD_COLUMNS
+from schemas import MessageCreate
+from utils.notification_dispatcher import sender_to_dict
+from utils.pagination import encode_cursor, decode_cursor
+
+router = APIRouter(prefix="/messages", tags=["messages"])
+
+def _side(conversation: Conversation, user_id: int) -> str:
+    return "a" if conversation.user_a_id == user_id else "b"
+
+def _other_side(side: str) -> str:
+    return "b" if side == "a" else "a"
+
+def _column(side: str, name: str):
+    """Coluna de um lado da conversa, ex.: _column("a", "unread") -> user_a_unread"""
+    return getattr(Conversation, f"user_{side}_{name}")
+
+def _pair_filter(user_id: int, other_id: int):
+    user_a_id, user_b_id = sorted((user_id, other_id))
+    return (Conversation.user_a_id == user_a_id) & (Conversation.user_b_id == user_b_id)
+
+def _last_read_id(conversation: Conversation, user_id: int) -> int:
+    return getattr(conversation, f"user_{_side(conversation, user_id)}_last_read_id")
+
+def is_message_read(message: Message, conversation: Conversation, user_id: int) -> bool:
+    """Lida pelo destinatário, contando o marcador ainda no buffer de confirmações"""
+    if message.sender_id != user_id:
+        reader_id = user_id
+    else:
+        reader_id = conversation.user_b_id if conversation.user_a_id == user_id else conversation.user_a_id
+    last_read_id = max(
+        _last_read_id(conversation, reader_id),
+        read_receipts.pending_up_to(conversation.id, reader_id)
+    )
+    return message.id <= last_read_id
+
+def message_to_dict(message: Message, sender: Optional[User], conversation: Conversation, user_id: int) -> dict:
+    """Formato de mensagem usado pela API e pelo WebSocket, do ponto de vista de user_id"""
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender": sender_to_dict(sender),
+        "content": message.content,
+        "message_type": message.message_type,
+        "media_url": message.media_url,
+        "is_read": is_message_read(message, conversation, user_id),
+        "created_at": message.created_at.isoformat() if message.created_at else None,
+        "is_own": message.sender_id == user_id
+    }
+
+def get_or_create_conversation(db: Session, user_id: int, other_id: int) -> Conversation:
+    """Conversa do par, travada até o commit para serializar envios concorrentes"""
+    conversation = db.query(Conversation).filter(_pair_filter(user_id, other_id)).with_for_update().first()
+    if conversation:
+        return conversation
+
+    user_a_id, user_b_id = sorted((user_id, other_id))
+    try:
+        conversation = Conversation(user_a_id=user_a_id, user_b_id=user_b_id)
+        db.add(conversation)
+        db.flush()
+    except IntegrityError:
+        # Outra requisição criou a conversa ao mesmo tempo
+        db.rollback()
+        conversation = db.query(Conversation).filter(_pair_filter(user_id, other_id)).with_for_update().one()
+    return conversation
+
+@router.post("/")
+async def send_message(
+    payload: MessageCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Enviar mensagem direta"""
+    if payload.recipient_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Cannot send a message to yourself")
+    if not (payload.content and payload.content.strip()) and not payload.media_url:
+        raise HTTPException(status_code=400, detail="Message content is required")
+
+    recipient = db.query(User.id).filter(User.id == payload.recipient_id, User.is_active == True).first()
+    if not recipient:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    block = db.query(Block.id).filter(
+        ((Block.blocker_id == current_user.id) & (Block.blocked_id == payload.recipient_id)) |
+        ((Block.blocker_id == payload.recipient_id) & (Block.blocked_id == current_user.id))
+    ).first()
+    if block:
+        raise HTTPException(status_code=403, detail="Cannot send message due to blocking")
+
+    conversation = get_or_create_conversation(db, current_user.id, payload.recipient_id)
+    is_new_conversation = conversation.last_message_id is None
+    message = Message(
+        conversation_id=conversation.id,
+        sender_id=current_user.id,
+        recipient_id=payload.recipient_id,
+        content=payload.content,
+        message_type=payload.message_type,
+        media_url=payload.media_url,
+        media_metadata=payload.media_metadata
+    )
+    db.add(message)
+    db.flush()
+
+    # Resumo da conversa num único UPDATE
+    recipient_unread = _column(_other_side(_side(conversation, current_user.id)), "unread")
+    db.query(Conversation).filter(Conversation.id == conversation.id).update({
+        Conversation.last_message_id: message.id,
+        Conversation.last_message_at: message.created_at,
+        recipient_unread: recipient_unread + 1,
+    }, synchronize_session=False)
+    db.commit()
+    db.refresh(conversation)
+    if is_new_conversation:
+        # O par pode ter ficado em cache como "sem conversa" para o digitando
+        typing_throttle.invalidate_pair(current_user.id, payload.recipient_id)
+
+    await manager.send_message(
+        payload.recipient_id, message_to_dict(message, current_user, conversation, payload.recipient_id)
+    )
+    return message_to_dict(message, current_user, conversation, current_user.id)
+
+@router.get("/conversations")
+async def get_conversations(
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Caixa de entrada: conversas com a última mensagem e as não lidas, paginadas por cursor"""
+    user_id = current_user.id
+    after = decode_cursor(cursor, 2)
+
+    def side(own_column, other_column):
+        side_query = select(
+            Conversation.id,
+            Conversation.last_message_at,
+            other_column.label("other_id")
+        ).where(
+            own_column == user_id,
+            Conversation.last_message_id.isnot(None)
+        )
+        if after:
+            side_query = side_query.where(tuple_(Conversation.last_message_at, Conversation.id) < tuple_(*after))
+        side_query = side_query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        # Cada lado usa o próprio índice (user_x_id, last_message_at, id) e para no limite
+        return select(side_query.limit(limit + 1).subquery())
+
+    inbox_union = union_all(
+        side(Conversation.user_a_id, Conversation.user_b_id),
+        side(Conversation.user_b_id, Conversation.user_a_id)
+    ).subquery()
+    page = select(inbox_union).order_by(
+        inbox_union.c.last_message_at.desc(), inbox_union.c.id.desc()
+    ).limit(limit + 1).subquery()
+
+    rows = db.query(Conversation, Message, User).join(
+        page, page.c.id == Conversation.id
+    ).join(
+        User, User.id == page.c.other_id
+    ).outerjoin(
+        Message, Message.id == Conversation.last_message_id
+    ).options(
+        load_only(*USER_CARD_COLUMNS),
+        load_only(Message.id, Message.conversation_id, Message.sender_id, Message.content,
+                  Message.message_type, Message.created_at)
+    ).order_by(
+        page.c.last_message_at.desc(), page.c.id.desc()
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    conversations = []
+    for conversation, last_message, contact in rows:
+        unread_count = getattr(conversation, f"user_{_side(conversation, user_id)}_unread")
+        if read_receipts.pending_up_to(conversation.id, user_id) >= conversation.last_message_id:
+            # Leitura ainda no buffer já cobre a última mensagem
+            unread_count = 0
+        conversations.append({
+            "id": conversation.id,
+            "user": sender_to_dict(contact),
+            "last_message": {
+                "id": last_message.id,
+                "content": last_message.content,
+                "message_type": last_message.message_type,
+                "created_at": last_message.created_at.isoformat() if last_message.created_at else None,
+                "is_read": is_message_read(last_message, conversation, user_id),
+                "is_own": last_message.sender_id == user_id
+            } if last_message else None,
+            "unread_count": unread_count
+        })
+
+    return {
+        "conversations": conversations,
+        "next_cursor": encode_cursor(
+            [rows[-1][0].last_message_at, rows[-1][0].id]
+        ) if has_more else None
+    }
+
+@router.get("/conversation/{contact_id}")
+async def get_conversation_messages(
+    contact_id: int,
+    limit: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Histórico com um contato, da mais recente para trás; cada página vem em ordem cronológica"""
+    conversation = db.query(Conversation).filter(_pair_filter(current_user.id, contact_id)).first()
+    if not conversation:
+        return {"conversation_id": None, "messages": [], "next_cursor": None}
+
+    query = db.query(Message).options(
+        selectinload(Message.sender).load_only(*USER_CARD_COLUMNS)
+    ).filter(Message.conversation_id == conversation.id)
+
+    before = decode_cursor(cursor, 1)
+    if before:
+        query = query.filter(Message.id < before[0])
+
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    return {
+        "conversation_id": conversation.id,
+        "messages": [
+            message_to_dict(message, message.sender, conversation, current_user.id)
+            for message in reversed(messages)
+        ],
+        "next_cursor": encode_cursor([messages[-1].id]) if has_more else None
+    }
+
+@router.put("/{message_id}/read")
+async def mark_messages_read(
+    message_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Marcar como lidas todas as mensagens da conversa até message_id
+
+    O marcador entra no buffer de confirmações de leitura e é gravado no
+    próximo flush, junto com os demais.
+    """
+    row = db.query(Message.sender_id, Message.recipient_id, Conversation).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).filter(Message.id == message_id).first()
+    if not row or current_user.id not in (row.sender_id, row.recipient_id):
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    conversation = row.Conversation
+    side = _side(conversation, current_user.id)
+    last_read_id = max(
+        _last_read_id(conversation, current_user.id),
+        read_receipts.pending_up_to(conversation.id, current_user.id)
+    )
+    if message_id > last_read_id:
+        other_id = conversation.user_b_id if side == "a" else conversation.user_a_id
+        read_receipts.mark(conversation.id, current_user.id, side, other_id, message_id)
+        last_read_id = message_id
+
+    return {"message": "Messages marked as read", "last_read_id": last_read_id}
@@ -1,29 +1,43 @@
 """
 Rotas para gerenciamento de notificações
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
 import json
 
 from core.database import get_db
-from core.security import get_current_user
-from models import User, Notification, NotificationType
+from core.security import get_current_principal, Principal, verify_websocket_token
+from core.websockets import manager
+from models import Notification, NotificationType, USER_CARD_COLUMNS
+from utils.notification_helpers import notification_to_dict
+from utils.pagination import encode_cursor, decode_cursor
+from utils.notification_counters import (
+    get_unread_count, adjust_unread_count, reset_unread_count, push_unread_count
+)
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @router.get("/")
 async def get_notifications(
-    skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
     unread_only: bool = Query(False),
     notification_type: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Obter notificações do usuário"""
-    query = db.query(Notification).filter(
+    """Obter notificações do usuário, paginadas por cursor
+
+    A ordem é pelo último evento (updated_at): uma notificação agrupada volta
+    ao topo da lista, na mesma posição em que chegou pelo WebSocket.
+    """
+    query = db.query(Notification).options(
+        selectinload(Notification.sender).load_only(*USER_CARD_COLUMNS)
+    ).filter(
         Notification.recipient_id == current_user.id,
         Notification.is_deleted == False
     )
@@ -32,107 +46,158 @@ async def get_notifications(
         query = query.filter(Notification.is_read == False)
     
     if notification_type:
-        query = query.filter(Notification.notification_type == notification_type)
-    
-    notifications = query.order_by(
-        Notification.created_at.desc()
-    ).offset(skip).limit(limit).all()
+        try:
+            query = query.filter(Notification.notification_type == NotificationType(notification_type))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Tipo de notificação inválido")
     
-    result = []
-    for notification in notifications:
-        notification_data = {
-            "id": notification.id,
-            "type": notification.notification_type.value,
-            "title": notification.title,
-            "message": notification.message,
-            "is_read": notification.is_read,
-            "is_clicked": notification.is_clicked,
-            "created_at": notification.created_at.isoformat(),
-            "read_at": notification.read_at.isoformat() if notification.read_at else None,
-            "sender": None,
-            "data": json.loads(notification.data) if notification.data else {}
-        }
-        
-        if notification.sender:
-            notification_data["sender"] = {
-                "id": notification.sender.id,
-                "first_name": notification.sender.first_name,
-                "last_name": notification.sender.last_name,
-                "username": notification.sender.username,
-                "avatar": notification.sender.avatar
-            }
-        
-        result.append(notification_data)
+    after = decode_cursor(cursor, 2)
+    if after:
+        query = query.filter(tuple_(Notification.updated_at, Notification.id) < tuple_(*after))
     
-    return result
+    notifications = query.order_by(
+        Notification.updated_at.desc(), Notification.id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+    
+    return {
+        "notifications": [
+            notification_to_dict(notification, notification.sender)
+            for notification in notifications
+        ],
+        "next_cursor": encode_cursor(
+            [notifications[-1].updated_at, notifications[-1].id]
+        ) if has_more else None
+    }
 
 @router.get("/count")
 async def get_notification_count(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter contagem de notificações não lidas"""
-    unread_count = db.query(Notification).filter(
-        Notification.recipient_id == current_user.id,
+    return {"unread_count": get_unread_count(db, current_user.id)}
+
+@router.get("/unread-count")
+async def get_unread_notification_count(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Alias de /count usado pelo NotificationCenter"""
+    return {"count": get_unread_count(db, current_user.id)}
+
+@router.get("/stream")
+async def notification_stream(
+    request: Request,
+    token: str = Query(...),
+    since: Optional[int] = Query(None),
+):
+    """Eventos em tempo real via Server-Sent Events, para redes que bloqueiam WebSocket
+
+    Entrega os mesmos frames do /ws/{user_id}. O id de cada evento é o seq, que
+    o navegador reenvia em Last-Event-ID ao reconectar para receber só o que
+    perdeu (since faz o mesmo na primeira conexão). EventSource não envia
+    headers, por isso o token vem na query string.
+    """
+    user_id = await verify_websocket_token(token)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID inválido")
+
+    connection = manager.connect_stream(user_id, since)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            async for chunk in connection.events():
+                yield chunk
+        finally:
+            manager.disconnect_stream(connection)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Sem buffer em proxies nginx
+    })
+
+def _get_own_notification_id(db: Session, notification_id: int, user_id: int) -> int:
+    notification = db.query(Notification.id).filter(
+        Notification.id == notification_id,
+        Notification.recipient_id == user_id
+    ).first()
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return notification.id
+
+def _update_if_unread(db: Session, notification_id: int, user_id: int, values: dict) -> bool:
+    """UPDATE condicional: só uma requisição concorrente tira a notificação de "não lida"
+
+    O contador é descontado apenas quando este UPDATE mudou a linha.
+    """
+    changed = db.query(Notification).filter(
+        Notification.id == notification_id,
+        Notification.recipient_id == user_id,
         Notification.is_read == False,
         Notification.is_deleted == False
-    ).count()
-    
-    return {"unread_count": unread_count}
+    ).update(values, synchronize_session=False)
+    if changed == 1:
+        adjust_unread_count(db, user_id, -1)
+        return True
+    return False
 
 @router.post("/{notification_id}/read")
 async def mark_notification_as_read(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Marcar notificação como lida"""
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.recipient_id == current_user.id
-    ).first()
-    
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    if not notification.is_read:
-        notification.is_read = True
-        notification.read_at = datetime.utcnow()
+    _get_own_notification_id(db, notification_id, current_user.id)
+
+    if _update_if_unread(db, notification_id, current_user.id, {
+        "is_read": True,
+        "read_at": datetime.utcnow()
+    }):
         db.commit()
+        push_unread_count(db, current_user.id)
     
     return {"message": "Notification marked as read"}
 
 @router.post("/{notification_id}/click")
 async def mark_notification_as_clicked(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Marcar notificação como clicada"""
-    notification = db.query(Notification).filter(
+    _get_own_notification_id(db, notification_id, current_user.id)
+
+    now = datetime.utcnow()
+    db.query(Notification).filter(
         Notification.id == notification_id,
-        Notification.recipient_id == current_user.id
-    ).first()
-    
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    if not notification.is_clicked:
-        notification.is_clicked = True
-        notification.clicked_at = datetime.utcnow()
-        
-        # Marcar como lida também se não estiver
-        if not notification.is_read:
-            notification.is_read = True
-            notification.read_at = datetime.utcnow()
-        
-        db.commit()
+        Notification.is_clicked == False
+    ).update({"is_clicked": True, "clicked_at": now}, synchronize_session=False)
+
+    # Marcar como lida também se não estiver
+    was_unread = _update_if_unread(db, notification_id, current_user.id, {
+        "is_read": True,
+        "read_at": now
+    })
+    db.commit()
+    if was_unread:
+        push_unread_count(db, current_user.id)
     
     return {"message": "Notification marked as clicked"}
 
 @router.post("/mark-all-read")
 async def mark_all_notifications_as_read(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Marcar todas as notificações como lidas"""
@@ -144,33 +209,16 @@ async def mark_all_notifications_as_read(
         "is_read": True,
         "read_at": datetime.utcnow()
     })
+    reset_unread_count(db, current_user.id)
     
     db.commit()
+    push_unread_count(db, current_user.id)
     return {"message": "All notifications marked as read"}
 
-@router.delete("/{notification_id}")
-async def delete_notification(
-    notification_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Deletar notificação"""
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.recipient_id == current_user.id
-    ).first()
-    
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    
-    notification.is_deleted = True
-    db.commit()
-    
-    return {"message": "Notification deleted"}
-
+# Declarada antes de /{notification_id} para não ser capturada por ela
 @router.delete("/clear-all")
 async def clear_all_notifications(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Limpar todas as notificações"""
@@ -178,6 +226,29 @@ async def clear_all_notifications(
         Notification.recipient_id == current_user.id,
         Notification.is_deleted == False
     ).update({"is_deleted": True})
+    reset_unread_count(db, current_user.id)
     
     db.commit()
+    push_unread_count(db, current_user.id)
     return {"message": "All notifications cleared"}
+
+@router.delete("/{notification_id}")
+async def delete_notification(
+    notification_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Deletar notificação"""
+    _get_own_notification_id(db, notification_id, current_user.id)
+
+    was_unread = _update_if_unread(db, notification_id, current_user.id, {"is_deleted": True})
+    if not was_unread:
+        db.query(Notification).filter(
+            Notification.id == notification_id,
+            Notification.is_deleted == False
+        ).update({"is_deleted": True}, synchronize_session=False)
+    db.commit()
+    if was_unread:
+        push_unread_count(db, current_user.id)
+    
+    return {"message": "Notification deleted"}
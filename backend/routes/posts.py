@@ -7,7 +7,7 @@ from typing import List
 import json
 
 from core.database import get_db
-from core.security import get_current_user
+from core.security import get_current_principal, Principal
 from models import User, Post, Reaction, Comment, Share
 from schemas import PostCreate, PostResponse, ReactionCreate, CommentCreate, CommentResponse, ShareCreate
 from utils.notification_helpers import create_post_reaction_notification, create_post_comment_notification
@@ -15,7 +15,7 @@ from utils.notification_helpers import create_post_reaction_notification, create
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.post("/", response_model=PostResponse)
-async def create_post(post: PostCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post(post: PostCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     # Validação e processamento do conteúdo
     content_to_save = post.content
     
@@ -66,7 +66,7 @@ async def create_post(post: PostCreate, current_user: User = Depends(get_current
     )
 
 @router.get("/", response_model=List[PostResponse])
-async def get_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_posts(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     posts = db.query(Post).order_by(Post.created_at.desc()).limit(50).all()
     
     return [
@@ -93,7 +93,7 @@ async def get_posts(current_user: User = Depends(get_current_user), db: Session
     ]
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_post(post_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Get individual post by ID"""
     post = db.query(Post).filter(Post.id == post_id).first()
 
@@ -121,7 +121,7 @@ async def get_post(post_id: int, current_user: User = Depends(get_current_user),
     )
 
 @router.delete("/{post_id}")
-async def delete_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_post(post_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -141,7 +141,7 @@ async def delete_post(post_id: int, current_user: User = Depends(get_current_use
 
 # Reactions
 @router.post("/{post_id}/reactions")
-async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Add or update reaction to a post"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
@@ -166,7 +166,6 @@ async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, curr
             reaction_type=reaction_data.reaction_type
         )
         db.add(reaction)
-        db.commit()
 
         # Criar notificação para o autor do post (se não for o mesmo usuário)
         if post.author_id != current_user.id:
@@ -177,11 +176,12 @@ async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, curr
                 post_author_id=post.author_id,
                 reaction_type=reaction_data.reaction_type
             )
+        db.commit()
 
         return {"message": "Reaction added"}
 
 @router.delete("/{post_id}/reactions")
-async def remove_post_reaction(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def remove_post_reaction(post_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Remove reaction from a post"""
     reaction = db.query(Reaction).filter(
         Reaction.post_id == post_id,
@@ -197,7 +197,7 @@ async def remove_post_reaction(post_id: int, current_user: User = Depends(get_cu
 
 # Comments
 @router.get("/{post_id}/comments", response_model=List[CommentResponse])
-async def get_post_comments(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_post_comments(post_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Get comments for a specific post"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
@@ -222,7 +222,7 @@ async def get_post_comments(post_id: int, current_user: User = Depends(get_curre
     ]
 
 @router.post("/{post_id}/comments", response_model=CommentResponse)
-async def create_comment(post_id: int, comment_data: CommentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_comment(post_id: int, comment_data: CommentCreate, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Create a comment on a post"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if not post:
@@ -235,8 +235,7 @@ async def create_comment(post_id: int, comment_data: CommentCreate, current_user
     )
 
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    db.flush()
 
     # Criar notificação para o autor do post (se não for o mesmo usuário)
     if post.author_id != current_user.id:
@@ -247,6 +246,8 @@ async def create_comment(post_id: int, comment_data: CommentCreate, current_user
             post_author_id=post.author_id,
             comment_id=comment.id
         )
+    db.commit()
+    db.refresh(comment)
 
     return CommentResponse(
         id=comment.id,
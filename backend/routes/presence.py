@@ -0,0 +1,30 @@
+"""
+Rotas de presença (online/offline)
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
+
+from core.database import get_db
+from core.presence import presence
+from core.security import get_current_principal, Principal
+from models import User
+
+router = APIRouter(prefix="/presence", tags=["presence"])
+
+MAX_PRESENCE_IDS = 200
+
+@router.get("")
+async def get_presence(
+    ids: str = Query(..., description="Ids de usuários separados por vírgula"),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Presença de vários usuários; só o last_seen fora da memória vai ao banco"""
+    try:
+        user_ids = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids deve ser uma lista de inteiros")
+    if len(user_ids) > MAX_PRESENCE_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_PRESENCE_IDS} ids por consulta")
+
+    return {"presence": {str(user_id): state for user_id, state in presence.get_many(user_ids, db).items()}}
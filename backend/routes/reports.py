@@ -2,12 +2,13 @@
 Rotas para sistema de denúncias
 """
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from datetime import datetime
 
+from core.chat_signals import typing_throttle
 from core.database import get_db
-from core.security import get_current_user
-from models import User
+from core.security import get_current_principal, Principal
+from models import User, USER_CARD_COLUMNS
 from models.report import Report, ReportType, ReportStatus
 
 router = APIRouter(prefix="/reports", tags=["reports"])
@@ -17,7 +18,7 @@ async def report_user(
     user_id: int,
     report_type: ReportType,
     description: str = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Denunciar um usuário"""
@@ -26,7 +27,7 @@ async def report_user(
         raise HTTPException(status_code=400, detail="Cannot report yourself")
     
     # Verificar se o usuário existe
-    reported_user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    reported_user = db.query(User.id).filter(User.id == user_id, User.is_active == True).first()
     if not reported_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -55,15 +56,17 @@ async def report_user(
 
 @router.get("/my-reports")
 async def get_my_reports(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter denúncias feitas pelo usuário atual"""
-    reports = db.query(Report).filter(Report.reporter_id == current_user.id).all()
+    # Denunciado no mesmo JOIN, só com as colunas do card
+    rows = db.query(Report, User).join(
+        User, User.id == Report.reported_user_id
+    ).options(load_only(*USER_CARD_COLUMNS)).filter(Report.reporter_id == current_user.id).all()
     
     result = []
-    for report in reports:
-        reported_user = db.query(User).filter(User.id == report.reported_user_id).first()
+    for report, reported_user in rows:
         result.append({
             "id": report.id,
             "reported_user": {
@@ -98,7 +101,7 @@ async def get_report_types():
 @router.post("/block/{user_id}")
 async def block_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Bloquear um usuário"""
@@ -109,7 +112,7 @@ async def block_user(
         raise HTTPException(status_code=400, detail="Cannot block yourself")
     
     # Verificar se o usuário existe
-    user_to_block = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user_to_block = db.query(User.id).filter(User.id == user_id, User.is_active == True).first()
     if not user_to_block:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -158,13 +161,14 @@ async def block_user(
         db.delete(follow2)
     
     db.commit()
+    typing_throttle.invalidate_pair(current_user.id, user_id)
     
     return {"message": "User blocked successfully"}
 
 @router.delete("/block/{user_id}")
 async def unblock_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Desbloquear um usuário"""
@@ -180,30 +184,32 @@ async def unblock_user(
     
     db.delete(block)
     db.commit()
+    typing_throttle.invalidate_pair(current_user.id, user_id)
     
     return {"message": "User unblocked successfully"}
 
 @router.get("/blocked-users")
 async def get_blocked_users(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Obter lista de usuários bloqueados"""
     from models import Block
     
-    blocks = db.query(Block).filter(Block.blocker_id == current_user.id).all()
-    
-    blocked_users = []
-    for block in blocks:
-        blocked_user = db.query(User).filter(User.id == block.blocked_id).first()
-        if blocked_user:
-            blocked_users.append({
-                "id": blocked_user.id,
-                "first_name": blocked_user.first_name,
-                "last_name": blocked_user.last_name,
-                "username": blocked_user.username,
-                "avatar": blocked_user.avatar,
-                "blocked_at": block.created_at.isoformat()
-            })
+    rows = db.query(Block.created_at, *USER_CARD_COLUMNS).join(
+        User, User.id == Block.blocked_id
+    ).filter(Block.blocker_id == current_user.id).all()
+    
+    blocked_users = [
+        {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "username": row.username,
+            "avatar": row.avatar,
+            "blocked_at": row.created_at.isoformat()
+        }
+        for row in rows
+    ]
     
     return blocked_users
@@ -0,0 +1,45 @@
+"""
+Rotas de configurações do usuário
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from core.database import get_db
+from core.security import get_current_principal, Principal
+from models import User
+from schemas.user import NotificationSettings
+from utils.notification_preferences import PREFERENCE_FLAGS, invalidate_preferences
+
+router = APIRouter(prefix="/settings", tags=["settings"])
+
+def _notification_settings(db: Session, user_id: int) -> dict:
+    row = db.query(
+        *[getattr(User, column) for column in PREFERENCE_FLAGS]
+    ).filter(User.id == user_id).first()
+    return {column: value is not False for column, value in row._asdict().items()}
+
+@router.get("/notifications")
+async def get_notification_settings(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Obter preferências de notificação"""
+    return _notification_settings(db, current_user.id)
+
+@router.put("/notifications")
+async def update_notification_settings(
+    settings: NotificationSettings,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Atualizar preferências de notificação"""
+    values = settings.model_dump(exclude_none=True)
+    if values:
+        db.query(User).filter(User.id == current_user.id).update(values, synchronize_session=False)
+        db.commit()
+        invalidate_preferences(current_user.id)
+
+    return {
+        "message": "Configurações de notificação atualizadas",
+        "settings": _notification_settings(db, current_user.id)
+    }
@@ -4,20 +4,28 @@ Rotas para stories
 import os
 from typing import List, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, or_, desc, tuple_
 
+from core.cache import TTLCache
+from core.config import STORY_TRAY_CACHE_SECONDS
 from core.database import get_db
 from models.story import Story, StoryView, StoryTag, StoryOverlay
+from models.friendship import Friendship, Follow, Block
 from models.user import User
 from schemas.story import StoryCreate, StoryResponse, StoryWithEditor
-from utils.auth import get_current_user
-from utils.files import save_uploaded_file
+from core.security import get_current_principal, Principal
+from utils.files import save_uploaded_file, media_path_from_url
+from utils.pagination import encode_cursor, decode_cursor
+from utils.story_view_buffer import story_view_buffer
 
 router = APIRouter(prefix="/stories", tags=["stories"])
 
+# Bandeja montada por usuário, reaproveitada por alguns segundos
+tray_cache = TTLCache(ttl_seconds=STORY_TRAY_CACHE_SECONDS)
+
 @router.post("/", response_model=dict)
 async def create_story(
     content: Optional[str] = Form(None),
@@ -25,7 +33,7 @@ async def create_story(
     background_color: Optional[str] = Form("#3B82F6"),
     duration_hours: int = Form(24),
     file: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Criar uma nova story com upload de mídia opcional"""
@@ -91,6 +99,7 @@ async def create_story(
         db.add(story)
         db.commit()
         db.refresh(story)
+        tray_cache.invalidate(current_user.id)
 
         print(f"✅ Story criada com sucesso - ID: {story.id}")
 
@@ -133,7 +142,7 @@ async def create_story(
 
 @router.get("/", response_model=List[dict])
 async def get_stories(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Buscar stories ativas (não expiradas)"""
@@ -185,52 +194,205 @@ async def get_stories(
         print(f"❌ Erro ao buscar stories: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar stories: {str(e)}")
 
+@router.get("/tray")
+async def get_story_tray(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Bandeja de stories: stories ativas dos autores visíveis, agrupadas por autor"""
+    cached = tray_cache.get(current_user.id)
+    if cached is not None:
+        return cached
+
+    try:
+        now = datetime.utcnow()
+
+        friend_ids = set()
+        for requester_id, addressee_id in db.query(Friendship.requester_id, Friendship.addressee_id).filter(
+            or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id),
+            Friendship.status == "accepted"
+        ):
+            friend_ids.add(addressee_id if requester_id == current_user.id else requester_id)
+
+        followed_ids = {
+            followed_id for (followed_id,) in db.query(Follow.followed_id).filter(
+                Follow.follower_id == current_user.id
+            )
+        }
+
+        blocked_ids = set()
+        for blocker_id, blocked_id in db.query(Block.blocker_id, Block.blocked_id).filter(
+            or_(Block.blocker_id == current_user.id, Block.blocked_id == current_user.id)
+        ):
+            blocked_ids.add(blocker_id)
+            blocked_ids.add(blocked_id)
+        blocked_ids.discard(current_user.id)
+
+        # Amigos veem stories "public" e "friends"; seguidos só as "public"
+        friend_ids -= blocked_ids
+        followed_ids -= blocked_ids | friend_ids
+        visibility = [Story.author_id == current_user.id]
+        if friend_ids:
+            visibility.append(and_(
+                Story.author_id.in_(friend_ids),
+                or_(User.story_visibility.in_(("public", "friends")), User.story_visibility.is_(None))
+            ))
+        if followed_ids:
+            visibility.append(and_(
+                Story.author_id.in_(followed_ids),
+                or_(User.story_visibility == "public", User.story_visibility.is_(None))
+            ))
+
+        rows = db.query(
+            Story.id,
+            Story.author_id,
+            Story.content,
+            Story.media_type,
+            Story.media_url,
+            Story.background_color,
+            Story.created_at,
+            Story.expires_at,
+            Story.views_count,
+            User.first_name,
+            User.last_name,
+            User.username,
+            User.avatar
+        ).join(User, User.id == Story.author_id).filter(
+            Story.expires_at > now,
+            Story.archived == False,
+            or_(*visibility)
+        ).order_by(Story.author_id, Story.created_at).all()
+
+        # Estado de visualização de todas as stories em uma única consulta IN
+        viewed_ids = set()
+        if rows:
+            viewed_ids = {
+                story_id for (story_id,) in db.query(StoryView.story_id).filter(
+                    StoryView.viewer_id == current_user.id,
+                    StoryView.story_id.in_([row.id for row in rows])
+                )
+            }
+
+        groups = {}
+        for row in rows:
+            group = groups.get(row.author_id)
+            if group is None:
+                group = groups[row.author_id] = {
+                    "author": {
+                        "id": row.author_id,
+                        "first_name": row.first_name,
+                        "last_name": row.last_name,
+                        "username": row.username,
+                        "avatar_url": row.avatar
+                    },
+                    "is_own": row.author_id == current_user.id,
+                    "has_unseen": False,
+                    "latest_at": row.created_at,
+                    "stories": []
+                }
+            viewed = row.id in viewed_ids or story_view_buffer.is_pending(row.id, current_user.id)
+            group["has_unseen"] = group["has_unseen"] or not viewed
+            group["latest_at"] = max(group["latest_at"], row.created_at)
+            group["stories"].append({
+                "id": row.id,
+                "content": row.content,
+                "media_type": row.media_type,
+                "media_url": row.media_url,
+                "background_color": row.background_color,
+                "created_at": row.created_at.isoformat(),
+                "expires_at": row.expires_at.isoformat(),
+                "views_count": row.views_count,
+                "viewed_by_user": viewed
+            })
+
+        # Próprias stories primeiro, depois autores com stories não vistas, mais recentes antes
+        ordered = sorted(
+            groups.values(),
+            key=lambda g: (not g["is_own"], not g["has_unseen"], -g["latest_at"].timestamp())
+        )
+        for group in ordered:
+            group["latest_at"] = group["latest_at"].isoformat()
+
+        result = {"tray": ordered}
+        tray_cache.set(current_user.id, result)
+        return result
+
+    except Exception as e:
+        print(f"❌ Erro ao montar bandeja de stories: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro ao buscar stories")
+
 @router.post("/{story_id}/view")
 async def view_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Marcar story como visualizada"""
     
-    try:
-        # Verificar se a story existe
-        story = db.query(Story).filter(Story.id == story_id).first()
-        if not story:
-            raise HTTPException(status_code=404, detail="Story não encontrada")
-        
-        # Verificar se já foi visualizada
-        existing_view = db.query(StoryView).filter(
-            and_(
-                StoryView.story_id == story_id,
-                StoryView.viewer_id == current_user.id
-            )
-        ).first()
-        
-        if not existing_view:
-            # Adicionar visualização
-            view = StoryView(
-                story_id=story_id,
-                viewer_id=current_user.id
-            )
-            db.add(view)
-            
-            # Incrementar contador de visualizações
-            story.views_count += 1
-            
-            db.commit()
-        
-        return {"success": True, "message": "Visualização registrada"}
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ Erro ao registrar visualização: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao registrar visualização")
+    # Consulta apenas pela chave primária, sem travar a linha da story
+    exists = db.query(Story.id).filter(Story.id == story_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Story não encontrada")
+
+    # Gravação e contador ficam a cargo do buffer write-behind
+    story_view_buffer.record(story_id, current_user.id)
+    tray_cache.invalidate(current_user.id)
+
+    return {"success": True, "message": "Visualização registrada"}
+
+@router.get("/{story_id}/viewers")
+async def get_story_viewers(
+    story_id: int,
+    limit: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Listar quem visualizou a story (apenas o autor), paginado por cursor"""
+    story = db.query(Story.author_id, Story.views_count).filter(Story.id == story_id).first()
+    if not story:
+        raise HTTPException(status_code=404, detail="Story não encontrada")
+    if story.author_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Apenas o autor pode ver quem visualizou a story")
+
+    query = db.query(
+        StoryView.id.label("view_id"),
+        StoryView.viewed_at,
+        User.id,
+        User.first_name,
+        User.last_name,
+        User.username,
+        User.avatar
+    ).join(User, User.id == StoryView.viewer_id).filter(StoryView.story_id == story_id)
+
+    after = decode_cursor(cursor, 2)
+    if after:
+        query = query.filter(tuple_(StoryView.viewed_at, StoryView.id) < tuple_(*after))
+
+    rows = query.order_by(StoryView.viewed_at.desc(), StoryView.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "viewers": [
+            {
+                "id": row.id,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "username": row.username,
+                "avatar_url": row.avatar,
+                "viewed_at": row.viewed_at.isoformat() if row.viewed_at else None
+            }
+            for row in rows
+        ],
+        "views_count": story.views_count or 0,
+        "next_cursor": encode_cursor([rows[-1].viewed_at, rows[-1].view_id]) if has_more else None
+    }
 
 @router.get("/{story_id}")
 async def get_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Buscar uma story específica"""
@@ -270,7 +432,7 @@ async def get_story(
 @router.delete("/{story_id}")
 async def delete_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Deletar uma story (apenas o autor pode deletar)"""
@@ -288,8 +450,8 @@ async def delete_story(
         
         # Deletar arquivo de mídia se existir
         if story.media_url:
-            file_path = f"uploads{story.media_url}"
-            if os.path.exists(file_path):
+            file_path = media_path_from_url(story.media_url)
+            if file_path.exists():
                 os.remove(file_path)
         
         # Deletar visualizações e tags relacionadas
@@ -300,6 +462,7 @@ async def delete_story(
         # Deletar a story
         db.delete(story)
         db.commit()
+        tray_cache.invalidate(current_user.id)
         
         return {"success": True, "message": "Story deletada com sucesso"}
         
@@ -9,7 +9,7 @@ from sqlalchemy.orm import Session
 
 from core.database import get_db
 from models.user import User
-from utils.auth import get_current_user
+from core.security import get_current_principal, Principal
 from utils.files import save_uploaded_file, validate_media_file
 
 router = APIRouter(prefix="/upload", tags=["upload"])
@@ -17,7 +17,7 @@ router = APIRouter(prefix="/upload", tags=["upload"])
 @router.post("/media")
 async def upload_media(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Upload mídia para stories, posts, etc."""
@@ -52,7 +52,7 @@ async def upload_media(
 @router.post("/avatar")
 async def upload_avatar(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Upload de avatar de usuário"""
@@ -80,7 +80,7 @@ async def upload_avatar(
 @router.post("/cover")
 async def upload_cover(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Upload de foto de capa"""
@@ -2,15 +2,15 @@
 Rotas de usuários e perfis
 """
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from typing import List
 import os
 import uuid
 from pathlib import Path
 
 from core.database import get_db
-from core.security import get_current_user
-from models import User, Post, Friendship
+from core.security import get_current_user, get_current_principal, invalidate_principal, Principal
+from models import User, Post, Friendship, USER_CARD_COLUMNS, USER_PROFILE_COLUMNS
 from schemas import UserResponse, PostResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -21,11 +21,13 @@ async def search_users(
     location: str = None,
     verified_only: bool = False,
     limit: int = 20,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Buscar usuários com filtros avançados"""
-    query = db.query(User).filter(
+    query = db.query(User).options(
+        load_only(*USER_CARD_COLUMNS, User.email, User.bio, User.location, User.created_at)
+    ).filter(
         User.is_active == True,
         User.id != current_user.id
     )
@@ -51,7 +53,7 @@ async def search_users(
 
     # Obter usuários bloqueados para excluir dos resultados
     from models import Block
-    blocked_users = db.query(Block).filter(
+    blocked_users = db.query(Block.blocker_id, Block.blocked_id).filter(
         (Block.blocker_id == current_user.id) | (Block.blocked_id == current_user.id)
     ).all()
 
@@ -73,7 +75,7 @@ async def search_users(
             "username": user.username,
             "email": user.email,
             "bio": user.bio,
-            "avatar": getattr(user, 'avatar', None),
+            "avatar": user.avatar,
             "location": user.location,
             "is_verified": user.is_verified,
             "created_at": user.created_at.isoformat()
@@ -84,7 +86,7 @@ async def search_users(
 @router.get("/discover")
 async def discover_users(
     limit: int = 10,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Descobrir novos usuários (usuários reais cadastrados)"""
@@ -103,7 +105,7 @@ async def discover_users(
 
     # Obter usuários bloqueados
     from models import Block
-    blocked_users = db.query(Block).filter(
+    blocked_users = db.query(Block.blocker_id, Block.blocked_id).filter(
         (Block.blocker_id == current_user.id) | (Block.blocked_id == current_user.id)
     ).all()
 
@@ -128,7 +130,9 @@ async def discover_users(
 
     # Buscar usuários ativos que não estão na lista de exclusão
     # Priorizar usuários com mais informações no perfil
-    discovered_users = db.query(User).filter(
+    discovered_users = db.query(User).options(
+        load_only(*USER_CARD_COLUMNS, User.bio, User.location, User.created_at)
+    ).filter(
         User.is_active == True,
         ~User.id.in_(exclude_ids),
         User.onboarding_completed == True  # Apenas usuários que completaram o onboarding
@@ -152,8 +156,10 @@ async def discover_users(
     return result
 
 @router.get("/{user_id}")
-async def get_user_by_id(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+async def get_user_by_id(user_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    user = db.query(User).options(
+        load_only(*USER_CARD_COLUMNS, User.email, User.bio, User.birth_date, User.created_at)
+    ).filter(User.id == user_id, User.is_active == True).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -162,16 +168,16 @@ async def get_user_by_id(user_id: int, current_user: User = Depends(get_current_
         "first_name": user.first_name,
         "last_name": user.last_name,
         "email": user.email,
-        "bio": getattr(user, 'bio', None),
-        "avatar": getattr(user, 'avatar', None),
+        "bio": user.bio,
+        "avatar": user.avatar,
         "birth_date": user.birth_date.isoformat() if user.birth_date else None,
         "created_at": user.created_at.isoformat()
     }
 
 @router.get("/{user_id}/profile")
-async def get_user_profile(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_profile(user_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Obter perfil completo do usuário com configurações de privacidade"""
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    user = db.query(User).options(load_only(*USER_PROFILE_COLUMNS)).filter(User.id == user_id, User.is_active == True).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -239,7 +245,7 @@ async def get_user_profile(user_id: int, current_user: User = Depends(get_curren
     return response_data
 
 @router.get("/{user_id}/posts", response_model=List[PostResponse])
-async def get_user_posts(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_posts(user_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     posts = db.query(Post).filter(
         Post.author_id == user_id,
         Post.post_type == "post"
@@ -269,7 +275,7 @@ async def get_user_posts(user_id: int, current_user: User = Depends(get_current_
     ]
 
 @router.get("/{user_id}/testimonials", response_model=List[PostResponse])
-async def get_user_testimonials(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_testimonials(user_id: int, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     testimonials = db.query(Post).filter(
         Post.author_id == user_id,
         Post.post_type == "testimonial"
@@ -342,6 +348,7 @@ async def upload_user_avatar(file: UploadFile = File(...), current_user: User =
         )
         db.add(profile_post)
         db.commit()
+        invalidate_principal(current_user.id)
 
         return {
             "message": "Avatar updated successfully",
@@ -395,6 +402,7 @@ async def upload_user_cover_photo(file: UploadFile = File(...), current_user: Us
         )
         db.add(cover_post)
         db.commit()
+        invalidate_principal(current_user.id)
 
         return {
             "message": "Cover photo updated successfully",
@@ -1,7 +1,7 @@
 """
 Schemas/DTOs da aplicação
 """
-from .auth import LoginRequest, Token, PasswordUpdate
+from .auth import LoginRequest, Token, RefreshRequest, PasswordUpdate
 from .user import (
     UserBase, UserCreate, UserResponse, UserProfileUpdate,
     PrivacySettings, NotificationSettings
@@ -22,7 +22,7 @@ from .misc import (
 
 __all__ = [
     # Auth
-    "LoginRequest", "Token", "PasswordUpdate",
+    "LoginRequest", "Token", "RefreshRequest", "PasswordUpdate",
     # User
     "UserBase", "UserCreate", "UserResponse", "UserProfileUpdate",
     "PrivacySettings", "NotificationSettings",
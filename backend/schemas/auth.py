@@ -2,6 +2,7 @@
 Schemas de autenticação
 """
 from pydantic import BaseModel
+from typing import Optional
 
 class LoginRequest(BaseModel):
     email: str
@@ -10,6 +11,11 @@ class LoginRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Segundos de validade do access token
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class PasswordUpdate(BaseModel):
     current_password: str
@@ -97,6 +97,10 @@ async def save_cover_photo(file: UploadFile, user_id: int) -> str:
 
     return f"/{UPLOAD_DIR}/image/{unique_filename}"
 
+def media_path_from_url(media_url: str) -> Path:
+    """Convert a stored media URL (/uploads/...) back to its path on disk"""
+    return Path(media_url.lstrip("/"))
+
 def ensure_upload_directories():
     """Ensure all upload directories exist"""
     directories = [
@@ -0,0 +1,217 @@
+"""
+Retenção e compactação periódica de notificações
+
+delete_notification e clear_all_notifications apenas marcam is_deleted; este
+job apaga de fato, em lotes curtos por chave primária (um commit por lote):
+
+1. notificações marcadas como apagadas;
+2. notificações lidas mais antigas que NOTIFICATION_RETENTION_READ_DAYS;
+3. o excedente de cada usuário além das NOTIFICATION_RETENTION_MAX_PER_USER
+   mais recentes em (updated_at, id), a ordem da listagem (descontando do
+   contador as não lidas removidas), verificando até
+   NOTIFICATION_RETENTION_MAX_USERS_PER_RUN usuários por execução.
+
+As etapas 1 e 2 usam os índices ix_notifications_deleted e
+ix_notifications_read_created. Com vários workers, só o que pega o lock
+NOTIFICATION_RETENTION_LOCK_FILE compacta.
+"""
+import asyncio
+import fcntl
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import tuple_
+
+from core.config import (
+    NOTIFICATION_RETENTION_INTERVAL_SECONDS, NOTIFICATION_RETENTION_READ_DAYS,
+    NOTIFICATION_RETENTION_MAX_PER_USER, NOTIFICATION_RETENTION_BATCH_SIZE,
+    NOTIFICATION_RETENTION_MAX_BATCHES, NOTIFICATION_RETENTION_MAX_USERS_PER_RUN,
+    NOTIFICATION_RETENTION_LOCK_FILE
+)
+from core.database import SessionLocal
+from models.notification import Notification
+from utils.notification_counters import adjust_unread_count
+
+class NotificationCompactor:
+    def __init__(self, read_days: int, max_per_user: int, batch_size: int, max_batches: int,
+                 max_users_per_run: int):
+        self.read_days = read_days
+        self.max_per_user = max_per_user
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.max_users_per_run = max_users_per_run
+        # Último destinatário verificado contra o limite
+        self._cap_cursor = 0
+        self._lock_fd: Optional[int] = None
+        self.last_run: Dict[str, Any] = {}
+        self.totals = {
+            'runs': 0,
+            'rows_reclaimed': 0,
+            'errors': 0,
+        }
+
+    def acquire_lock(self, lock_file: str) -> bool:
+        """Tornar este processo o único a compactar (mantém o lock até sair)"""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(lock_file, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def compact(self) -> Dict[str, Any]:
+        """Executar uma compactação completa (bloqueante, rodar fora do event loop)"""
+        started = time.time()
+        run = {
+            'started_at': datetime.utcnow().isoformat(),
+            'batches': 0,
+            'deleted_purged': 0,
+            'read_expired_purged': 0,
+            'over_cap_purged': 0,
+            'users_capped': 0,
+            'errors': 0,
+        }
+
+        cutoff = datetime.utcnow() - timedelta(days=self.read_days)
+        steps = [
+            ('deleted_purged', Notification.is_deleted == True),
+            ('read_expired_purged', (Notification.is_read == True) & (Notification.created_at < cutoff)),
+        ]
+        for key, condition in steps:
+            try:
+                self._purge(condition, key, run)
+            except Exception as e:
+                run['errors'] += 1
+                print(f"❌ Erro na compactação de notificações ({key}): {e}")
+
+        try:
+            self._enforce_cap(run)
+        except Exception as e:
+            run['errors'] += 1
+            print(f"❌ Erro ao limitar notificações por usuário: {e}")
+
+        run['rows_reclaimed'] = run['deleted_purged'] + run['read_expired_purged'] + run['over_cap_purged']
+        run['duration_ms'] = round((time.time() - started) * 1000, 2)
+        self.last_run = run
+        self.totals['runs'] += 1
+        self.totals['rows_reclaimed'] += run['rows_reclaimed']
+        self.totals['errors'] += run['errors']
+        return run
+
+    def _purge(self, condition, key: str, run: Dict[str, Any]):
+        """Apagar em lotes de batch_size ids, um commit por lote"""
+        for _ in range(self.max_batches):
+            db = SessionLocal()
+            try:
+                ids = [row.id for row in db.query(Notification.id).filter(condition).limit(self.batch_size)]
+                if ids:
+                    db.query(Notification).filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+                    db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            if not ids:
+                break
+            run['batches'] += 1
+            run[key] += len(ids)
+            if len(ids) < self.batch_size:
+                break
+
+    def _enforce_cap(self, run: Dict[str, Any]):
+        """Verificar até max_users_per_run destinatários, retomando de onde a execução anterior parou
+
+        Os destinatários vêm de uma varredura por índice a partir de
+        _cap_cursor (nada de GROUP BY na tabela inteira); para cada um, a
+        fronteira é a N-ésima mais recente em (updated_at, id), a mesma ordem
+        da listagem, lida em ix_notifications_recipient_recent.
+        """
+        db = SessionLocal()
+        try:
+            recipients = [
+                row.recipient_id for row in db.query(Notification.recipient_id).filter(
+                    Notification.recipient_id > self._cap_cursor
+                ).distinct().order_by(Notification.recipient_id).limit(self.max_users_per_run)
+            ]
+        finally:
+            db.close()
+        # Fim da tabela: a próxima execução recomeça do início
+        self._cap_cursor = recipients[-1] if len(recipients) == self.max_users_per_run else 0
+
+        batches = 0
+        for recipient_id in recipients:
+            db = SessionLocal()
+            try:
+                # Mais antiga das N que ficam; tudo antes dela sai
+                boundary = db.query(Notification.updated_at, Notification.id).filter(
+                    Notification.recipient_id == recipient_id,
+                    Notification.is_deleted == False
+                ).order_by(
+                    Notification.updated_at.desc(), Notification.id.desc()
+                ).offset(self.max_per_user - 1).limit(1).first()
+                if not boundary:
+                    continue
+
+                while batches < self.max_batches:
+                    ids = [row.id for row in db.query(Notification.id).filter(
+                        Notification.recipient_id == recipient_id,
+                        Notification.is_deleted == False,
+                        tuple_(Notification.updated_at, Notification.id) < tuple_(*boundary)
+                    ).limit(self.batch_size)]
+                    if not ids:
+                        break
+
+                    # O contador só desconta as não lidas que este DELETE removeu de fato
+                    unread = db.query(Notification).filter(
+                        Notification.id.in_(ids),
+                        Notification.is_read == False,
+                        Notification.is_deleted == False
+                    ).delete(synchronize_session=False)
+                    purged = unread + db.query(Notification).filter(
+                        Notification.id.in_(ids)
+                    ).delete(synchronize_session=False)
+                    if unread:
+                        adjust_unread_count(db, recipient_id, -unread)
+                    db.commit()
+
+                    batches += 1
+                    run['batches'] += 1
+                    run['over_cap_purged'] += purged
+                    if len(ids) < self.batch_size:
+                        break
+                run['users_capped'] += 1
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            if batches >= self.max_batches:
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.totals, 'is_leader': self._lock_fd is not None, 'last_run': self.last_run}
+
+# Instância global da compactação
+notification_compactor = NotificationCompactor(
+    NOTIFICATION_RETENTION_READ_DAYS, NOTIFICATION_RETENTION_MAX_PER_USER,
+    NOTIFICATION_RETENTION_BATCH_SIZE, NOTIFICATION_RETENTION_MAX_BATCHES,
+    NOTIFICATION_RETENTION_MAX_USERS_PER_RUN
+)
+
+async def notification_compactor_task():
+    """Task para compactação periódica de notificações"""
+    while True:
+        if notification_compactor.acquire_lock(NOTIFICATION_RETENTION_LOCK_FILE):
+            await asyncio.to_thread(notification_compactor.compact)
+        await asyncio.sleep(NOTIFICATION_RETENTION_INTERVAL_SECONDS)
+
+def start_notification_compactor():
+    asyncio.create_task(notification_compactor_task())
@@ -0,0 +1,92 @@
+"""
+Contador de notificações não lidas por usuário
+
+Mantido na tabela notification_counters: incrementado ao criar uma
+notificação e decrementado ao ler, clicar ou apagar, sempre na mesma
+transação da mudança. O valor é enviado pelo WebSocket a cada alteração,
+então os clientes não precisam consultar /notifications/count em polling.
+"""
+import asyncio
+from typing import Dict
+
+from sqlalchemy import case, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from models.notification import Notification, NotificationCounter
+from core.websockets import manager
+
+def adjust_unread_count(db: Session, user_id: int, delta: int):
+    """Somar delta ao contador (sem commit; nunca fica negativo).
+
+    Se o contador ainda não existe nada é feito: ele será semeado com o
+    COUNT real na próxima leitura, que já inclui esta mudança.
+    """
+    new_value = NotificationCounter.unread_count + delta
+    db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread_count=case((new_value < 0, 0), else_=new_value))
+    )
+
+def reset_unread_count(db: Session, user_id: int):
+    """Zerar o contador (sem commit)"""
+    db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread_count=0)
+    )
+
+def get_unread_count(db: Session, user_id: int) -> int:
+    """Ler o contador, semeando-o com um COUNT na primeira vez
+
+    A semente é um único INSERT ... SELECT COUNT(*) com leitura travada
+    (LOCK IN SHARE MODE): notificações do usuário ainda não confirmadas fazem
+    a contagem esperar, e as novas esperam a semente. Assim nenhum
+    incremento cai entre o COUNT e o INSERT (o UPDATE de adjust_unread_count
+    não faz nada enquanto a linha não existe).
+    """
+    unread_count = db.query(NotificationCounter.unread_count).filter(
+        NotificationCounter.user_id == user_id
+    ).scalar()
+    if unread_count is not None:
+        return unread_count
+
+    seed = select(literal(user_id), func.count(Notification.id)).where(
+        Notification.recipient_id == user_id,
+        Notification.is_read == False,
+        Notification.is_deleted == False
+    ).with_for_update(read=True)
+    db.execute(
+        insert(NotificationCounter)
+        .from_select(["user_id", "unread_count"], seed)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    # Se outra requisição semeou antes, vale o valor dela
+    unread_count = db.query(NotificationCounter.unread_count).filter(
+        NotificationCounter.user_id == user_id
+    ).scalar()
+    db.commit()
+    return unread_count
+
+async def _send_unread_count(user_id: int, unread_count: int):
+    try:
+        await manager.send_personal_message(
+            message={"type": "unread_count", "data": {"unread_count": unread_count}},
+            user_id=user_id
+        )
+    except Exception as e:
+        print(f"❌ Erro ao enviar contador de não lidas para {user_id}: {e}")
+
+def push_unread_count(db: Session, user_id: int):
+    """Enviar o valor atual do contador pelo WebSocket (após o commit)"""
+    if not manager.may_be_connected(user_id):
+        return
+    unread_count = get_unread_count(db, user_id)
+    asyncio.get_running_loop().create_task(_send_unread_count(user_id, unread_count))
+
+def send_unread_counts(unread_counts: Dict[int, int]):
+    """Enviar contadores já lidos do banco (no event loop, sem consultas)"""
+    loop = asyncio.get_running_loop()
+    for user_id, unread_count in unread_counts.items():
+        loop.create_task(_send_unread_count(user_id, unread_count))
@@ -0,0 +1,444 @@
+"""
+Dispatcher assíncrono do outbox de notificações
+
+As rotas apenas gravam o evento em notification_outbox (create_notification),
+na mesma transação da mudança que o gerou, e o dispatcher é acordado pela
+fila em memória quando essa transação é confirmada. O dispatcher reivindica os
+eventos em lote, carrega os remetentes numa única consulta, agrupa eventos
+(ver notification_grouping), insere as notificações novas num INSERT
+multi-linha e atualiza os contadores de não lidas numa thread; de volta ao
+event loop, só envia os frames pelo WebSocket. Falhas voltam para o outbox com backoff exponencial; a
+tabela também é varrida periodicamente, o que recupera eventos de outros
+processos ou de um reinício.
+"""
+import asyncio
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event as sa_event, insert
+from sqlalchemy.orm import Session, load_only
+
+from core.config import (
+    NOTIFICATION_GROUP_WINDOW_MINUTES, NOTIFICATION_GROUP_MAX_ACTORS, NOTIFICATION_PUSH_WINDOW_SECONDS,
+    NOTIFICATION_OUTBOX_BATCH_SIZE, NOTIFICATION_OUTBOX_LINGER_MS, NOTIFICATION_OUTBOX_POLL_SECONDS,
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+)
+from core.database import SessionLocal
+from models import User, USER_CARD_COLUMNS, Notification, NotificationType, NotificationOutbox
+from utils.notification_counters import adjust_unread_count, get_unread_count, send_unread_counts
+from utils.notification_grouping import get_group_key, merge_actor, render_group_message, PushThrottle
+from core.websockets import manager
+
+# Eventos "processing" mais antigos que isso pertencem a um worker que caiu
+STALE_CLAIM_MINUTES = 5
+
+# Ids do outbox gravados na transação corrente da sessão, à espera do commit
+_PENDING_OUTBOX_KEY = "notification_outbox_ids"
+
+def sender_to_dict(sender: Optional[User]) -> Optional[dict]:
+    """Dados resumidos do remetente de uma notificação"""
+    if not sender:
+        return None
+    return {
+        "id": sender.id,
+        "first_name": sender.first_name,
+        "last_name": sender.last_name,
+        "username": sender.username,
+        "avatar": sender.avatar
+    }
+
+def notification_to_dict(notification: Notification, sender: Optional[User] = None) -> dict:
+    """Formato de notificação usado pela API e pelo WebSocket"""
+    return {
+        "id": notification.id,
+        "type": notification.notification_type.value,
+        "title": notification.title,
+        "message": notification.message,
+        "is_read": notification.is_read,
+        "is_clicked": notification.is_clicked,
+        "created_at": notification.created_at.isoformat(),
+        "updated_at": notification.updated_at.isoformat() if notification.updated_at else None,
+        "read_at": notification.read_at.isoformat() if notification.read_at else None,
+        "actor_count": notification.actor_count or 1,
+        "actor_ids": json.loads(notification.actor_ids) if notification.actor_ids else [],
+        "sender": sender_to_dict(sender),
+        "data": json.loads(notification.data) if notification.data else {}
+    }
+
+def render_message(template: str, sender: Optional[User]) -> str:
+    """Substituir {actor} pelo nome do remetente"""
+    name = f"{sender.first_name} {sender.last_name}" if sender else "Alguém"
+    return template.replace("{actor}", name)
+
+async def _push_notification(recipient_id: int, payload: dict):
+    try:
+        await manager.send_personal_message(
+            message={"type": "notification", "data": payload},
+            user_id=recipient_id
+        )
+    except Exception as e:
+        print(f"❌ Erro ao enviar notificação {payload.get('id')}: {e}")
+
+class NotificationDispatcher:
+    def __init__(self):
+        self.batch_size = NOTIFICATION_OUTBOX_BATCH_SIZE
+        self.linger = NOTIFICATION_OUTBOX_LINGER_MS / 1000
+        self.poll_interval = NOTIFICATION_OUTBOX_POLL_SECONDS
+        self.max_attempts = NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+        self._queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Um push por janela para cada notificação, mesmo com centenas de eventos agrupados
+        self.push_throttle = PushThrottle(NOTIFICATION_PUSH_WINDOW_SECONDS, _push_notification)
+        self.stats = {
+            'enqueued': 0,
+            'suppressed': 0,
+            'dispatched': 0,
+            'notifications_created': 0,
+            'notifications_grouped': 0,
+            'batches': 0,
+            'retries': 0,
+            'failed': 0,
+        }
+
+    # Produtor (rotas)
+
+    def enqueue(self, db: Session, event: dict) -> int:
+        """Gravar o evento no outbox sem commit
+
+        O commit é da rota, junto com a mudança que gerou o evento; o
+        dispatcher só é acordado depois dele (ver _wake_after_commit). Um
+        rollback descarta o evento junto com a mudança.
+        """
+        outbox = NotificationOutbox(payload=json.dumps(event), status="pending")
+        db.add(outbox)
+        db.flush()
+        self.stats['enqueued'] += 1
+        db.info.setdefault(_PENDING_OUTBOX_KEY, []).append(outbox.id)
+        return outbox.id
+
+    def wake(self, outbox_ids: List[int]):
+        """Pôr os ids na fila; o commit pode ter acontecido fora do event loop"""
+        if self._loop is None:
+            for outbox_id in outbox_ids:
+                self._queue.put_nowait(outbox_id)
+            return
+        for outbox_id in outbox_ids:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, outbox_id)
+
+    # Consumidor
+
+    async def run(self):
+        """Loop do dispatcher: lotes da fila em memória e varredura periódica do outbox"""
+        loop = self._loop = asyncio.get_running_loop()
+        last_sweep = 0.0
+        while True:
+            ids: Optional[List[int]] = None
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.poll_interval)
+                await asyncio.sleep(self.linger)
+                ids = [first]
+                while len(ids) < self.batch_size and not self._queue.empty():
+                    ids.append(self._queue.get_nowait())
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                if ids:
+                    await self.dispatch(ids)
+                if ids is None or loop.time() - last_sweep >= self.poll_interval:
+                    last_sweep = loop.time()
+                    await self.dispatch(None)
+            except Exception as e:
+                print(f"❌ Erro no dispatcher de notificações: {e}")
+
+    async def drain(self):
+        """Processar tudo o que estiver pendente (usado no shutdown)"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        while await self.dispatch(None):
+            pass
+
+    async def dispatch(self, ids: Optional[List[int]]) -> int:
+        """Reivindicar e processar um lote; ids=None pega qualquer evento vencido"""
+        events = await asyncio.to_thread(self._claim, ids)
+        if not events:
+            return 0
+
+        try:
+            pushes, unread_counts = await asyncio.to_thread(self._process, events)
+        except Exception as e:
+            print(f"⚠️ Lote de notificações falhou ({e}); processando eventos individualmente")
+            pushes, unread_counts = [], {}
+            for event in events:
+                try:
+                    event_pushes, event_counts = await asyncio.to_thread(self._process, [event])
+                    pushes.extend(event_pushes)
+                    unread_counts.update(event_counts)
+                except Exception as event_error:
+                    await asyncio.to_thread(self._release, event, str(event_error))
+
+        self._fan_out(pushes, unread_counts)
+        return len(events)
+
+    def _claim(self, ids: Optional[List[int]]) -> List[Tuple[int, dict, int]]:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            if ids is None:
+                # Eventos presos por um worker que caiu voltam para a fila contando
+                # como tentativa: um evento que derruba o worker acaba como falho
+                stale = db.query(NotificationOutbox).filter(
+                    NotificationOutbox.status == "processing",
+                    NotificationOutbox.claimed_at < now - timedelta(minutes=STALE_CLAIM_MINUTES)
+                )
+                reclaimed = {
+                    "attempts": NotificationOutbox.attempts + 1,
+                    "claim_token": None,
+                    "last_error": "Reivindicação expirada (worker caiu durante o processamento)"
+                }
+                failed = stale.filter(NotificationOutbox.attempts + 1 >= self.max_attempts).update(
+                    {**reclaimed, "status": "failed"}, synchronize_session=False
+                )
+                retried = stale.filter(NotificationOutbox.attempts + 1 < self.max_attempts).update(
+                    {**reclaimed, "status": "pending"}, synchronize_session=False
+                )
+                self.stats['failed'] += failed
+                self.stats['retries'] += retried
+
+            query = db.query(NotificationOutbox.id).filter(
+                NotificationOutbox.status == "pending",
+                NotificationOutbox.available_at <= now
+            )
+            if ids is not None:
+                query = query.filter(NotificationOutbox.id.in_(ids))
+            candidate_ids = [row.id for row in query.order_by(NotificationOutbox.id).limit(self.batch_size)]
+            if not candidate_ids:
+                db.commit()
+                return []
+
+            # UPDATE condicional: só um worker consegue reivindicar cada evento
+            token = uuid.uuid4().hex
+            db.query(NotificationOutbox).filter(
+                NotificationOutbox.id.in_(candidate_ids),
+                NotificationOutbox.status == "pending"
+            ).update(
+                {"status": "processing", "claim_token": token, "claimed_at": now},
+                synchronize_session=False
+            )
+            db.commit()
+
+            claimed = db.query(
+                NotificationOutbox.id, NotificationOutbox.payload, NotificationOutbox.attempts
+            ).filter(NotificationOutbox.claim_token == token).order_by(NotificationOutbox.id).all()
+            return [(row.id, json.loads(row.payload), row.attempts) for row in claimed]
+        finally:
+            db.close()
+
+    def _process(self, events: List[Tuple[int, dict, int]]) -> Tuple[List[tuple], Dict[int, int]]:
+        """Criar/agrupar as notificações de um lote numa única transação
+
+        Roda numa thread: devolve os frames a enviar e o contador de não lidas
+        já lido de cada destinatário conectado com notificação nova.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+
+            # Remetentes do lote inteiro numa única consulta
+            sender_ids = {payload["sender_id"] for _, payload, _ in events if payload.get("sender_id")}
+            senders: Dict[int, User] = {}
+            if sender_ids:
+                senders = {
+                    user.id: user for user in db.query(User).options(
+                        load_only(*USER_CARD_COLUMNS)
+                    ).filter(User.id.in_(sender_ids))
+                }
+
+            keyed = []
+            for outbox_id, payload, _ in events:
+                notification_type = NotificationType(payload["notification_type"])
+                group_key = None
+                if payload.get("sender_id"):
+                    group_key = get_group_key(
+                        notification_type, payload.get("post_id"), payload.get("story_id"), payload.get("comment_id")
+                    )
+                keyed.append((outbox_id, payload, notification_type, group_key))
+
+            # Linhas agrupadas ainda abertas para todas as chaves do lote
+            open_rows: Dict[Tuple[int, str], Notification] = {}
+            group_keys = {group_key for _, _, _, group_key in keyed if group_key}
+            if group_keys:
+                recipients = {payload["recipient_id"] for _, payload, _, group_key in keyed if group_key}
+                rows = db.query(Notification).filter(
+                    Notification.recipient_id.in_(recipients),
+                    Notification.group_key.in_(group_keys),
+                    Notification.is_read == False,
+                    Notification.is_deleted == False,
+                    Notification.updated_at >= now - timedelta(minutes=NOTIFICATION_GROUP_WINDOW_MINUTES)
+                ).order_by(Notification.id).all()
+                for row in rows:
+                    open_rows[(row.recipient_id, row.group_key)] = row
+
+            new_rows: List[dict] = []
+            new_by_key: Dict[Tuple[int, str], dict] = {}
+            touched: Dict[int, Notification] = {}
+
+            for outbox_id, payload, notification_type, group_key in keyed:
+                recipient_id = payload["recipient_id"]
+                sender_id = payload.get("sender_id")
+                sender = senders.get(sender_id)
+                message = render_message(payload["message"], sender)
+                data = json.dumps(payload["data"]) if payload.get("data") else None
+                key = (recipient_id, group_key)
+
+                target = None
+                if group_key:
+                    target = open_rows.get(key) or new_by_key.get(key)
+
+                if target is None:
+                    row = {
+                        "recipient_id": recipient_id,
+                        "sender_id": sender_id,
+                        "notification_type": notification_type,
+                        "title": payload["title"],
+                        "message": message,
+                        "post_id": payload.get("post_id"),
+                        "comment_id": payload.get("comment_id"),
+                        "story_id": payload.get("story_id"),
+                        "friendship_id": payload.get("friendship_id"),
+                        "data": data,
+                        "group_key": group_key,
+                        "actor_count": 1,
+                        "actor_ids": json.dumps([sender_id]) if sender_id else None,
+                        "outbox_id": outbox_id,
+                        "is_read": False,
+                        "is_clicked": False,
+                        "is_deleted": False,
+                        "created_at": now,
+                        "updated_at": now
+                    }
+                    new_rows.append(row)
+                    if group_key:
+                        new_by_key[key] = row
+                    continue
+
+                # Agrupar o evento na linha existente (ORM) ou na nova (dict)
+                is_orm = isinstance(target, Notification)
+                get = (lambda field: getattr(target, field)) if is_orm else target.get
+                actor_ids = json.loads(get("actor_ids")) if get("actor_ids") else []
+                actor_ids, is_new_actor = merge_actor(actor_ids, sender_id, NOTIFICATION_GROUP_MAX_ACTORS)
+                actor_count = (get("actor_count") or 1) + (1 if is_new_actor else 0)
+                changes = {
+                    "actor_count": actor_count,
+                    "actor_ids": json.dumps(actor_ids),
+                    "sender_id": sender_id,
+                    "title": payload["title"],
+                    "message": (
+                        render_group_message(notification_type, render_message("{actor}", sender), actor_count)
+                        if sender and actor_count > 1 else message
+                    ),
+                    "data": data,
+                    "updated_at": now
+                }
+                if is_orm:
+                    for field, value in changes.items():
+                        setattr(target, field, value)
+                    touched[target.id] = target
+                else:
+                    target.update(changes)
+                self.stats['notifications_grouped'] += 1
+
+            if new_rows:
+                # Um único INSERT multi-linha; os ids são recuperados pela coluna outbox_id
+                db.execute(insert(Notification).values(new_rows))
+                created = db.query(Notification).filter(
+                    Notification.outbox_id.in_([row["outbox_id"] for row in new_rows])
+                ).all()
+                for notification in created:
+                    touched[notification.id] = notification
+                    # Liberar o outbox_id: ids do outbox podem ser reutilizados depois
+                    notification.outbox_id = None
+                for recipient_id, count in Counter(row["recipient_id"] for row in new_rows).items():
+                    adjust_unread_count(db, recipient_id, count)
+
+            db.query(NotificationOutbox).filter(
+                NotificationOutbox.id.in_([outbox_id for outbox_id, _, _ in events])
+            ).delete(synchronize_session=False)
+
+            db.flush()
+            # Destinatários com push_notifications desativado só recebem o contador
+            silent = {payload["recipient_id"] for _, payload, _ in events if payload.get("push") is False}
+            pushes = [
+                (notification.id, notification.recipient_id, notification_to_dict(notification, senders.get(notification.sender_id)))
+                for notification in touched.values()
+                if notification.recipient_id not in silent
+            ]
+            db.commit()
+
+            unread_counts = {
+                recipient_id: get_unread_count(db, recipient_id)
+                for recipient_id in {row["recipient_id"] for row in new_rows}
+                if manager.may_be_connected(recipient_id)
+            }
+
+            self.stats['batches'] += 1
+            self.stats['dispatched'] += len(events)
+            self.stats['notifications_created'] += len(new_rows)
+            return pushes, unread_counts
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _release(self, event: Tuple[int, dict, int], error: str):
+        """Devolver um evento que falhou ao outbox com backoff, ou marcá-lo como falho"""
+        outbox_id, _, attempts = event
+        attempts += 1
+        failed = attempts >= self.max_attempts
+        db = SessionLocal()
+        try:
+            db.query(NotificationOutbox).filter(NotificationOutbox.id == outbox_id).update({
+                "status": "failed" if failed else "pending",
+                "attempts": attempts,
+                "available_at": datetime.utcnow() + timedelta(seconds=2 ** attempts),
+                "claim_token": None,
+                "last_error": error[:1000]
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.stats['failed' if failed else 'retries'] += 1
+        print(f"{'❌' if failed else '⚠️'} Evento de notificação {outbox_id} falhou (tentativa {attempts}): {error}")
+
+    def _fan_out(self, pushes: List[tuple], unread_counts: Dict[int, int]):
+        """Só envia: tudo o que toca o banco já foi feito em _process"""
+        for notification_id, recipient_id, payload in pushes:
+            self.push_throttle.submit(notification_id, recipient_id, payload)
+        send_unread_counts(unread_counts)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            **self.push_throttle.stats,
+            'queue_depth': self._queue.qsize()
+        }
+
+# Instância global do dispatcher
+notification_dispatcher = NotificationDispatcher()
+
+@sa_event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session):
+    outbox_ids = session.info.pop(_PENDING_OUTBOX_KEY, None)
+    if outbox_ids:
+        notification_dispatcher.wake(outbox_ids)
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_OUTBOX_KEY, None)
+
+def start_notification_dispatcher():
+    asyncio.create_task(notification_dispatcher.run())
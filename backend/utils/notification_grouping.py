@@ -0,0 +1,87 @@
+"""
+Agrupamento de notificações ("Ana e mais 12 pessoas reagiram ao seu post")
+
+Eventos do mesmo tipo, para o mesmo destinatário e o mesmo alvo (post, story,
+comentário) dentro de uma janela viram uma única linha com contador de atores
+e os ids dos últimos atores. O envio pelo WebSocket é limitado a um push por
+janela para cada notificação agrupada.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models.notification import NotificationType
+
+# Verbo no plural usado quando há mais de um ator
+GROUP_VERBS = {
+    NotificationType.POST_REACTION: "reagiram ao seu post",
+    NotificationType.POST_COMMENT: "comentaram no seu post",
+    NotificationType.POST_SHARE: "compartilharam seu post",
+    NotificationType.STORY_REACTION: "reagiram à sua story",
+    NotificationType.STORY_VIEW: "visualizaram sua story",
+    NotificationType.COMMENT_REACTION: "reagiram ao seu comentário",
+    NotificationType.COMMENT_REPLY: "responderam ao seu comentário",
+    NotificationType.NEW_FOLLOWER: "começaram a seguir você",
+}
+
+def get_group_key(
+    notification_type: NotificationType,
+    post_id: Optional[int] = None,
+    story_id: Optional[int] = None,
+    comment_id: Optional[int] = None
+) -> Optional[str]:
+    """Chave de agrupamento, ou None para tipos que nunca são agrupados"""
+    if notification_type not in GROUP_VERBS:
+        return None
+    if notification_type in (NotificationType.COMMENT_REACTION, NotificationType.COMMENT_REPLY):
+        return f"{notification_type.value}:comment:{comment_id}"
+    if story_id is not None:
+        return f"{notification_type.value}:story:{story_id}"
+    if post_id is not None:
+        return f"{notification_type.value}:post:{post_id}"
+    return notification_type.value
+
+def merge_actor(actor_ids: List[int], actor_id: Optional[int], max_actors: int) -> Tuple[List[int], bool]:
+    """Colocar o ator no topo da lista; retorna (lista, se é um ator novo)"""
+    is_new = actor_id not in actor_ids
+    merged = [actor_id] + [existing for existing in actor_ids if existing != actor_id]
+    return merged[:max_actors], is_new
+
+def render_group_message(
+    notification_type: NotificationType,
+    actor_name: str,
+    actor_count: int
+) -> str:
+    others = actor_count - 1
+    return f"{actor_name} e mais {others} {'pessoa' if others == 1 else 'pessoas'} {GROUP_VERBS[notification_type]}"
+
+class PushThrottle:
+    """Limita o envio de cada notificação a um push por janela.
+
+    O primeiro evento é enviado na hora; eventos seguintes dentro da janela
+    apenas guardam o estado mais recente, que sai num único push ao fim da
+    janela.
+    """
+
+    def __init__(self, window_seconds: float, push: Callable[[int, dict], Awaitable[None]]):
+        self.window_seconds = window_seconds
+        self._push = push
+        # notification_id -> payload mais recente recebido durante a janela
+        self._windows: Dict[int, Optional[dict]] = {}
+        self.stats = {'pushes_sent': 0, 'pushes_coalesced': 0}
+
+    def submit(self, notification_id: int, recipient_id: int, payload: dict):
+        if notification_id in self._windows:
+            self._windows[notification_id] = payload
+            self.stats['pushes_coalesced'] += 1
+            return
+
+        self._windows[notification_id] = None
+        self.stats['pushes_sent'] += 1
+        loop = asyncio.get_running_loop()
+        loop.create_task(self._push(recipient_id, payload))
+        loop.call_later(self.window_seconds, self._close_window, notification_id, recipient_id)
+
+    def _close_window(self, notification_id: int, recipient_id: int):
+        latest = self._windows.pop(notification_id, None)
+        if latest is not None:
+            self.submit(notification_id, recipient_id, latest)
@@ -3,11 +3,10 @@ Utility functions for creating notifications
 """
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
-import json
 
-from models import User, Notification, NotificationType
-from utils.websocket_manager import manager
+from models import NotificationType
+from utils.notification_dispatcher import notification_dispatcher, notification_to_dict, sender_to_dict
+from utils.notification_preferences import get_preference_mask, is_type_enabled, PREF_PUSH
 
 # Utility function to create notifications
 async def create_notification(
@@ -23,61 +22,36 @@ async def create_notification(
     friendship_id: Optional[int] = None,
     data: Optional[dict] = None
 ):
-    """Criar uma nova notificação e enviar via WebSocket"""
+    """Enfileirar uma notificação no outbox; o dispatcher cria/agrupa e envia.
+
+    {actor} na mensagem é substituído pelo nome do remetente no dispatcher,
+    que carrega todos os remetentes do lote numa única consulta. Não faz
+    commit: a rota confirma o evento junto com a mudança que o gerou.
+    """
     
     # Verificar se o recipient não é o sender (evitar auto-notificações)
     if sender_id and recipient_id == sender_id:
         return None
     
-    notification = Notification(
-        recipient_id=recipient_id,
-        sender_id=sender_id,
-        notification_type=notification_type,
-        title=title,
-        message=message,
-        post_id=post_id,
-        comment_id=comment_id,
-        story_id=story_id,
-        friendship_id=friendship_id,
-        data=json.dumps(data) if data else None
-    )
-    
-    db.add(notification)
-    db.commit()
-    db.refresh(notification)
-    
-    # Preparar dados para envio via WebSocket
-    sender_data = None
-    if notification.sender:
-        sender_data = {
-            "id": notification.sender.id,
-            "first_name": notification.sender.first_name,
-            "last_name": notification.sender.last_name,
-            "username": notification.sender.username,
-            "avatar": notification.sender.avatar
-        }
-    
-    notification_data = {
-        "id": notification.id,
-        "type": notification.notification_type.value,
-        "title": notification.title,
-        "message": notification.message,
-        "is_read": notification.is_read,
-        "created_at": notification.created_at.isoformat(),
-        "sender": sender_data,
-        "data": json.loads(notification.data) if notification.data else {}
-    }
-    
-    # Enviar notificação via WebSocket
-    await manager.send_personal_message(
-        message={
-            "type": "notification",
-            "data": notification_data
-        },
-        user_id=recipient_id
-    )
+    # Categoria desativada pelo destinatário: nada é gravado nem enviado
+    mask = get_preference_mask(db, recipient_id)
+    if not is_type_enabled(mask, notification_type):
+        notification_dispatcher.stats['suppressed'] += 1
+        return None
     
-    return notification
+    return notification_dispatcher.enqueue(db, {
+        "recipient_id": recipient_id,
+        "sender_id": sender_id,
+        "notification_type": notification_type.value,
+        "title": title,
+        "message": message,
+        "post_id": post_id,
+        "comment_id": comment_id,
+        "story_id": story_id,
+        "friendship_id": friendship_id,
+        "data": data,
+        "push": bool(mask & PREF_PUSH)
+    })
 
 # Friend request notifications
 async def create_friend_request_notification(
@@ -87,17 +61,13 @@ async def create_friend_request_notification(
     friendship_id: int
 ):
     """Criar notificação de solicitação de amizade"""
-    requester = db.query(User).filter(User.id == requester_id).first()
-    if not requester:
-        return
-    
     await create_notification(
         db=db,
         recipient_id=addressee_id,
         sender_id=requester_id,
         notification_type=NotificationType.FRIEND_REQUEST,
         title="Nova solicitação de amizade",
-        message=f"{requester.first_name} {requester.last_name} enviou uma solicitação de amizade",
+        message="{actor} enviou uma solicitação de amizade",
         friendship_id=friendship_id,
         data={"action_url": "/friends"}
     )
@@ -109,17 +79,13 @@ async def create_friend_request_accepted_notification(
     friendship_id: int
 ):
     """Criar notificação de solicitação aceita"""
-    addressee = db.query(User).filter(User.id == addressee_id).first()
-    if not addressee:
-        return
-    
     await create_notification(
         db=db,
         recipient_id=requester_id,
         sender_id=addressee_id,
         notification_type=NotificationType.FRIEND_REQUEST_ACCEPTED,
         title="Solicitação de amizade aceita",
-        message=f"{addressee.first_name} {addressee.last_name} aceitou sua solicitação de amizade",
+        message="{actor} aceitou sua solicitação de amizade",
         friendship_id=friendship_id,
         data={"action_url": f"/profile/{addressee_id}"}
     )
@@ -133,10 +99,6 @@ async def create_post_reaction_notification(
     reaction_type: str
 ):
     """Criar notificação de reação em post"""
-    reactor = db.query(User).filter(User.id == reactor_id).first()
-    if not reactor:
-        return
-    
     reaction_messages = {
         "like": "curtiu seu post",
         "love": "amou seu post",
@@ -154,7 +116,7 @@ async def create_post_reaction_notification(
         sender_id=reactor_id,
         notification_type=NotificationType.POST_REACTION,
         title="Nova reação no seu post",
-        message=f"{reactor.first_name} {reactor.last_name} {message}",
+        message=f"{{actor}} {message}",
         post_id=post_id,
         data={"action_url": f"/post/{post_id}", "reaction_type": reaction_type}
     )
@@ -167,17 +129,13 @@ async def create_post_comment_notification(
     comment_id: int
 ):
     """Criar notificação de comentário em post"""
-    commenter = db.query(User).filter(User.id == commenter_id).first()
-    if not commenter:
-        return
-    
     await create_notification(
         db=db,
         recipient_id=post_author_id,
         sender_id=commenter_id,
         notification_type=NotificationType.POST_COMMENT,
         title="Novo comentário no seu post",
-        message=f"{commenter.first_name} {commenter.last_name} comentou no seu post",
+        message="{actor} comentou no seu post",
         post_id=post_id,
         comment_id=comment_id,
         data={"action_url": f"/post/{post_id}"}
@@ -189,16 +147,12 @@ async def create_follow_notification(
     followed_id: int
 ):
     """Criar notificação de novo seguidor"""
-    follower = db.query(User).filter(User.id == follower_id).first()
-    if not follower:
-        return
-    
     await create_notification(
         db=db,
         recipient_id=followed_id,
         sender_id=follower_id,
         notification_type=NotificationType.NEW_FOLLOWER,
         title="Novo seguidor",
-        message=f"{follower.first_name} {follower.last_name} começou a seguir você",
+        message="{actor} começou a seguir você",
         data={"action_url": f"/profile/{follower_id}"}
     )
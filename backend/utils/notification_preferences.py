@@ -0,0 +1,85 @@
+"""
+Preferências de notificação por usuário em cache (bitmask)
+
+As colunas *_notifications do usuário viram um inteiro com um bit por
+categoria, guardado em cache. create_notification consulta a máscara antes
+de gravar qualquer coisa, então categorias desativadas não custam nem o
+INSERT no outbox. As rotas de configurações invalidam a entrada ao mudar os
+flags; a invalidação vai pelo broker de WebSockets para todos os workers.
+Se o hub estiver fora do ar ela só vale neste processo, e os outros ficam com
+a máscara antiga até NOTIFICATION_PREFERENCES_CACHE_SECONDS.
+"""
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import NOTIFICATION_PREFERENCES_CACHE_SECONDS
+from core.websockets import manager
+from models import User, NotificationType
+
+PREF_EMAIL = 1 << 0
+PREF_PUSH = 1 << 1
+PREF_FRIEND_REQUESTS = 1 << 2
+PREF_COMMENTS = 1 << 3
+PREF_REACTIONS = 1 << 4
+PREF_MESSAGES = 1 << 5
+PREF_STORIES = 1 << 6
+
+# Coluna de User -> bit da máscara
+PREFERENCE_FLAGS: Dict[str, int] = {
+    "email_notifications": PREF_EMAIL,
+    "push_notifications": PREF_PUSH,
+    "friend_request_notifications": PREF_FRIEND_REQUESTS,
+    "comment_notifications": PREF_COMMENTS,
+    "reaction_notifications": PREF_REACTIONS,
+    "message_notifications": PREF_MESSAGES,
+    "story_notifications": PREF_STORIES,
+}
+
+# Tipos fora deste mapa (seguidores, sistema, etc.) são sempre entregues
+TYPE_PREFERENCES: Dict[NotificationType, int] = {
+    NotificationType.FRIEND_REQUEST: PREF_FRIEND_REQUESTS,
+    NotificationType.FRIEND_REQUEST_ACCEPTED: PREF_FRIEND_REQUESTS,
+    NotificationType.FRIEND_REQUEST_REJECTED: PREF_FRIEND_REQUESTS,
+    NotificationType.POST_COMMENT: PREF_COMMENTS,
+    NotificationType.COMMENT_REPLY: PREF_COMMENTS,
+    NotificationType.POST_REACTION: PREF_REACTIONS,
+    NotificationType.COMMENT_REACTION: PREF_REACTIONS,
+    NotificationType.STORY_REACTION: PREF_STORIES,
+    NotificationType.STORY_VIEW: PREF_STORIES,
+}
+
+preferences_cache = TTLCache(ttl_seconds=NOTIFICATION_PREFERENCES_CACHE_SECONDS)
+
+def preference_mask(values: Dict[str, bool]) -> int:
+    """Montar a máscara a partir dos flags (NULL conta como ativado)"""
+    mask = 0
+    for column, bit in PREFERENCE_FLAGS.items():
+        if values.get(column) is not False:
+            mask |= bit
+    return mask
+
+def get_preference_mask(db: Session, user_id: int) -> int:
+    """Máscara de preferências do usuário (0 se ele não existe)"""
+    mask = preferences_cache.get(user_id)
+    if mask is not None:
+        return mask
+
+    row = db.query(
+        *[getattr(User, column) for column in PREFERENCE_FLAGS]
+    ).filter(User.id == user_id).first()
+    mask = preference_mask(row._asdict()) if row else 0
+    preferences_cache.set(user_id, mask)
+    return mask
+
+def invalidate_preferences(user_id: int):
+    # Local na hora; os outros workers recebem pelo broker
+    preferences_cache.invalidate(user_id)
+    manager.publish_control("notification_preferences", user_id)
+
+manager.on_control("notification_preferences", preferences_cache.invalidate)
+
+def is_type_enabled(mask: int, notification_type: NotificationType) -> bool:
+    bit = TYPE_PREFERENCES.get(notification_type)
+    return bit is None or bool(mask & bit)
@@ -0,0 +1,41 @@
+"""
+Cursor (keyset) pagination helpers
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last item of a page into an opaque cursor"""
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """Decode a cursor produced by encode_cursor, validating its arity"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(payload, list) or len(payload) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    values = []
+    for value in payload:
+        if isinstance(value, dict) and "dt" in value:
+            try:
+                value = datetime.fromisoformat(value["dt"])
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        values.append(value)
+    return values
@@ -0,0 +1,216 @@
+"""
+Varredura periódica de stories expiradas
+
+Em lotes limitados, arquiva (ou apaga) as stories cujo expires_at já passou,
+remove visualizações, tags e overlays e recupera a mídia em uploads/stories,
+movendo-a para o diretório de arquivo ou apagando-a.
+
+No modo archive a mídia é movida antes do commit: uma story cujo arquivo não
+pôde ser movido continua não arquivada e volta na próxima execução. Se o
+processo cair entre o move e o commit, o arquivo já no diretório de arquivo é
+reconhecido na execução seguinte.
+
+Com vários workers, só o que pega o lock STORY_SWEEP_LOCK_FILE varre; os
+outros tentam de novo a cada intervalo e assumem se ele cair.
+"""
+import asyncio
+import fcntl
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from core.config import (
+    STORY_SWEEP_INTERVAL_SECONDS, STORY_SWEEP_BATCH_SIZE, STORY_SWEEP_MAX_BATCHES,
+    STORY_SWEEP_MODE, STORY_ARCHIVE_DIR, STORY_SWEEP_LOCK_FILE
+)
+from core.database import SessionLocal
+from models.story import Story, StoryView, StoryTag, StoryOverlay
+from utils.files import media_path_from_url
+
+class StorySweeper:
+    def __init__(self, mode: str, batch_size: int, max_batches: int, archive_dir: str):
+        if mode not in ("archive", "delete"):
+            raise ValueError(f"STORY_SWEEP_MODE inválido: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.archive_dir = Path(archive_dir)
+        self._lock_fd: Optional[int] = None
+        self.last_run: Dict[str, Any] = {}
+        self.totals = {
+            'runs': 0,
+            'stories_swept': 0,
+            'rows_purged': 0,
+            'files_reclaimed': 0,
+            'move_failures': 0,
+            'errors': 0,
+        }
+
+    def acquire_lock(self, lock_file: str) -> bool:
+        """Tornar este processo o único a varrer (mantém o lock até sair)"""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(lock_file, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def sweep(self) -> Dict[str, Any]:
+        """Executar uma varredura completa (bloqueante, rodar fora do event loop)"""
+        started = time.time()
+        run = {
+            'started_at': datetime.utcnow().isoformat(),
+            'mode': self.mode,
+            'batches': 0,
+            'stories_swept': 0,
+            'views_purged': 0,
+            'tags_purged': 0,
+            'overlays_purged': 0,
+            'files_moved': 0,
+            'files_deleted': 0,
+            'files_missing': 0,
+            'move_failures': 0,
+            'errors': 0,
+        }
+
+        # Stories cuja mídia não pôde ser movida ficam para a próxima execução
+        skipped: Set[int] = set()
+        for _ in range(self.max_batches):
+            try:
+                swept = self._sweep_batch(run, skipped)
+            except Exception as e:
+                run['errors'] += 1
+                print(f"❌ Erro na varredura de stories expiradas: {e}")
+                break
+            run['batches'] += 1
+            if swept < self.batch_size:
+                break
+
+        run['duration_ms'] = round((time.time() - started) * 1000, 2)
+        self.last_run = run
+        self.totals['runs'] += 1
+        self.totals['stories_swept'] += run['stories_swept']
+        self.totals['rows_purged'] += run['views_purged'] + run['tags_purged'] + run['overlays_purged']
+        self.totals['files_reclaimed'] += run['files_moved'] + run['files_deleted']
+        self.totals['move_failures'] += run['move_failures']
+        self.totals['errors'] += run['errors']
+        return run
+
+    def _sweep_batch(self, run: Dict[str, Any], skipped: Set[int]) -> int:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            query = db.query(Story.id, Story.media_url).filter(
+                Story.archived == False,
+                Story.expires_at <= now
+            )
+            if skipped:
+                query = query.filter(Story.id.notin_(skipped))
+            stories = query.order_by(Story.expires_at).limit(self.batch_size).all()
+            if not stories:
+                return 0
+
+            archived_urls: Dict[int, str] = {}
+            if self.mode == "archive":
+                # Mídia primeiro: se o move falhar a story não é arquivada agora
+                for story in stories:
+                    if not story.media_url:
+                        continue
+                    moved, archived_url = self._archive_media(story.media_url, run)
+                    if not moved:
+                        skipped.add(story.id)
+                    elif archived_url:
+                        archived_urls[story.id] = archived_url
+
+            ids = [story.id for story in stories if story.id not in skipped]
+            if not ids:
+                return len(stories)
+            run['views_purged'] += db.query(StoryView).filter(StoryView.story_id.in_(ids)).delete(synchronize_session=False)
+            run['tags_purged'] += db.query(StoryTag).filter(StoryTag.story_id.in_(ids)).delete(synchronize_session=False)
+            run['overlays_purged'] += db.query(StoryOverlay).filter(StoryOverlay.story_id.in_(ids)).delete(synchronize_session=False)
+
+            if self.mode == "delete":
+                db.query(Story).filter(Story.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                for story in stories:
+                    if story.media_url:
+                        self._delete_media(story.media_url, run)
+            else:
+                db.query(Story).filter(Story.id.in_(ids)).update(
+                    {"archived": True, "archived_at": now},
+                    synchronize_session=False
+                )
+                # A URL passa a apontar para o arquivo, no mesmo commit
+                for story_id, archived_url in archived_urls.items():
+                    db.query(Story).filter(Story.id == story_id).update(
+                        {"media_url": archived_url},
+                        synchronize_session=False
+                    )
+                db.commit()
+
+            run['stories_swept'] += len(ids)
+            return len(stories)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _archive_media(self, media_url: str, run: Dict[str, Any]):
+        """Mover a mídia para o arquivo; retorna (pode arquivar, URL nova ou None)"""
+        source = media_path_from_url(media_url)
+        target = self.archive_dir / source.name
+        archived_url = f"/{target.as_posix()}"
+        if not source.exists():
+            if target.exists():
+                # Movida por uma execução que caiu antes do commit
+                return True, archived_url
+            run['files_missing'] += 1
+            return True, None
+        try:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(source), str(target))
+        except OSError as e:
+            run['move_failures'] += 1
+            print(f"⚠️ Não foi possível arquivar {source}: {e}")
+            return False, None
+        run['files_moved'] += 1
+        return True, archived_url
+
+    def _delete_media(self, media_url: str, run: Dict[str, Any]):
+        path = media_path_from_url(media_url)
+        if not path.exists():
+            run['files_missing'] += 1
+            return
+        try:
+            path.unlink()
+        except OSError as e:
+            run['errors'] += 1
+            print(f"⚠️ Não foi possível apagar {path}: {e}")
+            return
+        run['files_deleted'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.totals, 'is_leader': self._lock_fd is not None, 'last_run': self.last_run}
+
+# Instância global da varredura
+story_sweeper = StorySweeper(
+    STORY_SWEEP_MODE, STORY_SWEEP_BATCH_SIZE, STORY_SWEEP_MAX_BATCHES, STORY_ARCHIVE_DIR
+)
+
+async def story_sweeper_task():
+    """Task para varredura periódica de stories expiradas"""
+    while True:
+        if story_sweeper.acquire_lock(STORY_SWEEP_LOCK_FILE):
+            await asyncio.to_thread(story_sweeper.sweep)
+        await asyncio.sleep(STORY_SWEEP_INTERVAL_SECONDS)
+
+def start_story_sweeper():
+    asyncio.create_task(story_sweeper_task())
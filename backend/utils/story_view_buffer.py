@@ -0,0 +1,146 @@
+"""
+Buffer write-behind para visualizações de stories
+
+As visualizações entram em memória (deduplicadas por story/viewer) e são
+gravadas em lote a cada poucas centenas de milissegundos: um INSERT IGNORE
+multi-linha por story e um único `views_count = views_count + n`, em vez de
+SELECT + INSERT + read-modify-write do contador a cada requisição.
+
+O lote em gravação continua visível para is_pending até o fim do flush. Um
+lote que falha volta para o buffer, mas cada visualização tem no máximo
+STORY_VIEW_MAX_ATTEMPTS tentativas e o buffer no máximo
+STORY_VIEW_MAX_BUFFERED entradas; o excedente é descartado e contado.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Tuple
+
+from sqlalchemy import func, insert, update
+
+from core.config import (
+    STORY_VIEW_FLUSH_INTERVAL_MS, STORY_VIEW_MAX_PENDING, STORY_VIEW_MAX_BUFFERED, STORY_VIEW_MAX_ATTEMPTS
+)
+from core.database import SessionLocal
+from models.story import Story, StoryView
+
+class StoryViewBuffer:
+    def __init__(self, flush_interval_ms: int, max_pending: int, max_buffered: int, max_attempts: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.max_attempts = max_attempts
+        # (story_id, viewer_id) -> (primeiro viewed_at observado, tentativas de gravação já feitas)
+        self._pending: Dict[Tuple[int, int], Tuple[datetime, int]] = {}
+        # Lote sendo gravado agora
+        self._in_flight: Dict[Tuple[int, int], Tuple[datetime, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self.stats = {
+            'views_enqueued': 0,
+            'views_deduplicated': 0,
+            'views_inserted': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'views_dropped': 0,
+        }
+
+    def record(self, story_id: int, viewer_id: int):
+        """Registrar uma visualização sem tocar no banco"""
+        key = (story_id, viewer_id)
+        if key in self._pending or key in self._in_flight:
+            self.stats['views_deduplicated'] += 1
+            return
+        if len(self._pending) >= self.max_buffered:
+            self.stats['views_dropped'] += 1
+            return
+        self._pending[key] = (datetime.utcnow(), 0)
+        self.stats['views_enqueued'] += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def is_pending(self, story_id: int, viewer_id: int) -> bool:
+        """Visualização ainda não gravada (para leituras consistentes)"""
+        key = (story_id, viewer_id)
+        return key in self._pending or key in self._in_flight
+
+    async def flush(self):
+        """Gravar todas as visualizações pendentes"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._in_flight = batch
+            try:
+                inserted = await asyncio.to_thread(self._write_batch, batch)
+                self.stats['views_inserted'] += inserted
+                self.stats['flushes'] += 1
+            except Exception as e:
+                self.stats['flush_errors'] += 1
+                print(f"❌ Erro ao gravar visualizações de stories: {e}")
+                # Devolver o lote para a próxima tentativa, até max_attempts e sem passar de max_buffered
+                for key, (viewed_at, attempts) in batch.items():
+                    if attempts + 1 >= self.max_attempts or len(self._pending) >= self.max_buffered:
+                        self.stats['views_dropped'] += 1
+                        continue
+                    self._pending.setdefault(key, (viewed_at, attempts + 1))
+            finally:
+                self._in_flight = {}
+
+    def _write_batch(self, batch: Dict[Tuple[int, int], Tuple[datetime, int]]) -> int:
+        by_story = defaultdict(list)
+        for (story_id, viewer_id), (viewed_at, _) in batch.items():
+            by_story[story_id].append({
+                "story_id": story_id,
+                "viewer_id": viewer_id,
+                "viewed_at": viewed_at
+            })
+
+        # O índice único (story_id, viewer_id) torna o INSERT IGNORE idempotente
+        insert_ignore = (
+            insert(StoryView)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        )
+
+        db = SessionLocal()
+        try:
+            total = 0
+            for story_id, rows in by_story.items():
+                result = db.execute(insert_ignore.values(rows))
+                inserted = result.rowcount or 0
+                if inserted > 0:
+                    db.execute(
+                        update(Story)
+                        .where(Story.id == story_id)
+                        .values(views_count=func.coalesce(Story.views_count, 0) + inserted)
+                    )
+                    total += inserted
+            db.commit()
+            return total
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self):
+        """Loop de flush periódico"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def get_stats(self):
+        return {**self.stats, 'pending': len(self._pending), 'in_flight': len(self._in_flight)}
+
+# Instância global do buffer
+story_view_buffer = StoryViewBuffer(
+    STORY_VIEW_FLUSH_INTERVAL_MS, STORY_VIEW_MAX_PENDING, STORY_VIEW_MAX_BUFFERED, STORY_VIEW_MAX_ATTEMPTS
+)
+
+def start_story_view_flusher():
+    asyncio.create_task(story_view_buffer.run())
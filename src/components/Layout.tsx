@@ -112,6 +112,13 @@ export const Layout: React.FC<LayoutProps> = ({ children, user, onLogout }) => {
     fetchFriendRequestsCount();
     if (user?.id) {
       const handleNewNotification = (newNotification: any) => {
+        if (newNotification.type === "resync") {
+          // Missed events could not be replayed: reload from the API
+          setRealtimeNotifications([]);
+          refetchNotifications();
+          fetchFriendRequestsCount();
+          return;
+        }
         setRealtimeNotifications((prev) => [newNotification, ...prev]);
 
         // Update friend requests count if it's a friend request
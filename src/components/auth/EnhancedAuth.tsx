@@ -198,6 +198,7 @@ export function EnhancedAuth({ onLogin }: AuthProps) {
 
           if (response.ok) {
             const data = await response.json();
+            if (data.refresh_token) localStorage.setItem("refresh_token", data.refresh_token);
 
             // Get user details
             const userResponse = await fetch("http://localhost:8000/auth/me", {
@@ -125,6 +125,7 @@ export function SimpleAuth({ onLogin }: AuthProps) {
 
         if (isLogin) {
           console.log('✅ Login successful, fetching user data...');
+          if (data.refresh_token) localStorage.setItem("refresh_token", data.refresh_token);
           // Get user details for login
           const userResponse = await fetch("http://localhost:8000/auth/me", {
             headers: {
@@ -45,6 +45,7 @@ interface Contact {
 
 interface Message {
   id: number;
+  conversation_id?: number;
   sender: {
     id: number;
     first_name: string;
@@ -91,6 +92,7 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const videoInputRef = useRef<HTMLInputElement>(null);
   const wsRef = useRef<WebSocket | null>(null);
+  const lastSeqRef = useRef<number | null>(null);
   const typingTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const messageInputRef = useRef<HTMLInputElement>(null);
 
@@ -196,7 +198,8 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
   const connectWebSocket = () => {
     if (!user.id) return;
 
-    const wsUrl = getWebSocketURL(`/ws/${user.id}?token=${user.token}`);
+    const since = lastSeqRef.current !== null ? `&since=${lastSeqRef.current}` : "";
+    const wsUrl = getWebSocketURL(`/ws/${user.id}?token=${user.token}${since}`);
     wsRef.current = new WebSocket(wsUrl);
 
     wsRef.current.onopen = () => {
@@ -206,7 +209,19 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
     wsRef.current.onmessage = (event) => {
       const data = JSON.parse(event.data);
 
-      if (data.type === "message") {
+      if (typeof data.seq === "number") {
+        lastSeqRef.current = data.seq;
+      }
+
+      if (data.type === "ping") {
+        // Server heartbeat: any reply keeps the socket alive
+        wsRef.current?.send("pong");
+      } else if (data.type === "sync") {
+        lastSeqRef.current = data.data.seq;
+      } else if (data.type === "resync") {
+        lastSeqRef.current = data.data.seq;
+        loadConversations();
+      } else if (data.type === "message") {
         const newMessage: Message = {
           id: data.id,
           sender: data.sender,
@@ -214,6 +229,7 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
           message_type: data.message_type,
           media_url: data.media_url,
           is_read: data.is_read,
+          conversation_id: data.conversation_id,
           created_at: data.created_at,
           is_own: false,
         };
@@ -224,6 +240,17 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
         }
 
         loadConversations();
+      } else if (data.type === "message_read") {
+        // O contato leu tudo até up_to_id nesta conversa
+        setMessages((prev) =>
+          prev.map((msg) =>
+            msg.is_own &&
+            msg.conversation_id === data.conversation_id &&
+            msg.id <= data.up_to_id
+              ? { ...msg, is_read: true }
+              : msg,
+          ),
+        );
       } else if (data.type === "typing") {
         setIsTyping((prev) => ({
           ...prev,
@@ -239,7 +266,7 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
             ...prev,
             [data.sender_id]: false,
           }));
-        }, 3000);
+        }, (data.expires_in ?? 3) * 1000);
       }
     };
 
@@ -262,7 +289,7 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
       if (response.ok) {
         const data = await response.json();
         setConversations(
-          data.map((conv: any) => ({
+          data.conversations.map((conv: any) => ({
             id: conv.user.id,
             first_name: conv.user.first_name,
             last_name: conv.user.last_name,
@@ -292,13 +319,14 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
 
       if (response.ok) {
         const data = await response.json();
-        setMessages(data);
+        setMessages(data.messages);
 
-        const unreadMessages = data.filter(
+        // Um único "lido até" para a última mensagem recebida não lida
+        const unreadMessages = data.messages.filter(
           (msg: Message) => !msg.is_read && !msg.is_own,
         );
-        for (const msg of unreadMessages) {
-          markMessageAsRead(msg.id);
+        if (unreadMessages.length > 0) {
+          markMessageAsRead(unreadMessages[unreadMessages.length - 1].id);
         }
       }
     } catch (error) {
@@ -316,15 +344,6 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
           Authorization: `Bearer ${user.token}`,
         },
       });
-
-      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-        wsRef.current.send(
-          JSON.stringify({
-            type: "message_read",
-            message_id: messageId,
-          }),
-        );
-      }
     } catch (error) {
       console.error("Erro ao marcar mensagem como lida:", error);
     }
@@ -356,6 +375,7 @@ export function ChatPage({ user, onClose }: ChatPageProps) {
         const messageData = await response.json();
         const newMessage: Message = {
           id: messageData.id,
+          conversation_id: messageData.conversation_id,
           sender: {
             id: user.id,
             first_name: user.name.split(" ")[0],
@@ -40,6 +40,7 @@ interface Contact {
 
 interface Message {
   id: number;
+  conversation_id?: number;
   sender: {
     id: number;
     first_name: string;
@@ -73,6 +74,7 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const wsRef = useRef<WebSocket | null>(null);
   const typingTimeoutRef = useRef<{ [key: number]: NodeJS.Timeout }>({});
+  const stopTypingTimeoutRef = useRef<NodeJS.Timeout | null>(null);
 
   useEffect(() => {
     console.log("MessagesModal isOpen changed:", isOpen);
@@ -125,6 +127,7 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
           message_type: data.message_type,
           media_url: data.media_url,
           is_read: data.is_read,
+          conversation_id: data.conversation_id,
           created_at: data.created_at,
           is_own: false,
         };
@@ -137,6 +140,17 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
 
         // Atualizar lista de conversas
         loadConversations();
+      } else if (data.type === "message_read") {
+        // O contato leu tudo até up_to_id nesta conversa
+        setMessages((prev) =>
+          prev.map((msg) =>
+            msg.is_own &&
+            msg.conversation_id === data.conversation_id &&
+            msg.id <= data.up_to_id
+              ? { ...msg, is_read: true }
+              : msg,
+          ),
+        );
       } else if (data.type === "typing") {
         // Indicador de digitaç��o
         setIsTyping((prev) => ({
@@ -144,7 +158,7 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
           [data.sender_id]: data.is_typing,
         }));
 
-        // Clear typing after 3 seconds
+        // O servidor desliga o indicador após expires_in; o timer é só reserva
         if (data.is_typing) {
           if (typingTimeoutRef.current[data.sender_id]) {
             clearTimeout(typingTimeoutRef.current[data.sender_id]);
@@ -155,7 +169,7 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
               ...prev,
               [data.sender_id]: false,
             }));
-          }, 3000);
+          }, (data.expires_in ?? 3) * 1000);
         }
       }
     };
@@ -179,7 +193,7 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
       if (response.ok) {
         const data = await response.json();
         setConversations(
-          data.map((conv: any) => ({
+          data.conversations.map((conv: any) => ({
             id: conv.user.id,
             first_name: conv.user.first_name,
             last_name: conv.user.last_name,
@@ -209,14 +223,14 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
 
       if (response.ok) {
         const data = await response.json();
-        setMessages(data);
+        setMessages(data.messages);
 
-        // Marcar mensagens não lidas como lidas
-        const unreadMessages = data.filter(
+        // Um único "lido até" para a última mensagem recebida não lida
+        const unreadMessages = data.messages.filter(
           (msg: Message) => !msg.is_read && !msg.is_own,
         );
-        for (const msg of unreadMessages) {
-          markMessageAsRead(msg.id);
+        if (unreadMessages.length > 0) {
+          markMessageAsRead(unreadMessages[unreadMessages.length - 1].id);
         }
       }
     } catch (error) {
@@ -234,16 +248,6 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
           Authorization: `Bearer ${user.token}`,
         },
       });
-
-      // Notificar via WebSocket
-      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-        wsRef.current.send(
-          JSON.stringify({
-            type: "message_read",
-            message_id: messageId,
-          }),
-        );
-      }
     } catch (error) {
       console.error("Erro ao marcar mensagem como lida:", error);
     }
@@ -307,7 +311,10 @@ export function MessagesModal({ isOpen, onClose, user }: MessagesModalProps) {
     sendTypingIndicator(true);
 
     // Stop typing indicator after 1 second of no typing
-    setTimeout(() => {
+    if (stopTypingTimeoutRef.current) {
+      clearTimeout(stopTypingTimeoutRef.current);
+    }
+    stopTypingTimeoutRef.current = setTimeout(() => {
       sendTypingIndicator(false);
     }, 1000);
   };
@@ -122,7 +122,7 @@ export function EnhancedNotificationCenter({
 
       if (response.ok) {
         const data = await response.json();
-        setNotifications(data);
+        setNotifications(data.notifications);
       }
     } catch (error) {
       console.error("Erro ao carregar notificações:", error);
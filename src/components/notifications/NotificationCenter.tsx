@@ -56,7 +56,7 @@ export const NotificationCenter: React.FC<NotificationCenterProps> = ({
       
       if (response.ok) {
         const data = await response.json();
-        setNotifications(data);
+        setNotifications(data.notifications);
       }
     } catch (error) {
       console.error('Error fetching notifications:', error);
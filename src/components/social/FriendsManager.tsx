@@ -10,6 +10,7 @@ interface Friend {
   bio?: string;
   location?: string;
   is_verified: boolean;
+  online?: boolean;
   friendship_date: string;
 }
 
@@ -33,6 +34,9 @@ interface FriendsManagerProps {
 
 export function FriendsManager({ userToken, currentUserId, onUserSelect }: FriendsManagerProps) {
   const [friends, setFriends] = useState<Friend[]>([]);
+  const [friendsCursor, setFriendsCursor] = useState<string | null>(null);
+  const [totalFriends, setTotalFriends] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [friendRequests, setFriendRequests] = useState<FriendRequest[]>([]);
   const [activeTab, setActiveTab] = useState<"friends" | "requests">("friends");
   const [loading, setLoading] = useState(true);
@@ -43,9 +47,12 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
     fetchFriendRequests();
   }, []);
 
-  const fetchFriends = async () => {
+  // Sem cursor recarrega a primeira página; com cursor acrescenta a próxima
+  const fetchFriends = async (cursor?: string) => {
     try {
-      const response = await fetch("http://localhost:8000/friendships/", {
+      const params = new URLSearchParams();
+      if (cursor) params.set("cursor", cursor);
+      const response = await fetch(`http://localhost:8000/friendships/?${params}`, {
         headers: {
           Authorization: `Bearer ${userToken}`,
         },
@@ -53,13 +60,22 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
 
       if (response.ok) {
         const data = await response.json();
-        setFriends(data);
+        setFriends(prev => (cursor ? [...prev, ...data.friends] : data.friends));
+        setFriendsCursor(data.next_cursor);
+        setTotalFriends(data.total);
       }
     } catch (error) {
       console.error("Erro ao carregar amigos:", error);
     }
   };
 
+  const loadMoreFriends = async () => {
+    if (!friendsCursor || loadingMore) return;
+    setLoadingMore(true);
+    await fetchFriends(friendsCursor);
+    setLoadingMore(false);
+  };
+
   const fetchFriendRequests = async () => {
     try {
       const response = await fetch("http://localhost:8000/friendships/requests", {
@@ -92,6 +108,7 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
 
       if (response.ok) {
         setFriends(prev => prev.filter(friend => friend.id !== friendId));
+        setTotalFriends(prev => Math.max(0, prev - 1));
       }
     } catch (error) {
       console.error("Erro ao remover amigo:", error);
@@ -169,6 +186,7 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
 
       if (response.ok) {
         setFriends(prev => prev.filter(friend => friend.id !== userId));
+        setTotalFriends(prev => Math.max(0, prev - 1));
         alert("Usuário bloqueado com sucesso!");
       }
     } catch (error) {
@@ -275,7 +293,7 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
                 : "text-gray-600 hover:text-gray-900"
             }`}
           >
-            Amigos ({friends.length})
+            Amigos ({totalFriends})
           </button>
           <button
             onClick={() => setActiveTab("requests")}
@@ -382,6 +400,16 @@ export function FriendsManager({ userToken, currentUserId, onUserSelect }: Frien
                   </div>
                 </div>
               ))}
+
+              {friendsCursor && (
+                <button
+                  onClick={loadMoreFriends}
+                  disabled={loadingMore}
+                  className="w-full py-2 text-sm text-blue-600 border border-gray-200 rounded-lg hover:bg-gray-50 transition-colors disabled:opacity-50"
+                >
+                  {loadingMore ? "Carregando..." : "Carregar mais"}
+                </button>
+              )}
             </div>
           )
         ) : (
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 
 interface NotificationData {
   id: number;
@@ -25,15 +25,19 @@ interface UseNotificationsProps {
 export function useNotifications({ userToken, userId }: UseNotificationsProps) {
   const [notifications, setNotifications] = useState<NotificationData[]>([]);
   const [unreadCount, setUnreadCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [isConnected, setIsConnected] = useState(false);
+  // Last event sequence number seen, used to replay missed events on reconnect
+  const lastSeqRef = useRef<number | null>(null);
 
   // WebSocket connection for real-time notifications
   const connectWebSocket = useCallback(() => {
     if (!userId || !userToken) return;
 
+    const since = lastSeqRef.current !== null ? `&since=${lastSeqRef.current}` : "";
     const ws = new WebSocket(
-      `ws://localhost:8000/ws/${userId}?token=${encodeURIComponent(userToken)}`
+      `ws://localhost:8000/ws/${userId}?token=${encodeURIComponent(userToken)}${since}`
     );
 
     ws.onopen = () => {
@@ -44,18 +48,29 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
     ws.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        
-        if (data.type === "notification") {
+
+        if (typeof data.seq === "number") {
+          lastSeqRef.current = data.seq;
+        }
+
+        if (data.type === "ping") {
+          // Server heartbeat: any reply keeps the socket alive
+          ws.send("pong");
+        } else if (data.type === "sync") {
+          lastSeqRef.current = data.data.seq;
+        } else if (data.type === "resync") {
+          // Missed events are no longer buffered on the server: reload everything
+          lastSeqRef.current = data.data.seq;
+          window.dispatchEvent(new CustomEvent("notificationsResync"));
+        } else if (data.type === "notification") {
           const newNotification = data.data;
           
-          // Add to notifications list
-          setNotifications(prev => [newNotification, ...prev]);
-          
-          // Update unread count
-          if (!newNotification.is_read) {
-            setUnreadCount(prev => prev + 1);
-          }
-          
+          // Add to notifications list (grouped notifications arrive again with the same id)
+          setNotifications(prev => [
+            newNotification,
+            ...prev.filter(notif => notif.id !== newNotification.id),
+          ]);
+
           // Show browser notification if permission granted
           if (Notification.permission === "granted") {
             new Notification(newNotification.title, {
@@ -69,6 +84,9 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
           window.dispatchEvent(new CustomEvent("newNotification", {
             detail: newNotification
           }));
+        } else if (data.type === "unread_count") {
+          // Server-maintained counter, pushed on every change
+          setUnreadCount(data.data.unread_count);
         }
       } catch (error) {
         console.error("Error parsing WebSocket message:", error);
@@ -117,7 +135,7 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
   const fetchNotifications = useCallback(async (options?: {
     unreadOnly?: boolean;
     limit?: number;
-    offset?: number;
+    cursor?: string;
   }) => {
     setLoading(true);
     try {
@@ -125,7 +143,7 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
       
       if (options?.unreadOnly) params.append("unread_only", "true");
       if (options?.limit) params.append("limit", options.limit.toString());
-      if (options?.offset) params.append("skip", options.offset.toString());
+      if (options?.cursor) params.append("cursor", options.cursor);
 
       const response = await fetch(
         `http://localhost:8000/notifications/?${params.toString()}`,
@@ -138,7 +156,10 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
 
       if (response.ok) {
         const data = await response.json();
-        setNotifications(data);
+        setNotifications(prev =>
+          options?.cursor ? [...prev, ...data.notifications] : data.notifications
+        );
+        setNextCursor(data.next_cursor);
       }
     } catch (error) {
       console.error("Error fetching notifications:", error);
@@ -254,9 +275,20 @@ export function useNotifications({ userToken, userId }: UseNotificationsProps) {
     }
   }, [userToken, userId, fetchNotifications, fetchUnreadCount]);
 
+  // Full reload only when the server could not replay the missed events
+  useEffect(() => {
+    const handleResync = () => {
+      fetchNotifications();
+      fetchUnreadCount();
+    };
+    window.addEventListener("notificationsResync", handleResync);
+    return () => window.removeEventListener("notificationsResync", handleResync);
+  }, [fetchNotifications, fetchUnreadCount]);
+
   return {
     notifications,
     unreadCount,
+    nextCursor,
     loading,
     isConnected,
     fetchNotifications,
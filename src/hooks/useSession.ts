@@ -33,7 +33,17 @@ interface SessionState {
 
 const SESSION_TIMEOUT = 30 * 60 * 1000; // 30 minutos
 const ACTIVITY_CHECK_INTERVAL = 60 * 1000; // 1 minuto
-const TOKEN_REFRESH_THRESHOLD = 5 * 60 * 1000; // 5 minutos antes de expirar
+const TOKEN_REFRESH_THRESHOLD = 60 * 1000; // Renovar 1 minuto antes de o access token expirar
+
+// Expiração (ms) do JWT, lida do claim exp sem validar a assinatura
+const getTokenExpiry = (token: string): number | null => {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return typeof payload.exp === 'number' ? payload.exp * 1000 : null;
+  } catch {
+    return null;
+  }
+};
 
 export const useSession = () => {
   const [sessionState, setSessionState] = useState<SessionState>({
@@ -45,6 +55,7 @@ export const useSession = () => {
 
   const activityTimer = useRef<NodeJS.Timeout | null>(null);
   const refreshTimer = useRef<NodeJS.Timeout | null>(null);
+  const refreshInFlight = useRef<Promise<string | null> | null>(null);
 
   // Atualizar última atividade
   const updateActivity = useCallback(() => {
@@ -67,11 +78,48 @@ export const useSession = () => {
         user: null
       }));
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       return true;
     }
     return false;
   }, [sessionState.lastActivity, sessionState.user]);
 
+  // Trocar o refresh token por um par novo (uma troca por vez, mesmo com chamadas simultâneas)
+  const refreshSession = useCallback((): Promise<string | null> => {
+    if (refreshInFlight.current) return refreshInFlight.current;
+
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) return Promise.resolve(null);
+
+    refreshInFlight.current = (async () => {
+      try {
+        const response = await apiCall('/auth/refresh', {
+          method: 'POST',
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+        if (!response.ok) {
+          localStorage.removeItem('refresh_token');
+          return null;
+        }
+
+        const data = await response.json();
+        localStorage.setItem('token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
+        setSessionState(prev => prev.user ? {
+          ...prev,
+          user: { ...prev.user, token: data.access_token }
+        } : prev);
+        return data.access_token as string;
+      } catch (error) {
+        console.error('Erro ao renovar a sessão:', error);
+        return null;
+      } finally {
+        refreshInFlight.current = null;
+      }
+    })();
+    return refreshInFlight.current;
+  }, []);
+
   // Buscar dados do usuário com cache
   const fetchUserData = useCallback(async (token: string, useCache = true) => {
     const cacheKey = `user_data_${token.slice(-8)}`;
@@ -186,7 +234,16 @@ export const useSession = () => {
 
   // Logout do usuário
   const logout = useCallback((expired = false) => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      // Revogar a sessão no servidor; o logout local não espera a resposta
+      apiCall('/auth/logout', {
+        method: 'POST',
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     // Limpar caches relacionados
     Object.keys(localStorage).forEach(key => {
       if (key.startsWith('user_data_')) {
@@ -205,19 +262,47 @@ export const useSession = () => {
       clearInterval(activityTimer.current);
     }
     if (refreshTimer.current) {
-      clearInterval(refreshTimer.current);
+      clearTimeout(refreshTimer.current);
     }
   }, []);
 
-  // Inicialização da sessão
+  // Inicialização da sessão: access token vencido (ou quase) é renovado antes de buscar o usuário
   useEffect(() => {
-    const token = localStorage.getItem('token');
-    if (token) {
-      fetchUserData(token);
-    } else {
-      setSessionState(prev => ({ ...prev, loading: false }));
-    }
-  }, [fetchUserData]);
+    const init = async () => {
+      let token = localStorage.getItem('token');
+      const expiry = token ? getTokenExpiry(token) : null;
+      if (!token || (expiry !== null && expiry - Date.now() < TOKEN_REFRESH_THRESHOLD)) {
+        token = (await refreshSession()) || token;
+      }
+
+      if (token) {
+        fetchUserData(token);
+      } else {
+        setSessionState(prev => ({ ...prev, loading: false }));
+      }
+    };
+    init();
+  }, [fetchUserData, refreshSession]);
+
+  // Renovar o access token pouco antes de expirar; sem refresh token válido, a sessão termina
+  useEffect(() => {
+    const token = sessionState.user?.token;
+    const expiry = token ? getTokenExpiry(token) : null;
+    if (expiry === null) return;
+
+    refreshTimer.current = setTimeout(async () => {
+      const newToken = await refreshSession();
+      if (!newToken) {
+        logout(true);
+      }
+    }, Math.max(expiry - Date.now() - TOKEN_REFRESH_THRESHOLD, 0));
+
+    return () => {
+      if (refreshTimer.current) {
+        clearTimeout(refreshTimer.current);
+      }
+    };
+  }, [sessionState.user?.token, refreshSession, logout]);
 
   // Monitorar atividade do usuário
   useEffect(() => {
@@ -295,6 +380,7 @@ export const useSession = () => {
         return fetchUserData(sessionState.user.token, false);
       }
     },
+    refreshSession,
     updateActivity,
     completeOnboarding
   };
@@ -294,6 +294,7 @@ const EmailVerificationPage: React.FC = () => {
             const loginData = await loginResponse.json();
             console.log('✅ Login automático bem-sucedido!', loginData);
             localStorage.setItem('token', loginData.access_token);
+            if (loginData.refresh_token) localStorage.setItem('refresh_token', loginData.refresh_token);
 
             // Limpar dados pendentes
             localStorage.removeItem('pendingVerificationUser');
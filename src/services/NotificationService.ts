@@ -1,13 +1,17 @@
-import { getWebSocketURL } from '../config/api';
+import { API_BASE_URL, getWebSocketURL } from '../config/api';
 
 class NotificationService {
   private ws: WebSocket | null = null;
+  // Server-Sent Events fallback for networks that block WebSockets
+  private eventSource: EventSource | null = null;
   private listeners: ((notification: any) => void)[] = [];
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private reconnectDelay = 1000;
   private userId: number | null = null;
   private token: string | null = null;
+  // Last event sequence number seen, sent as ?since= to replay missed events
+  private lastSeq: number | null = null;
 
   connect(userId: number, token: string) {
     this.userId = userId;
@@ -19,7 +23,8 @@ class NotificationService {
     if (!this.userId || !this.token) return;
 
     try {
-      const wsUrl = getWebSocketURL(`/ws/${this.userId}?token=${this.token}`);
+      const since = this.lastSeq !== null ? `&since=${this.lastSeq}` : '';
+      const wsUrl = getWebSocketURL(`/ws/${this.userId}?token=${this.token}${since}`);
       this.ws = new WebSocket(wsUrl);
 
       this.ws.onopen = () => {
@@ -30,8 +35,11 @@ class NotificationService {
       this.ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          if (data.type === 'notification') {
-            this.notifyListeners(data);
+          if (data.type === 'ping') {
+            // Server heartbeat: any reply keeps the socket alive
+            this.ws?.send('pong');
+          } else {
+            this.handleFrame(data);
           }
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
@@ -52,6 +60,39 @@ class NotificationService {
     }
   }
 
+  private handleFrame(data: any) {
+    if (typeof data.seq === 'number') {
+      this.lastSeq = data.seq;
+    }
+    if (data.type === 'sync') {
+      this.lastSeq = data.data.seq;
+    } else if (data.type === 'resync') {
+      // The gap was evicted on the server: listeners must reload
+      this.lastSeq = data.data.seq;
+      this.notifyListeners(data);
+    } else if (data.type === 'notification') {
+      this.notifyListeners(data);
+    }
+  }
+
+  private connectEventStream() {
+    if (!this.userId || !this.token || this.eventSource) return;
+
+    // EventSource reconnects by itself and resumes with Last-Event-ID
+    const since = this.lastSeq !== null ? `&since=${this.lastSeq}` : '';
+    this.eventSource = new EventSource(
+      `${API_BASE_URL}/notifications/stream?token=${this.token}${since}`
+    );
+
+    this.eventSource.onmessage = (event) => {
+      try {
+        this.handleFrame(JSON.parse(event.data));
+      } catch (error) {
+        console.error('Error parsing notification stream event:', error);
+      }
+    };
+  }
+
   private attemptReconnect() {
     if (this.reconnectAttempts < this.maxReconnectAttempts) {
       this.reconnectAttempts++;
@@ -61,7 +102,8 @@ class NotificationService {
         this.connectWebSocket();
       }, this.reconnectDelay * this.reconnectAttempts);
     } else {
-      console.log('Max reconnection attempts reached');
+      console.log('Max reconnection attempts reached, falling back to notification stream');
+      this.connectEventStream();
     }
   }
 
@@ -70,8 +112,13 @@ class NotificationService {
       this.ws.close();
       this.ws = null;
     }
+    if (this.eventSource) {
+      this.eventSource.close();
+      this.eventSource = null;
+    }
     this.userId = null;
     this.token = null;
+    this.lastSeq = null;
     this.reconnectAttempts = 0;
   }
 
@@ -93,7 +140,10 @@ class NotificationService {
   }
 
   isConnected(): boolean {
-    return this.ws?.readyState === WebSocket.OPEN;
+    return (
+      this.ws?.readyState === WebSocket.OPEN ||
+      this.eventSource?.readyState === EventSource.OPEN
+    );
   }
 }
 